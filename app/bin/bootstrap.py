@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import sys
 import subprocess
 
 import requests
@@ -13,6 +14,10 @@ from utils import abort, logger, get_leek_org_available_index_templates
 from migration import migrate_index_templates
 from summary import ensure_all_summary_indexes_with_mapping, ensure_all_indexes_summary_transform
 
+# Subscriptions rules are validated by the agent code itself (/opt/app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from leek.agent.rules import CompiledRule, InvalidRule  # noqa: E402
+
 """
 PRINT APPLICATION HEADER
 """
@@ -204,10 +209,26 @@ def validate_subscriptions(subs):
     # Optional settings
     for subscription in subs:
         subscription.setdefault("concurrency_pool_size", 1)
+        subscription.setdefault("shards", 1)
+        subscription.setdefault("dedicated_process", True)
         subscription.setdefault("prefetch_count", 1000)
         subscription.setdefault("batch_max_size_in_mb", 1)
         subscription.setdefault("batch_max_number_of_messages", subscription["prefetch_count"])
         subscription.setdefault("batch_max_window_in_seconds", 5)
+        subscription.setdefault("coalescing_window_in_seconds", 0)
+        subscription.setdefault("coalescing_max_held_tasks", 10000)
+        subscription.setdefault("event_rules", [])
+        subscription.setdefault("heartbeat_interval_in_seconds", 0)
+        subscription.setdefault("heartbeat_active_delta", 5)
+        subscription.setdefault("heartbeat_processed_delta", 1000)
+        subscription.setdefault("memory_budget_in_mb", 256)
+        subscription.setdefault("compression", "gzip")
+        subscription.setdefault("spool_enabled", False)
+        subscription.setdefault("spool_max_size_in_mb", 1024)
+        subscription.setdefault("spool_segment_max_size_in_mb", 64)
+        subscription.setdefault("spool_fsync_policy", "segment")
+        subscription.setdefault("dead_letter_enabled", True)
+        subscription.setdefault("dead_letter_max_size_in_mb", 64)
 
         if not LEEK_API_ENABLE_AUTH:
             subscription["org_name"] = "mono"
@@ -221,8 +242,52 @@ def validate_subscriptions(subs):
         if subscription["batch_max_number_of_messages"] > subscription["prefetch_count"]:
             abort("Subscription batch_max_number_of_messages should be <= prefetch_count!")
 
+        if subscription["shards"] < 1 or subscription["shards"] > 32:
+            abort("Subscription shards should be between 1 and 32 processes!")
+
+        if not isinstance(subscription["dedicated_process"], bool):
+            abort("Subscription dedicated_process should be a boolean!")
+
         if subscription["batch_max_window_in_seconds"] < 5 or subscription["batch_max_window_in_seconds"] > 20:
             abort("Subscription batch_max_window_in_seconds should be between 5 and 20 seconds!")
+
+        if subscription["coalescing_window_in_seconds"] < 0 or subscription["coalescing_window_in_seconds"] > 10:
+            abort("Subscription coalescing_window_in_seconds should be between 0 and 10 seconds!")
+
+        if subscription["coalescing_max_held_tasks"] < 100 or subscription["coalescing_max_held_tasks"] > 100000:
+            abort("Subscription coalescing_max_held_tasks should be between 100 and 100,000 tasks!")
+
+        if not isinstance(subscription["event_rules"], list):
+            abort("Subscription event_rules should be a list of rules!")
+        for i, rule in enumerate(subscription["event_rules"]):
+            try:
+                CompiledRule.compile(rule)
+            except InvalidRule as e:
+                abort(f"Subscription event_rules[{i}] is invalid: {e}")
+
+        if subscription["heartbeat_interval_in_seconds"] < 0 or subscription["heartbeat_interval_in_seconds"] > 3600:
+            abort("Subscription heartbeat_interval_in_seconds should be between 0 and 3600 seconds!")
+
+        if subscription["heartbeat_active_delta"] < 1 or subscription["heartbeat_processed_delta"] < 1:
+            abort("Subscription heartbeat_active_delta and heartbeat_processed_delta should be >= 1!")
+
+        if subscription["memory_budget_in_mb"] < 16 or subscription["memory_budget_in_mb"] > 4096:
+            abort("Subscription memory_budget_in_mb should be between 16 and 4096 megabytes!")
+
+        if subscription["batch_max_size_in_mb"] > subscription["memory_budget_in_mb"]:
+            abort("Subscription batch_max_size_in_mb should be <= memory_budget_in_mb!")
+
+        if subscription["compression"] not in ["zstd", "gzip", "none"]:
+            abort("Subscription compression should be one of zstd, gzip or none!")
+
+        if subscription["spool_fsync_policy"] not in ["always", "segment", "never"]:
+            abort("Subscription spool_fsync_policy should be one of always, segment or never!")
+
+        if subscription["spool_segment_max_size_in_mb"] > subscription["spool_max_size_in_mb"]:
+            abort("Subscription spool_segment_max_size_in_mb should be <= spool_max_size_in_mb!")
+
+        if subscription["dead_letter_max_size_in_mb"] < 1 or subscription["dead_letter_max_size_in_mb"] > 1024:
+            abort("Subscription dead_letter_max_size_in_mb should be between 1 and 1024 megabytes!")
     return subs
 
 
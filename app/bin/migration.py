@@ -35,6 +35,37 @@ def _set_properties_on_template_body(template_body: Dict[str, Any], properties:
     template_body["template"]["mappings"]["properties"] = properties
 
 
+def _diff_properties(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fields of new missing from existing, as a partial properties tree. Sub fields added to an existing object
+    (e.g. error.fingerprint) are nested under that object.
+    """
+    added = {}
+    for field_name, field_def in new.items():
+        if field_name not in existing:
+            added[field_name] = field_def
+        elif "properties" in field_def and "properties" in existing[field_name]:
+            added_sub_fields = _diff_properties(existing[field_name]["properties"], field_def["properties"])
+            if added_sub_fields:
+                added[field_name] = {"properties": added_sub_fields}
+    return added
+
+
+def _merge_properties(existing: Dict[str, Any], added: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of existing with the partial properties tree computed by _diff_properties merged in.
+    """
+    merged = deepcopy(existing)
+    for field_name, field_def in added.items():
+        if field_name in merged:
+            merged[field_name]["properties"] = _merge_properties(
+                merged[field_name]["properties"], field_def["properties"]
+            )
+        else:
+            merged[field_name] = deepcopy(field_def)
+    return merged
+
+
 def _get_composable_template(es: Elasticsearch, template_name: str) -> Dict[str, Any]:
     """
     Get composable index template via GET /_index_template/{name}.
@@ -137,7 +168,7 @@ def sync_composable_template_and_indices(
     Steps:
       1. Fetch existing composable index template.
       2. Compare existing template's mappings.properties with new_template_body's.
-      3. Detect newly added top-level fields by field name.
+      3. Detect newly added fields by field name, including the sub fields of existing objects.
       4. Find all indices matching template's index_patterns.
       5. Update each index's mapping to add only those new fields.
       6. ONLY IF all index updates succeed, update the index template itself.
@@ -165,7 +196,7 @@ def sync_composable_template_and_indices(
             }
 
     Notes / limitations:
-      - Only detects *new* top-level fields in mappings.properties.
+      - Only detects *new* fields in mappings.properties, at any depth of the object fields.
       - Does NOT attempt to change definitions for existing fields.
       - Assumes composable templates (`_index_template`), not legacy (`_template`).
       - You can safely call this function multiple times; it is designed to be
@@ -178,11 +209,7 @@ def sync_composable_template_and_indices(
     new_props = _extract_properties_from_template_body(new_template_body)
 
     # 2. Compute newly added fields
-    new_fields = {
-        field_name: field_def
-        for field_name, field_def in new_props.items()
-        if field_name not in existing_props
-    }
+    new_fields = _diff_properties(existing_props, new_props)
 
     if not new_fields:
         return {
@@ -214,8 +241,7 @@ def sync_composable_template_and_indices(
         )
     else:
         # All indices updated successfully → now update the template
-        merged_props = deepcopy(existing_props)
-        merged_props.update(new_fields)
+        merged_props = _merge_properties(existing_props, new_fields)
 
         updated_template_body = deepcopy(existing_template)
         _set_properties_on_template_body(updated_template_body, merged_props)
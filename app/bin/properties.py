@@ -138,6 +138,17 @@ def get_properties(search_backend):
         "result": {
             "type": "keyword"
         },
+        # Payload policy, set when the args/kwargs/result are truncated, hashed or offloaded
+        **{
+            f"{name}_ref": {
+                "properties": {
+                    "mode": {"type": "keyword"},
+                    "digest": {"type": "keyword"},
+                    "size": {"type": "long"},
+                }
+            }
+            for name in ("args", "kwargs", "result")
+        },
         "runtime": {
             "type": "double"
         },
@@ -176,7 +187,8 @@ def get_properties(search_backend):
                     "type": "text",
                     "norms": False,
                     "fields": {"keyword": {"type": "keyword", "ignore_above": 32766}}
-                }
+                },
+                "fingerprint": {"type": "keyword"}
             }
         },
         "stack": {
@@ -1,45 +1,5 @@
-String QUEUED = "QUEUED";
-String RECEIVED = "RECEIVED";
-String STARTED = "STARTED";
-String SUCCEEDED = "SUCCEEDED";
-String FAILED = "FAILED";
-String REJECTED = "REJECTED";
-String REVOKED = "REVOKED";
-String RETRY = "RETRY";
-
-// CUSTOM STATES
-String RECOVERED = "RECOVERED"; // Succeeded after many retries
-String CRITICAL = "CRITICAL";  // Failed after max retries
-
-List STATES_TERMINAL = [SUCCEEDED, FAILED, REJECTED, REVOKED, RECOVERED, CRITICAL];
-List STATES_SUCCESS = [SUCCEEDED, RECOVERED];
-List STATES_EXCEPTION = [FAILED, RETRY, REJECTED, REVOKED, CRITICAL];
-List STATES_UNREADY = [QUEUED, RECEIVED, STARTED];
-
-Map TaskStateFields = [
-    // No need to update this fields if coming task is out of order
-    "SHARED": ["_id", "app_env", "kind", "state", "uuid", "clock", "updated_at", "timestamp", "exact_timestamp",
-               "utcoffset", "pid"],
-
-    // Shared between states
-    "QUEUED_RECEIVED": ["name", "name_parts", "args", "kwargs", "root_id", "parent_id", "eta", "expires", "retries",
-                        "args_0", "args_1", "args_2", "args_3", "args_4", "args_5", "args_6", "args_7", "args_8",
-                        "args_9", "kwargs_flattened"],
-    "FAILED_RETRY": ["exception", "traceback", "lang", "error", "stack", "trace"],
-
-    // Safe
-    "NOT_QUEUED": ["worker"],
-    "QUEUED": ["queued_at", "exchange", "routing_key", "queue", "client"],
-    "RECEIVED": ["received_at"],
-    "STARTED": ["started_at"],
-    "RETRY": ["retried_at"],
-
-    // TERMINAL STATES
-    "SUCCEEDED": ["succeeded_at", "result", "runtime"],
-    "FAILED": ["failed_at"],
-    "REJECTED": ["rejected_at", "requeue"],
-    "REVOKED": ["revoked_at", "terminated", "expired", "signum"]
-];
+// GENERATED by `python -m leek.agent.models.painless` from the task merge rules (leek/agent/models/task.py),
+// do not edit: change the rules and regenerate this script.
 
 int new_events_count = params.events_count;
 List new_events = params.events;
@@ -47,101 +7,340 @@ List new_events = params.events;
 int events_count = ctx._source.events_count;
 List events = ctx._source.events;
 
-List attrs_to_upsert = [];
+String stored = ctx._source.state;
+String coming = params.state;
+// States unknown to the rules are merged as is
+int plan = 0;
 
-if (ctx._source.uuid == null || STATES_TERMINAL.contains(params.state)) {
-    // First time to index or Coming event in terminal state and safe to merge
-    // No need to compare clocks/timestamps
+if (ctx._source.uuid == null) {
+    // First time to index
+    plan = 0;
+}
+else if (coming == "QUEUED") {
+    if (stored == "QUEUED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 6;
+    }
+    else if (stored == "RECEIVED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 8;
+    }
+    else if (stored == "STARTED" || stored == "RETRY") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 10;
+    }
+    else if (stored == "SUCCEEDED" || stored == "FAILED" || stored == "REJECTED" || stored == "REVOKED" || stored == "RECOVERED" || stored == "CRITICAL") {
+        plan = 3;
+    }
+}
+else if (coming == "RECEIVED") {
+    if (stored == "QUEUED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 9;
+    }
+    else if (stored == "RECEIVED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 6;
+    }
+    else if (stored == "STARTED" || stored == "RETRY") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 11;
+    }
+    else if (stored == "SUCCEEDED" || stored == "FAILED" || stored == "REJECTED" || stored == "REVOKED" || stored == "RECOVERED" || stored == "CRITICAL") {
+        plan = 4;
+    }
+}
+else if (coming == "STARTED") {
+    if (stored == "QUEUED" || stored == "RECEIVED" || stored == "RETRY") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 12;
+    }
+    else if (stored == "STARTED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 6;
+    }
+    else if (stored == "SUCCEEDED" || stored == "FAILED" || stored == "REJECTED" || stored == "REVOKED" || stored == "RECOVERED" || stored == "CRITICAL") {
+        plan = 5;
+    }
+}
+else if (coming == "RETRY") {
+    if (stored == "QUEUED" || stored == "RECEIVED" || stored == "STARTED") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 7;
+    }
+    else if (stored == "RETRY") {
+        plan = ctx._source.exact_timestamp < params.exact_timestamp ? 0 : 6;
+    }
+    else if (stored == "SUCCEEDED" || stored == "REJECTED" || stored == "REVOKED" || stored == "RECOVERED") {
+        plan = 2;
+    }
+    else if (stored == "FAILED" || stored == "CRITICAL") {
+        plan = 1;
+    }
+}
+else if (coming == "SUCCEEDED" || coming == "FAILED" || coming == "REJECTED" || coming == "REVOKED" || coming == "RECOVERED" || coming == "CRITICAL") {
+    plan = 0;
+}
+
+if (plan == 0) {
+    // Merge every attribute set by the coming event
     for (def entry : params.entrySet()) {
         if (entry.getValue() != null) {
             ctx._source[entry.getKey()] = entry.getValue();
         }
     }
 }
-else if (STATES_TERMINAL.contains(ctx._source.state)) {
-    // The task is already in terminal state, Resolve conflict and merge
-    // This can be caused if the timestamp of the new event is inaccurate
-    // Or if the workers/clients are not synchronized
-
-    // Get safe attrs from coming task
-    attrs_to_upsert.addAll(TaskStateFields[params.state]);
-    if (QUEUED != params.state && new_events.contains(QUEUED)) {
-        // QUEUED already merged by Agent, we should not lose its attributes when merged by Index
-        attrs_to_upsert.addAll(TaskStateFields[QUEUED]);
-    }
-    if (RECEIVED != params.state && new_events.contains(RECEIVED)) {
-        // RECEIVED already merged by Agent, we should not lose its attributes when merged by Index
-        attrs_to_upsert.addAll(TaskStateFields[RECEIVED]);
-    }
-    // States with same attrs
-    if (params.state == RETRY){
-        if (![FAILED, CRITICAL].contains(ctx._source.state)){
-            // Retry event came late => update document with traceback/exception
-            attrs_to_upsert.addAll(TaskStateFields.FAILED_RETRY);
-        }
+else if (plan == 1) {
+    // Resolve conflict and merge the safe attributes
+    if (params["retried_at"] != null) { ctx._source["retried_at"] = params["retried_at"]; }
+    if (new_events.contains("QUEUED")) {
+        // QUEUED already merged by the agent, its attributes should not be lost
+        if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+        if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+        if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+        if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+        if (params["client"] != null) { ctx._source["client"] = params["client"]; }
     }
-    else if ([QUEUED, RECEIVED].contains(params.state)) {
-        // QUEUED|RECEIVED event came late, update with attrs send only by QUEUED|RECEIVED events
-        attrs_to_upsert.addAll(TaskStateFields.QUEUED_RECEIVED);
+    if (new_events.contains("RECEIVED")) {
+        // RECEIVED already merged by the agent, its attributes should not be lost
+        if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
     }
-    else if (new_events.contains(QUEUED) || new_events.contains(RECEIVED)) {
-        // QUEUED|RECEIVED already merged by Agent, we should not lose their attributes when merged by Index
-        attrs_to_upsert.addAll(TaskStateFields.QUEUED_RECEIVED);
+}
+else if (plan == 2) {
+    // Resolve conflict and merge the safe attributes
+    if (params["retried_at"] != null) { ctx._source["retried_at"] = params["retried_at"]; }
+    if (params["exception"] != null) { ctx._source["exception"] = params["exception"]; }
+    if (params["traceback"] != null) { ctx._source["traceback"] = params["traceback"]; }
+    if (params["lang"] != null) { ctx._source["lang"] = params["lang"]; }
+    if (params["error"] != null) { ctx._source["error"] = params["error"]; }
+    if (params["stack"] != null) { ctx._source["stack"] = params["stack"]; }
+    if (params["trace"] != null) { ctx._source["trace"] = params["trace"]; }
+    if (new_events.contains("QUEUED")) {
+        // QUEUED already merged by the agent, its attributes should not be lost
+        if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+        if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+        if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+        if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+        if (params["client"] != null) { ctx._source["client"] = params["client"]; }
     }
-    // Merge
-    for (def entry : params.entrySet()) {
-        if (entry.getValue() != null && attrs_to_upsert.contains(entry.getKey())) {
-            ctx._source[entry.getKey()] = entry.getValue();
-        }
+    if (new_events.contains("RECEIVED")) {
+        // RECEIVED already merged by the agent, its attributes should not be lost
+        if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
     }
 }
-else {
-    // Handle non terminal events (Resolve conflict and merge or Just merge)
-    boolean in_order = ctx._source.exact_timestamp < params.exact_timestamp;
-    if (in_order) {
-        // The two documents are in physical clock order and in state order, Safe to merge
-        for (def entry : params.entrySet()) {
-            if (entry.getValue() != null) {
-                ctx._source[entry.getKey()] = entry.getValue();
-            }
-        }
+else if (plan == 3) {
+    // Resolve conflict and merge the safe attributes
+    if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+    if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+    if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+    if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+    if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+    if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+    if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+    if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+    if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+    if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+    if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+    if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+    if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+    if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+    if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+    if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+    if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+    if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+    if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+    if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+    if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+    if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+    if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+    if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+    if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+    if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+    if (params["client"] != null) { ctx._source["client"] = params["client"]; }
+    if (new_events.contains("RECEIVED")) {
+        // RECEIVED already merged by the agent, its attributes should not be lost
+        if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
     }
-    else if (ctx._source.state == params.state) {
-        // The two documents are out of order and has the same state => Skip
-        ctx.op = 'none';
+}
+else if (plan == 4) {
+    // Resolve conflict and merge the safe attributes
+    if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+    if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+    if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+    if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+    if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+    if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+    if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+    if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+    if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+    if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+    if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+    if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+    if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+    if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+    if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+    if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+    if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+    if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+    if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+    if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+    if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+    if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+    if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
+    if (new_events.contains("QUEUED")) {
+        // QUEUED already merged by the agent, its attributes should not be lost
+        if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+        if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+        if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+        if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+        if (params["client"] != null) { ctx._source["client"] = params["client"]; }
     }
-    else {
-        // The two documents are out of order and has different states => Resolve conflict and merge
-
-        // Get safe attrs from coming task
-        attrs_to_upsert.addAll(TaskStateFields[params.state]);
-        // States with same attrs
-        if (params.state == RETRY) {
-            if (ctx._source.state != RETRY) {
-                attrs_to_upsert.addAll(TaskStateFields.FAILED_RETRY);
-            }
-        }
-        else if ([QUEUED, RECEIVED].contains(params.state)) {
-            if (![QUEUED, RECEIVED].contains(ctx._source.state)) {
-                attrs_to_upsert.addAll(TaskStateFields.QUEUED_RECEIVED);
-            }
-        }
-        // Merge
-        for (def entry : params.entrySet()) {
-            if (entry.getValue() != null && attrs_to_upsert.contains(entry.getKey())) {
-                ctx._source[entry.getKey()] = entry.getValue();
-            }
-        }
+}
+else if (plan == 5) {
+    // Resolve conflict and merge the safe attributes
+    if (params["started_at"] != null) { ctx._source["started_at"] = params["started_at"]; }
+    if (new_events.contains("QUEUED")) {
+        // QUEUED already merged by the agent, its attributes should not be lost
+        if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+        if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+        if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+        if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+        if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+        if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+        if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+        if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+        if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+        if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+        if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+        if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+        if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+        if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+        if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+        if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+        if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+        if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+        if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+        if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+        if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+        if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+        if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+        if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+        if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+        if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+        if (params["client"] != null) { ctx._source["client"] = params["client"]; }
+    }
+    if (new_events.contains("RECEIVED")) {
+        // RECEIVED already merged by the agent, its attributes should not be lost
+        if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+        if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+        if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+        if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+        if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+        if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+        if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+        if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+        if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+        if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+        if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+        if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+        if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+        if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+        if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+        if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+        if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+        if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+        if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+        if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+        if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+        if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+        if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
     }
 }
+else if (plan == 6) {
+    // Keep the stored task as is
+    ctx.op = 'none';
+}
+else if (plan == 7) {
+    // Resolve conflict and merge the safe attributes
+    if (params["retried_at"] != null) { ctx._source["retried_at"] = params["retried_at"]; }
+    if (params["exception"] != null) { ctx._source["exception"] = params["exception"]; }
+    if (params["traceback"] != null) { ctx._source["traceback"] = params["traceback"]; }
+    if (params["lang"] != null) { ctx._source["lang"] = params["lang"]; }
+    if (params["error"] != null) { ctx._source["error"] = params["error"]; }
+    if (params["stack"] != null) { ctx._source["stack"] = params["stack"]; }
+    if (params["trace"] != null) { ctx._source["trace"] = params["trace"]; }
+}
+else if (plan == 8) {
+    // Resolve conflict and merge the safe attributes
+    if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+    if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+    if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+    if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+    if (params["client"] != null) { ctx._source["client"] = params["client"]; }
+}
+else if (plan == 9) {
+    // Resolve conflict and merge the safe attributes
+    if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
+}
+else if (plan == 10) {
+    // Resolve conflict and merge the safe attributes
+    if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+    if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+    if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+    if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+    if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+    if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+    if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+    if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+    if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+    if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+    if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+    if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+    if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+    if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+    if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+    if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+    if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+    if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+    if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+    if (params["exchange"] != null) { ctx._source["exchange"] = params["exchange"]; }
+    if (params["routing_key"] != null) { ctx._source["routing_key"] = params["routing_key"]; }
+    if (params["queue"] != null) { ctx._source["queue"] = params["queue"]; }
+    if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+    if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+    if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+    if (params["queued_at"] != null) { ctx._source["queued_at"] = params["queued_at"]; }
+    if (params["client"] != null) { ctx._source["client"] = params["client"]; }
+}
+else if (plan == 11) {
+    // Resolve conflict and merge the safe attributes
+    if (params["name"] != null) { ctx._source["name"] = params["name"]; }
+    if (params["name_parts"] != null) { ctx._source["name_parts"] = params["name_parts"]; }
+    if (params["args"] != null) { ctx._source["args"] = params["args"]; }
+    if (params["kwargs"] != null) { ctx._source["kwargs"] = params["kwargs"]; }
+    if (params["args_0"] != null) { ctx._source["args_0"] = params["args_0"]; }
+    if (params["args_1"] != null) { ctx._source["args_1"] = params["args_1"]; }
+    if (params["args_2"] != null) { ctx._source["args_2"] = params["args_2"]; }
+    if (params["args_3"] != null) { ctx._source["args_3"] = params["args_3"]; }
+    if (params["args_4"] != null) { ctx._source["args_4"] = params["args_4"]; }
+    if (params["args_5"] != null) { ctx._source["args_5"] = params["args_5"]; }
+    if (params["args_6"] != null) { ctx._source["args_6"] = params["args_6"]; }
+    if (params["args_7"] != null) { ctx._source["args_7"] = params["args_7"]; }
+    if (params["args_8"] != null) { ctx._source["args_8"] = params["args_8"]; }
+    if (params["args_9"] != null) { ctx._source["args_9"] = params["args_9"]; }
+    if (params["kwargs_flattened"] != null) { ctx._source["kwargs_flattened"] = params["kwargs_flattened"]; }
+    if (params["args_ref"] != null) { ctx._source["args_ref"] = params["args_ref"]; }
+    if (params["kwargs_ref"] != null) { ctx._source["kwargs_ref"] = params["kwargs_ref"]; }
+    if (params["root_id"] != null) { ctx._source["root_id"] = params["root_id"]; }
+    if (params["parent_id"] != null) { ctx._source["parent_id"] = params["parent_id"]; }
+    if (params["eta"] != null) { ctx._source["eta"] = params["eta"]; }
+    if (params["expires"] != null) { ctx._source["expires"] = params["expires"]; }
+    if (params["retries"] != null) { ctx._source["retries"] = params["retries"]; }
+    if (params["received_at"] != null) { ctx._source["received_at"] = params["received_at"]; }
+}
+else if (plan == 12) {
+    // Resolve conflict and merge the safe attributes
+    if (params["started_at"] != null) { ctx._source["started_at"] = params["started_at"]; }
+}
 
 // Introduce custom states
 if (ctx._source.retries != null && ctx._source.retries > 0) {
-    if (ctx._source.state == FAILED) {
-        ctx._source.state = CRITICAL;
+    if (ctx._source.state == "FAILED") {
+        ctx._source.state = "CRITICAL";
     }
-    else if (ctx._source.state == SUCCEEDED) {
-        ctx._source.state = RECOVERED;
+    else if (ctx._source.state == "SUCCEEDED") {
+        ctx._source.state = "RECOVERED";
     }
 }
 
@@ -155,12 +354,6 @@ if (ctx._source.parent_id != null && ctx._source.parent_id.equals(ctx._source.id
 
 // Increment events count
 ctx._source.events_count = events_count + new_events_count;
-// Track the merge operation by the index (I)
-// if (ctx._source.uuid != null) {
-//     for (int i = 0; i < new_events.size(); i++) {
-//         new_events.set(i, "I:"+new_events[i]);
-//     }
-// }
 // Record only past 21 task states transitions
 events.addAll(0, new_events);
 if (events.size() > 21) {
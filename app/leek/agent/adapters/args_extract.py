@@ -1,6 +1,7 @@
 import json
-import ast
-from typing import Any, Dict, Iterable, Optional, Union, List
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterable, Optional, Pattern, Union, List
 
 try:
     import orjson  # Faster JSON parser if available
@@ -8,6 +9,8 @@ try:
 except Exception:
     _json_loads = json.loads
 
+from leek.agent.adapters.literal_parser import literal_eval, literal_eval_items
+
 
 def promote_args(
         args: Union[str, List[Any], tuple],
@@ -23,8 +26,8 @@ def promote_args(
     Parameters
     ------------------------------------------------------------
     args : str | list | tuple
-        - If it's a string, it will be parsed using ast.literal_eval()
-          to safely handle Celery's Python repr format.
+        - If it's a string, it will be parsed as a python literal to safely
+          handle Celery's Python repr format, only the promoted args are parsed.
         - If it's already a list or tuple, it will be used directly.
 
     num_promoted : int
@@ -52,10 +55,15 @@ def promote_args(
     if args is None or args == "" or args == "()":
         return {}
 
-    # Step 1: Parse if string (Celery emits Python repr strings)
+    # Step 1: Parse if string (Celery emits Python repr strings), stop after the promoted args
     if isinstance(args, str):
+        # Every item adds at least 3 characters (", x") to the repr of its container, and every nesting level
+        # at least one, the repr of a container cut after that many items or levels starts with the same max_len
+        # characters as the full one
+        max_items = max_len // 3 + 1 if coerce_to_str else None
+        max_depth = max_len + 1 if coerce_to_str else None
         try:
-            parsed = ast.literal_eval(args)
+            parsed = literal_eval_items(args, num_promoted, max_items=max_items, max_depth=max_depth)
         except Exception:
             # fallback: wrap raw string
             parsed = [args]
@@ -94,6 +102,12 @@ def kwargs_string_to_flat_fast(
         max_string_len: int = 1024,
         skip_paths: Optional[Iterable[str]] = None,
         allow_python_repr_fallback: bool = False,
+        max_keys: Optional[int] = None,
+        allow_pattern: Optional[Pattern] = None,
+        deny_pattern: Optional[Pattern] = None,
+        collapse_lists_above: Optional[int] = None,
+        collapse_policy: str = "json",
+        pruned: Optional[Counter] = None,
 ) -> Dict[str, Any]:
     """
     Convert a possibly messy kwargs string (JSON or Python repr)
@@ -130,8 +144,8 @@ def kwargs_string_to_flat_fast(
         as JSON. Prevents runaway recursion. Default: 12.
 
     max_list_items : int
-        Maximum number of list elements to process (caps very large arrays).
-        Default: 100.
+        Maximum number of list elements, and dict/set items, to process
+        (caps very large containers). Default: 100.
 
     max_string_len : int
         Truncates excessively long string values to this length.
@@ -143,11 +157,35 @@ def kwargs_string_to_flat_fast(
         large nested payloads that don't need to be indexed.
 
     allow_python_repr_fallback : bool
-        Whether to allow fallback to ast.literal_eval() for parsing
+        Whether to allow fallback to a python literal parser for parsing
         Python-like strings (single quotes, tuples, Ellipsis, etc.).
-        This is slower than JSON parsing but increases robustness.
+        This is slower than JSON parsing but increases robustness, list
+        items beyond max_list_items are skipped without being parsed.
         Default: False (for performance).
 
+    max_keys : int | None
+        Maximum number of flattened keys, in document order, the
+        remaining keys are dropped. Default: None (no limit).
+
+    allow_pattern : Pattern | None
+        Only the keys whose path fully matches this pattern are kept
+        (e.g. compiled from path globs). Default: None (all keys).
+
+    deny_pattern : Pattern | None
+        Paths fully matching this pattern are skipped with their whole
+        subtree, before being flattened. Default: None.
+
+    collapse_lists_above : int | None
+        With list_policy="index", lists of more items are stored as a
+        single key, following collapse_policy ("json" or "join"), cut
+        at max_string_len.
+        Default: None (lists are never collapsed).
+
+    pruned : Counter | None
+        If given, incremented with the number of keys dropped/collapsed
+        by the above, by reason: "denied" (subtrees), "not_allowed",
+        "budget" and "collapsed" (lists).
+
     ------------------------------------------------------------
     Returns
     ------------------------------------------------------------
@@ -161,7 +199,7 @@ def kwargs_string_to_flat_fast(
     Performance Notes
     ------------------------------------------------------------
     • Uses orjson if available for very fast parsing.
-    • Avoids ast.literal_eval unless fallback is enabled.
+    • Avoids python literal parsing unless fallback is enabled.
     • O(n) time complexity relative to number of fields.
     • Safe for use in concurrent ingestion threads.
     """
@@ -179,7 +217,8 @@ def kwargs_string_to_flat_fast(
         if allow_python_repr_fallback:
             # Fallback for Python-style dict strings (Celery)
             try:
-                obj = ast.literal_eval(s)
+                # Containers below max_depth are emitted as json, keep them as their repr string
+                obj = literal_eval(s, max_items=max_list_items, max_depth=max_depth + 1)
                 if isinstance(obj, dict):
                     root = obj
             except Exception:
@@ -189,6 +228,30 @@ def kwargs_string_to_flat_fast(
         return {}
 
     skip_set = set(skip_paths or ())
+    if pruned is None:
+        pruned = Counter()
+
+    # ----------------------------------------------------------------------
+    # Helper: store a flattened key, within the allowed paths and the key budget
+    # ----------------------------------------------------------------------
+    def _emit(key: str, value: Any, out: Dict[str, Any]):
+        if allow_pattern is not None and allow_pattern.match(key) is None:
+            pruned["not_allowed"] += 1
+        elif max_keys is not None and len(out) >= max_keys:
+            pruned["budget"] += 1
+        else:
+            out[key] = value
+
+    # ----------------------------------------------------------------------
+    # Helper: store a whole list as a single key
+    # ----------------------------------------------------------------------
+    def _join_list(policy: str, value: List[Any]) -> str:
+        if policy == "join":
+            return join_delim.join(
+                str(_coerce_scalar(v)) if isinstance(v, str) else str(v)
+                for v in value
+            )
+        return json.dumps(value, ensure_ascii=False)
 
     # ----------------------------------------------------------------------
     # Helper: convert simple string scalars into bool/int/float when possible
@@ -238,7 +301,9 @@ def kwargs_string_to_flat_fast(
                 x = x[:max_list_items]
             return [_normalize(v) for v in x]
         if isinstance(x, dict):
-            # Normalize keys to strings
+            # Limit dict size like lists, normalize keys to strings
+            if len(x) > max_list_items:
+                x = dict(islice(x.items(), max_list_items))
             return {str(k): _normalize(v) for k, v in x.items()}
         # Fallback to string
         return _clip_string(str(x))
@@ -250,16 +315,19 @@ def kwargs_string_to_flat_fast(
         # Skip specific paths if requested
         if prefix in skip_set:
             return
+        if deny_pattern is not None and deny_pattern.match(prefix) is not None:
+            pruned["denied"] += 1
+            return
 
         # Stop at max depth to prevent runaway recursion
         if depth > max_depth:
-            out[prefix] = json.dumps(value, ensure_ascii=False)
+            _emit(prefix, json.dumps(value, ensure_ascii=False), out)
             return
 
         # Handle dictionaries
         if isinstance(value, dict):
             if not value:
-                out[prefix] = "{}"
+                _emit(prefix, "{}", out)
                 return
             for k, v in value.items():
                 key = k if not prefix else f"{prefix}{sep}{k}"
@@ -269,25 +337,23 @@ def kwargs_string_to_flat_fast(
         elif isinstance(value, list):
             if list_policy == "index":
                 if not value:
-                    out[prefix] = "[]"
+                    _emit(prefix, "[]", out)
+                elif collapse_lists_above is not None and len(value) > collapse_lists_above:
+                    pruned["collapsed"] += 1
+                    _emit(prefix, _join_list(collapse_policy, value)[:max_string_len], out)
                 else:
                     for i, v in enumerate(value):
                         key = f"{prefix}{sep}{i}"
                         _flatten(key, v, out, depth + 1)
-            elif list_policy == "join":
-                out[prefix] = join_delim.join(
-                    str(_coerce_scalar(v)) if isinstance(v, str) else str(v)
-                    for v in value
-                )
-            else:  # "json"
-                out[prefix] = json.dumps(value, ensure_ascii=False)
+            else:  # "join" | "json"
+                _emit(prefix, _join_list(list_policy, value), out)
 
         # Handle scalars
         else:
             if isinstance(value, str):
-                out[prefix] = _coerce_scalar(value) if coerce_types else value
+                _emit(prefix, _coerce_scalar(value) if coerce_types else value, out)
             else:
-                out[prefix] = value
+                _emit(prefix, value, out)
 
     # ----------------------------------------------------------------------
     # Main execution
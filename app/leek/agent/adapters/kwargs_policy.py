@@ -0,0 +1,94 @@
+import re
+import json
+import fnmatch
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from leek.agent.adapters.args_extract import kwargs_string_to_flat_fast
+
+COLLAPSE_POLICIES = ("json", "join")
+# Flattening of the kwargs of every task, a policy only adds its budget and pruning to them
+FLATTEN_OPTIONS = dict(
+    sep=".",
+    list_policy="index",
+    join_delim=",",
+    coerce_types=False,
+    max_depth=12,
+    max_string_len=100,
+    max_list_items=100,
+    allow_python_repr_fallback=True,
+)
+
+
+def compile_globs(globs: List[str]) -> Optional[Pattern]:
+    # All the globs are matched by a single regex
+    return re.compile("|".join(fnmatch.translate(glob) for glob in globs)) if globs else None
+
+
+@dataclass
+class KwargsPolicy:
+    """
+    Per application budget of the flattened kwargs (kwargs_flattened), every flattened key is indexed:
+        {"max_keys": 200, "deny": ["payload.*", "*.token"], "allow": [], "collapse_lists_above": 10,
+         "collapse_mode": "json"}
+    `allow`/`deny` are globs of flattened paths (e.g. order.items.0.sku), denied paths are pruned with their
+    subtree, `allow` keeps only the matching keys. Lists of more than `collapse_lists_above` items are stored
+    as a single key. Keys beyond `max_keys` are dropped.
+
+    Dropped/collapsed keys are counted by reason in `pruned`, flattened results are cached (per policy) and the
+    counts of a cached result are replayed on every hit.
+    """
+    max_keys: Optional[int]
+    allow: Optional[Pattern]
+    deny: Optional[Pattern]
+    collapse_lists_above: Optional[int]
+    collapse_mode: str
+    # Distinguishes the results of different policies in the parse cache
+    digest: bytes
+    pruned: Counter = field(default_factory=Counter)
+
+    @classmethod
+    def compile(cls, policy: Dict) -> "KwargsPolicy":
+        max_keys = policy.get("max_keys")
+        if max_keys is not None and (not isinstance(max_keys, int) or max_keys < 1):
+            raise ValueError("Kwargs policy max_keys should be a positive integer")
+        collapse_lists_above = policy.get("collapse_lists_above")
+        if collapse_lists_above is not None and (not isinstance(collapse_lists_above, int) or collapse_lists_above < 0):
+            raise ValueError("Kwargs policy collapse_lists_above should be a non negative integer")
+        collapse_mode = policy.get("collapse_mode", "json")
+        if collapse_mode not in COLLAPSE_POLICIES:
+            raise ValueError(f"Kwargs policy collapse_mode should be one of {', '.join(COLLAPSE_POLICIES)}")
+        allow, deny = policy.get("allow") or [], policy.get("deny") or []
+        if not all(isinstance(glob, str) for glob in (*allow, *deny)):
+            raise ValueError("Kwargs policy allow/deny should be lists of path globs")
+        return cls(
+            max_keys=max_keys,
+            allow=compile_globs(allow),
+            deny=compile_globs(deny),
+            collapse_lists_above=collapse_lists_above,
+            collapse_mode=collapse_mode,
+            digest=hashlib.blake2b(json.dumps(policy, sort_keys=True).encode("utf-8"), digest_size=16).digest(),
+        )
+
+    def flatten(self, raw: str) -> Tuple[Dict[str, Any], Counter]:
+        pruned = Counter()
+        flat = kwargs_string_to_flat_fast(
+            raw,
+            **FLATTEN_OPTIONS,
+            max_keys=self.max_keys,
+            allow_pattern=self.allow,
+            deny_pattern=self.deny,
+            collapse_lists_above=self.collapse_lists_above,
+            collapse_policy=self.collapse_mode,
+            pruned=pruned,
+        )
+        return flat, pruned
+
+    def take_pruned(self) -> Counter:
+        """
+        Counts since the latest call, by reason
+        """
+        pruned, self.pruned = self.pruned, Counter()
+        return pruned
@@ -0,0 +1,288 @@
+import ast
+import re
+from typing import Any, List, Optional, Tuple
+
+WHITESPACES = " \t\n\r\f\v"
+NUMBER_START = "-.0123456789"
+# Integers are captured by the group, floats are not
+NUMBER = re.compile(r"-?(?:(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|\d+[eE][-+]?\d+|(\d+))")
+PREFIXED_STRING = re.compile(r"""[bBrRuU]{1,2}(?:'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")""")
+CONSTANTS = (("True", True), ("False", False), ("None", None), ("...", Ellipsis))
+# Strings and anything but brackets, consumed at once when skipping a value
+SKIP_FLAT = re.compile(r"""(?:[^'"()\[\]{}]+|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")*""")
+STRING_END = {
+    "'": re.compile(r"(?:[^'\\\n]|\\.)*'"),
+    '"': re.compile(r'(?:[^"\\\n]|\\.)*"'),
+}
+CLOSING = {"(": ")", "[": "]", "{": "}"}
+
+
+class UnsupportedLiteral(ValueError):
+    """
+    The repr is not a literal, or uses a syntax the parser does not handle (callers fall back to ast.literal_eval)
+    """
+
+
+class LiteralParser:
+    """
+    Restricted recursive descent parser of python literal reprs (Celery argsrepr/kwargsrepr):
+    strings, numbers, True/False/None, Ellipsis, tuples, lists, dicts and sets.
+
+    Unlike ast.literal_eval, it does not build an AST of the whole string: containers items beyond `max_items`
+    are skipped without being parsed or materialized (sets keep their first items in the repr order), containers
+    nested deeper than `max_depth` are kept as their repr string, and parse_items() stops after the requested
+    number of top level items. Anything outside this subset (escape sequences are left to the python parser,
+    one string at a time) raises UnsupportedLiteral.
+    """
+
+    def __init__(self, text: str, max_items: Optional[int] = None, max_depth: Optional[int] = None):
+        self.text = text
+        self.length = len(text)
+        self.max_items = max_items
+        self.max_depth = max_depth
+        # Nesting level of the container being parsed, the outermost one is 1
+        self.depth = 0
+
+    def next_char(self, pos: int) -> Tuple[str, int]:
+        """
+        Next non whitespace character and its position, empty at the end of the text
+        """
+        text = self.text
+        while pos < self.length:
+            c = text[pos]
+            if c not in WHITESPACES:
+                return c, pos
+            pos += 1
+        return "", pos
+
+    def parse(self) -> Any:
+        value, pos = self.value(0)
+        c, pos = self.next_char(pos)
+        if c:
+            raise UnsupportedLiteral(f"Unexpected {c} at {pos}")
+        return value
+
+    def parse_items(self, count: int) -> List[Any]:
+        """
+        First `count` items of a tuple/list repr, other values are returned as the only item
+        """
+        c, pos = self.next_char(0)
+        if c != "(" and c != "[":
+            return [self.parse()]
+        closing = CLOSING[c]
+        items = []
+        pos += 1
+        self.depth = 1
+        c, end = self.next_char(pos)
+        if c == closing:
+            return items
+        while len(items) < count:
+            value, pos = self.value(pos)
+            c, pos = self.next_char(pos)
+            if c == closing:
+                if closing == ")" and not items:
+                    # Parenthesized value, not a tuple
+                    return self.as_items(value)
+                items.append(value)
+                return items
+            if c != ",":
+                raise UnsupportedLiteral(f"Expected , or {closing} at {pos}")
+            items.append(value)
+            pos += 1
+            c, end = self.next_char(pos)
+            if c == closing:
+                return items
+        return items
+
+    @staticmethod
+    def as_items(value) -> List[Any]:
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [value]
+
+    def value(self, pos: int) -> Tuple[Any, int]:
+        c, pos = self.next_char(pos)
+        if c == "'" or c == '"':
+            return self.string(c, pos)
+        if c == "(" or c == "[" or c == "{":
+            if self.depth == self.max_depth:
+                # Too deep, kept as is without being parsed
+                end = self.skip(pos + 1, CLOSING[c])
+                return self.text[pos:end], end
+            self.depth += 1
+            if c == "(":
+                value, pos = self.sequence(pos + 1, ")", tuple)
+            elif c == "[":
+                value, pos = self.sequence(pos + 1, "]", list)
+            else:
+                value, pos = self.mapping(pos + 1)
+            self.depth -= 1
+            return value, pos
+        text = self.text
+        if c and c in NUMBER_START and not text.startswith("...", pos):
+            m = NUMBER.match(text, pos)
+            if m is None:
+                raise UnsupportedLiteral(f"Unsupported number at {pos}")
+            digits = m.group(1)
+            if digits is None:
+                return float(m.group()), m.end()
+            if len(digits) > 1 and digits[0] == "0":
+                # Invalid literal unless all zeros, left to the python parser
+                raise UnsupportedLiteral(f"Unsupported number at {pos}")
+            return int(m.group()), m.end()
+        for name, constant in CONSTANTS:
+            if text.startswith(name, pos):
+                return constant, pos + len(name)
+        m = PREFIXED_STRING.match(text, pos)
+        if m is not None:
+            return ast.literal_eval(m.group()), m.end()
+        raise UnsupportedLiteral(f"Unexpected {c} at {pos}")
+
+    def string(self, quote: str, pos: int) -> Tuple[str, int]:
+        text = self.text
+        end = text.find(quote, pos + 1)
+        if end < 0:
+            raise UnsupportedLiteral(f"Unterminated string at {pos}")
+        if text.find("\\", pos + 1, end) >= 0 or text.find("\n", pos + 1, end) >= 0:
+            # Escape sequences are decoded by the python parser
+            m = STRING_END[quote].match(text, pos + 1)
+            if m is None:
+                raise UnsupportedLiteral(f"Unterminated string at {pos}")
+            return ast.literal_eval(text[pos:m.end()]), m.end()
+        return text[pos + 1:end], end + 1
+
+    def key(self, pos: int) -> Tuple[Any, int]:
+        """
+        Dict keys and set items are never truncated, they end up as is in the result
+        """
+        c, pos = self.next_char(pos)
+        if self.max_items is None or c not in "([{":
+            return self.value(pos)
+        max_items, self.max_items = self.max_items, None
+        try:
+            return self.value(pos)
+        finally:
+            self.max_items = max_items
+
+    def sequence(self, pos: int, closing: str, factory) -> Tuple[Any, int]:
+        items = []
+        c, end = self.next_char(pos)
+        if c == closing:
+            return factory(items), end + 1
+        max_items = self.max_items
+        while True:
+            if max_items is not None and len(items) >= max_items:
+                return factory(items), self.skip(pos, closing)
+            value, pos = self.value(pos)
+            c, pos = self.next_char(pos)
+            if c == closing:
+                if closing == ")" and not items:
+                    # Parenthesized value, not a tuple
+                    return value, pos + 1
+                items.append(value)
+                return factory(items), pos + 1
+            if c != ",":
+                raise UnsupportedLiteral(f"Expected , or {closing} at {pos}")
+            items.append(value)
+            pos += 1
+            c, end = self.next_char(pos)
+            if c == closing:
+                return factory(items), end + 1
+
+    def mapping(self, pos: int) -> Tuple[Any, int]:
+        c, end = self.next_char(pos)
+        if c == "}":
+            return {}, end + 1
+        first, pos = self.key(pos)
+        c, pos = self.next_char(pos)
+        if c == ":":
+            return self.dict_items(first, pos + 1)
+        # Set
+        items = {first}
+        max_items = self.max_items
+        while True:
+            if c == "}":
+                return items, pos + 1
+            if c != ",":
+                raise UnsupportedLiteral(f"Expected , or }} at {pos}")
+            pos += 1
+            c, end = self.next_char(pos)
+            if c == "}":
+                return items, end + 1
+            if max_items is not None and len(items) >= max_items:
+                return items, self.skip(pos, "}")
+            value, pos = self.key(pos)
+            items.add(value)
+            c, pos = self.next_char(pos)
+
+    def dict_items(self, key: Any, pos: int) -> Tuple[Any, int]:
+        items = {}
+        max_items = self.max_items
+        while True:
+            value, pos = self.value(pos)
+            items[key] = value
+            c, pos = self.next_char(pos)
+            if c == "}":
+                return items, pos + 1
+            if c != ",":
+                raise UnsupportedLiteral(f"Expected , or }} at {pos}")
+            pos += 1
+            c, end = self.next_char(pos)
+            if c == "}":
+                return items, end + 1
+            if max_items is not None and len(items) >= max_items:
+                return items, self.skip(pos, "}")
+            key, pos = self.key(pos)
+            c, pos = self.next_char(pos)
+            if c != ":":
+                raise UnsupportedLiteral(f"Expected : at {pos}")
+            pos += 1
+
+    def skip(self, pos: int, closing: str) -> int:
+        """
+        Skip the remaining items of a container without parsing them
+        :return: position after the closing bracket
+        """
+        text = self.text
+        stack = [closing]
+        while True:
+            pos = SKIP_FLAT.match(text, pos).end()
+            if pos >= self.length:
+                raise UnsupportedLiteral("Unterminated container")
+            char = text[pos]
+            pos += 1
+            if char in CLOSING:
+                stack.append(CLOSING[char])
+            elif char in ")]}":
+                if char != stack.pop():
+                    raise UnsupportedLiteral(f"Unbalanced {char} at {pos}")
+                if not stack:
+                    return pos
+            else:
+                raise UnsupportedLiteral(f"Unterminated string at {pos}")
+
+
+def literal_eval(text: str, max_items: Optional[int] = None, max_depth: Optional[int] = None) -> Any:
+    """
+    Same as ast.literal_eval, containers items beyond `max_items` are dropped without being parsed, containers
+    nested deeper than `max_depth` are kept as their repr string
+    """
+    try:
+        return LiteralParser(text, max_items=max_items, max_depth=max_depth).parse()
+    except UnsupportedLiteral:
+        return ast.literal_eval(text)
+
+
+def literal_eval_items(
+        text: str, count: int, max_items: Optional[int] = None, max_depth: Optional[int] = None
+) -> List[Any]:
+    """
+    First `count` items of a tuple/list repr, as ast.literal_eval would parse them, the remaining items are not
+    parsed. Non sequence values are returned as the only item. Nested containers items beyond `max_items` are
+    dropped without being parsed, containers nested deeper than `max_depth` (the tuple/list itself included)
+    are kept as their repr string.
+    """
+    try:
+        return LiteralParser(text, max_items=max_items, max_depth=max_depth).parse_items(count)
+    except UnsupportedLiteral:
+        return LiteralParser.as_items(ast.literal_eval(text))[:count]
@@ -0,0 +1,191 @@
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from ciso8601 import parse_datetime
+
+from leek.agent.adapters.kwargs_policy import KwargsPolicy
+from leek.agent.adapters.name_extract import split_fqn
+from leek.agent.adapters.parse_cache import parse_args, parse_kwargs, parse_traceback
+from leek.agent.adapters.stacktrace_extract import fingerprint
+from leek.agent.adapters import task as task_adapter
+from leek.agent.adapters import worker as worker_adapter
+from leek.agent.models.task import Task
+from leek.agent.models.worker import Worker
+
+HISTORICAL_TS_NAMES = {
+    "task-sent": "queued_at",
+    "task-received": "received_at",
+    "task-started": "started_at",
+    "task-succeeded": "succeeded_at",
+    "task-failed": "failed_at",
+    "task-rejected": "rejected_at",
+    "task-revoked": "revoked_at",
+    "task-retried": "retried_at",
+    "worker-online": "online_at",
+    "worker-heartbeat": "last_heartbeat_at",
+    "worker-offline": "offline_at",
+}
+
+# Exact python types of the values decoded from JSON, per JSON schema type
+JSON_TYPES = {
+    "string": (str,),
+    "number": (float, int),
+    "integer": (int,),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+    "null": (type(None),),
+}
+
+TRACEBACK_MAX_LENGTH = 30000
+
+
+def compile_field_types(json_schema: Dict) -> Tuple[Dict[str, FrozenSet[type]], FrozenSet[str]]:
+    """
+    Compile the properties of an event JSON schema to the exact types accepted for each field
+    :return: accepted types by field, required fields
+    """
+
+    def types_of(definition):
+        if "anyOf" in definition:
+            return frozenset(t for d in definition["anyOf"] for t in types_of(d))
+        if "enum" in definition:
+            return frozenset(type(v) for v in definition["enum"])
+        return frozenset(JSON_TYPES[definition["type"]])
+
+    fields = {name: types_of(definition) for name, definition in json_schema["properties"].items()}
+    return fields, frozenset(json_schema["required"])
+
+
+class EventNormalizer:
+    """
+    Validate an event and map it to its task/worker model in a single pass, compiled once per event type.
+
+    The fast path only checks the exact type of every field against the schema. Anything unusual (unknown or
+    missing fields, unexpected types) is handed to the compiled JSON schema, which raises the same errors as
+    before, or accepts the few values the fast path does not know about (integral floats for integers...).
+    Events of a type come in a handful of shapes (fields and their types), shapes that passed the fast path are
+    remembered so that most events are checked with a single lookup.
+    """
+    SHAPES_CACHE_SIZE = 1024
+
+    def __init__(self, ev_type: str, kind: str, state: str, json_schema: Dict, validate: Callable):
+        self.ev_type = ev_type
+        self.kind = kind
+        self.state = state
+        self.historical_ts_name = HISTORICAL_TS_NAMES[ev_type]
+        # Tasks hostname is the client for sent events and the worker for the others
+        self.origin = "client" if state == "QUEUED" else "worker"
+        self.fields, self.required = compile_field_types(json_schema)
+        self.validate = validate
+        self.shapes = set()
+        self.normalize = self.normalize_task if kind == "task" else self.normalize_worker
+
+    def check(self, event: Dict):
+        shape = (tuple(event), tuple(map(type, event.values())))
+        if shape in self.shapes:
+            return
+        fields = self.fields
+        for key, value in event.items():
+            accepted = fields.get(key)
+            if accepted is None or type(value) not in accepted:
+                self.validate(event)
+                return
+        if not event.keys() >= self.required:
+            self.validate(event)
+            return
+        if len(self.shapes) >= self.SHAPES_CACHE_SIZE:
+            self.shapes.clear()
+        self.shapes.add(shape)
+
+    def common_fields(self, doc: Dict, app_env: str, updated_at: int):
+        exact_timestamp = doc["timestamp"]
+        timestamp = int(exact_timestamp * 1000)
+        doc["kind"] = self.kind
+        doc["state"] = self.state
+        doc["timestamp"] = timestamp
+        doc["exact_timestamp"] = exact_timestamp
+        doc[self.historical_ts_name] = timestamp
+        doc["app_env"] = app_env
+        doc["updated_at"] = updated_at
+
+    def normalize_worker(
+            self, event: Dict, app_env: str, updated_at: int, kwargs_policy: Optional[KwargsPolicy] = None
+    ) -> Tuple[str, Worker]:
+        self.check(event)
+        doc = event.copy()
+        del doc["type"]
+        self.common_fields(doc, app_env, updated_at)
+        return doc["hostname"], Worker(id=doc["hostname"], **doc)
+
+    def normalize_task(
+            self, event: Dict, app_env: str, updated_at: int, kwargs_policy: Optional[KwargsPolicy] = None
+    ) -> Tuple[str, Task]:
+        self.check(event)
+        doc = event.copy()
+        del doc["type"]
+        self.common_fields(doc, app_env, updated_at)
+        doc[self.origin] = doc.pop("hostname")
+        doc["events"] = [self.state]
+        # Adapt timestamps
+        eta = doc.get("eta")
+        if eta is not None:
+            doc["eta"] = int(parse_datetime(eta).timestamp() * 1000)
+        expires = doc.get("expires")
+        if expires is not None:
+            doc["expires"] = int(parse_datetime(expires).timestamp() * 1000)
+        traceback = doc.get("traceback")
+        if traceback is not None:
+            add_error(doc, traceback)
+        args = doc.get("args")
+        if args is not None:
+            doc.update(parse_args(args))
+        kwargs = doc.get("kwargs")
+        if kwargs is not None:
+            doc["kwargs_flattened"] = parse_kwargs(kwargs, kwargs_policy)
+        name = doc.get("name")
+        if name is not None:
+            doc["name_parts"] = split_fqn(name)
+        return doc["uuid"], Task(id=doc["uuid"], **doc)
+
+
+def add_error(doc: Dict, traceback: str):
+    # Optimization: do not parse Retry exceptions, they tend to flood the search backend
+    # when the number of retries for batch tasks are high.
+    # Keep the retry traceback short to avoid high indexing latency during batch processing
+    if "celery.exceptions.Retry:" in traceback:
+        message = doc.get("exception", "")[:TRACEBACK_MAX_LENGTH]
+        doc["error"] = {
+            "type": "celery.exceptions.Retry",
+            "message": message,
+            "fingerprint": fingerprint("celery.exceptions.Retry", message),
+        }
+        trace = f"celery.exceptions.Retry: {doc.get('exception')}"[:TRACEBACK_MAX_LENGTH]
+        doc["trace"] = {
+            "raw": trace,
+            "text": trace,
+            "wc": trace
+        }
+        doc["lang"] = "python"
+        doc["stack"] = []
+    else:
+        doc["traceback"] = traceback[:TRACEBACK_MAX_LENGTH]
+        stacktrace = parse_traceback(doc["traceback"])
+        doc["lang"] = stacktrace["lang"]
+        doc["error"] = stacktrace["error"]
+        # The parsed frames are not indexed, the trace is
+        doc["stack"] = []
+        doc["trace"] = stacktrace["trace"]
+
+
+NORMALIZERS: Dict[str, EventNormalizer] = {
+    **{
+        ev_type: EventNormalizer(ev_type, "task", state, task_adapter.json_schema,
+                                 task_adapter.CompiledTaskEventSchema)
+        for ev_type, state in task_adapter.TASK_STATE_MAPPING.items()
+    },
+    **{
+        ev_type: EventNormalizer(ev_type, "worker", state, worker_adapter.json_schema,
+                                 worker_adapter.CompiledWorkerEventSchema)
+        for ev_type, state in worker_adapter.WORKER_STATE_MAPPING.items()
+    },
+}
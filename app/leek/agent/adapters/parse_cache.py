@@ -0,0 +1,111 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from leek.agent.adapters.args_extract import promote_args, kwargs_string_to_flat_fast
+from leek.agent.adapters.kwargs_policy import FLATTEN_OPTIONS, KwargsPolicy
+from leek.agent.adapters.stacktrace_extract import extract_stacktrace
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of parse results, keyed by a digest of the raw string.
+
+    The same args/kwargs show up on the sent and received events of a task, and retry/failure storms emit the same
+    traceback over and over. Keys are digests so that long raw strings are not kept alive by the cache. A cache
+    is meant for a single parse function, parse functions with different parameters (policies) use their own
+    namespace. Cached results are shared between events, callers must not mutate them.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self.entries: Dict[bytes, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(raw: str, namespace: bytes = b"") -> bytes:
+        return hashlib.blake2b(raw.encode("utf-8", "surrogatepass"), digest_size=16, key=namespace).digest()
+
+    def get(self, raw: str, parse: Callable[[str], Any], namespace: bytes = b"") -> Any:
+        key = self.key(raw, namespace)
+        try:
+            result = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            result = parse(raw)
+            self.entries[key] = result
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return result
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+ARGS_CACHE = ParseCache("args", 10000)
+KWARGS_CACHE = ParseCache("kwargs", 10000)
+# Tracebacks are much larger, up to 30000 characters each
+TRACEBACKS_CACHE = ParseCache("traceback", 1000)
+CACHES = (ARGS_CACHE, KWARGS_CACHE, TRACEBACKS_CACHE)
+
+# Cumulative stats of the caches of other processes (validation shards) by process name
+remote_stats: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+
+def _promote_args(raw: str) -> Dict[str, Any]:
+    return promote_args(raw, 10)
+
+
+def _flatten_kwargs(raw: str) -> Dict[str, Any]:
+    return kwargs_string_to_flat_fast(raw, **FLATTEN_OPTIONS)
+
+
+def _extract_stacktrace(raw: str) -> Dict[str, Any]:
+    return extract_stacktrace(raw=raw, dedupe_duplicate_frames=True)
+
+
+def parse_args(args: str) -> Dict[str, Any]:
+    return ARGS_CACHE.get(args, _promote_args)
+
+
+def parse_kwargs(kwargs: str, policy: Optional[KwargsPolicy] = None) -> Dict[str, Any]:
+    if policy is None:
+        return KWARGS_CACHE.get(kwargs, _flatten_kwargs)
+    flat, pruned = KWARGS_CACHE.get(kwargs, policy.flatten, namespace=policy.digest)
+    if pruned:
+        policy.pruned.update(pruned)
+    return flat
+
+
+def parse_traceback(traceback: str) -> Dict[str, Any]:
+    return TRACEBACKS_CACHE.get(traceback, _extract_stacktrace)
+
+
+def stats() -> Dict[str, Tuple[int, int]]:
+    """
+    Cumulative (hits, misses) of the caches of the current process
+    """
+    return {cache.name: (cache.hits, cache.misses) for cache in CACHES}
+
+
+def record_remote_stats(process_name: str, process_stats: Dict[str, Tuple[int, int]]):
+    remote_stats[process_name] = process_stats
+
+
+def total_stats() -> Dict[str, Tuple[int, int]]:
+    """
+    Cumulative (hits, misses) of the caches of the current process and of its validation shards
+    """
+    totals = stats()
+    for process_stats in list(remote_stats.values()):
+        for name, (hits, misses) in process_stats.items():
+            total_hits, total_misses = totals.get(name, (0, 0))
+            totals[name] = (total_hits + hits, total_misses + misses)
+    return totals
@@ -1,138 +1,56 @@
-from typing import Tuple, Union, Dict, Iterable
+from typing import Any, Tuple, Union, Dict, Iterable, Optional, List
 import time
 
-from ciso8601 import parse_datetime
 from fastjsonschema import JsonSchemaException
 from schema import SchemaError
 
-from leek.agent.adapters.args_extract import promote_args, kwargs_string_to_flat_fast
-from leek.agent.adapters.name_extract import split_fqn
-from leek.agent.adapters.stacktrace_extract import extract_stacktrace
+from leek.agent.adapters.kwargs_policy import KwargsPolicy
+from leek.agent.adapters.normalizer import NORMALIZERS
 from leek.agent.logger import get_logger
 from leek.agent.models.task import Task
 from leek.agent.models.worker import Worker
-from leek.agent.adapters.task import TASK_EVENT_TYPES, TASK_STATE_MAPPING, CompiledTaskEventSchema
-from leek.agent.adapters.worker import WORKER_EVENT_TYPES, WORKER_STATE_MAPPING, CompiledWorkerEventSchema
-
-HISTORICAL_TS_NAMES = {
-    "task-sent": "queued_at",
-    "task-received": "received_at",
-    "task-started": "started_at",
-    "task-succeeded": "succeeded_at",
-    "task-failed": "failed_at",
-    "task-rejected": "rejected_at",
-    "task-revoked": "revoked_at",
-    "task-retried": "retried_at",
-    "worker-online": "online_at",
-    "worker-heartbeat": "last_heartbeat_at",
-    "worker-offline": "offline_at",
-}
-
-EVENT_TYPE_STATE_MAPPING = {
-    **TASK_STATE_MAPPING,
-    **WORKER_STATE_MAPPING,
-}
 
 logger = get_logger(__name__)
 
 
-def validate_event(ev) -> Tuple[str, dict]:
-    ev_type = ev.get("type")
-    if ev_type in TASK_EVENT_TYPES:
-        return "task", CompiledTaskEventSchema(ev)
-    elif ev_type in WORKER_EVENT_TYPES:
-        return "worker", CompiledWorkerEventSchema(ev)
-    else:
+def normalize_event(event, app_env, updated_at, kwargs_policy=None) -> Tuple[str, Union[Task, Worker]]:
+    ev_type = event.get("type")
+    normalizer = NORMALIZERS.get(ev_type) if isinstance(ev_type, str) else None
+    if normalizer is None:
         raise SchemaError(f"{ev_type} is not a valid celery event type!")
+    return normalizer.normalize(event, app_env, updated_at, kwargs_policy)
 
 
-def get_custom_fields(kind, ev_type, event):
-    exact_timestamp = event.get("timestamp")
-    timestamp = int(exact_timestamp * 1000)
-    return {
-        "kind": kind,
-        "state": EVENT_TYPE_STATE_MAPPING.get(ev_type),
-        "timestamp": timestamp,
-        "exact_timestamp": exact_timestamp,
-        HISTORICAL_TS_NAMES.get(ev_type): timestamp,
-    }
-
-
-def add_custom_attributes(kind, event, app_env, updated_at) -> Tuple[str, Union[Task, Worker]]:
-    ev_type = event.pop("type")
-    custom = get_custom_fields(kind, ev_type, event)
-    event.update(custom)
-    event["app_env"] = app_env
-    event["updated_at"] = updated_at
-    if kind == "task":
-        # Adapt timestamps
-        if event.get("eta", None) is not None:
-            event["eta"] = int(parse_datetime(event["eta"]).timestamp() * 1000)
-        if event.get("expires", None) is not None:
-            event["expires"] = int(parse_datetime(event["expires"]).timestamp() * 1000)
-        if event.get("traceback", None) is not None:
-            # Optimization: do not parse Retry exceptions, they tend to flood the search backend
-            # when the number of retries for batch tasks are high.
-            # Keep the retry traceback short to avoid high indexing latency during batch processing
-            if "celery.exceptions.Retry:" in event["traceback"]:
-                event["error"] = {
-                    "type": "celery.exceptions.Retry",
-                    "message": event.get("exception", "")[:30000]
-                }
-                trace = f"celery.exceptions.Retry: {event.get('exception')}"[:30000]
-                event["trace"] = {
-                    "raw": trace,
-                    "text": trace,
-                    "wc": trace
-                }
-                event["lang"] = "python"
-                event["stack"] = []
-            else:
-                event["traceback"] = event["traceback"][:30000]
-                stacktrace = extract_stacktrace(raw=event["traceback"], dedupe_duplicate_frames=True)
-                event["lang"] = stacktrace["lang"]
-                event["error"] = stacktrace["error"]
-                # TODO: will add support for this soon
-                event["stack"] = []  # stacktrace["stack"]
-                event["trace"] = stacktrace["trace"]
-        if event.get("args", None) is not None:
-            promoted_args = promote_args(event["args"], 10)
-            event.update(promoted_args)
-        if event.get("kwargs", None) is not None:
-            event["kwargs_flattened"] = kwargs_string_to_flat_fast(
-                event["kwargs"],
-                sep=".",
-                list_policy="index",
-                join_delim=",",
-                coerce_types=False,
-                max_depth=12,
-                max_string_len=100,
-                max_list_items=100,
-                allow_python_repr_fallback=True,
-            )
-        if event.get("name", None) is not None:
-            event["name_parts"] = split_fqn(event["name"])
-        # Adapt hostname
-        origin = "client" if event["state"] == "QUEUED" else "worker"
-        event[origin] = event.pop("hostname")
-        event["events"] = [event['state']]
-        # event["events"] = [f"A:{event['state']}"]
-        event_obj = Task(id=event["uuid"], **event)
-    else:
-        event_obj = Worker(id=event["hostname"], **event)
-    return event_obj.id, event_obj
+def get_failure_reason(e: Exception) -> str:
+    if isinstance(e, SchemaError):
+        return "unknown_event_type"
+    if isinstance(e, JsonSchemaException):
+        return f"schema_{getattr(e, 'rule', None) or 'invalid'}"
+    return "processing_error"
 
 
-def validate_payload(payload: Iterable[Dict], app_env) -> Dict[str, Union[Task, Worker]]:
+def validate_payload(
+        payload: Iterable[Dict],
+        app_env,
+        rejected: Optional[List[Tuple[str, str, Dict]]] = None,
+        kwargs_policy: Optional[KwargsPolicy] = None,
+) -> Dict[str, Union[Task, Worker]]:
+    """
+    Validate, normalize and merge (per task/worker) a batch of events.
+    Events are isolated from each other, an event that can't be processed is dropped and the rest of the batch
+    proceeds.
+    :param payload: batch of celery events
+    :param app_env: application environment
+    :param rejected: if given, extended with a (reason, error, event) tuple for every dropped event
+    :param kwargs_policy: application budget of the flattened kwargs, pruned keys are counted in the policy
+    :return: validated events by id
+    """
     validated_payload = {}
+    updated_at = int(time.time() * 1000)
     for event in payload:
         try:
-            # Validate
-            kind, validated_event = validate_event(event)
-            # Add custom attributes
-            event_obj_id, event_obj = add_custom_attributes(
-                kind, validated_event, app_env, int(time.time() * 1000)
-            )
+            # Validate and normalize, the event itself is left untouched
+            event_obj_id, event_obj = normalize_event(event, app_env, updated_at, kwargs_policy)
             # Merge
             if event_obj_id in validated_payload:
                 # Upsert
@@ -142,4 +60,24 @@ def validate_payload(payload: Iterable[Dict], app_env) -> Dict[str, Union[Task,
                 validated_payload[event_obj_id] = event_obj
         except (SchemaError, JsonSchemaException) as e:
             logger.warning(f"Validation error [{e}] with event {event}")
+            if rejected is not None:
+                rejected.append((get_failure_reason(e), str(e), event))
+        except Exception as e:
+            logger.error(f"Processing error [{e.__class__.__name__}: {e}] with event {event}")
+            if rejected is not None:
+                rejected.append((get_failure_reason(e), f"{e.__class__.__name__}: {e}", event))
     return validated_payload
+
+
+def to_docs(events: Iterable[Union[Task, Worker]], rejected: List[Tuple[str, str, Any]]) -> List[Dict]:
+    """
+    Documents of the merged events, an event that can't be serialized is dropped and added to `rejected`
+    """
+    docs = []
+    for event in events:
+        try:
+            docs.append(event.to_doc())
+        except Exception as ex:
+            logger.error(f"Failed to serialize event {event.id}: {ex}")
+            rejected.append(("serialization_error", f"{ex.__class__.__name__}: {ex}", repr(event)))
+    return docs
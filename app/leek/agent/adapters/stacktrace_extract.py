@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import hashlib
 import re
 from pathlib import Path
 
@@ -43,6 +44,44 @@ def dedupe_frames(frames):
     return uniq
 
 
+# ---------------- Fingerprint ----------------
+# Stable identifier of an exception, so that grouping errors is a terms aggregation on a keyword instead of
+# wildcard queries over the traces. Variable parts of the message are masked, line numbers are left out of the
+# frames as they shift from a release to another.
+
+FINGERPRINT_FRAMES = 3
+FINGERPRINT_MESSAGE_MAX_LENGTH = 512
+MESSAGE_MASKS = (
+    (re.compile(r'(?:\b[A-Za-z]:)?(?:[\\/][\w.\-~@%+]+){2,}[\\/]?'), "<path>"),
+    (re.compile(r'\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b'), "<uuid>"),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b'), "<hex>"),
+    (re.compile(r'\d+(?:\.\d+)?'), "<num>"),
+    (re.compile(r'\s+'), " "),
+)
+
+
+def normalize_message(message):
+    for pattern, mask in MESSAGE_MASKS:
+        message = pattern.sub(mask, message)
+    return message.strip()[:FINGERPRINT_MESSAGE_MAX_LENGTH]
+
+
+def top_frames(raw, lang):
+    """
+    Innermost frames of the trace as "file:function", frames are parsed even though the stack is not stored yet
+    """
+    if lang != "python":
+        return []
+    frames = [(m.group(1), m.group(3).strip()) for m in PY_FRAME.finditer(raw)]
+    # Python prints the innermost frame last, paths differ between hosts/virtualenvs, keep the file name only
+    return [f"{Path(file).name}:{function}" for file, function in reversed(frames[-FINGERPRINT_FRAMES:])]
+
+
+def fingerprint(error_type, message, frames=()):
+    payload = "\x1f".join((error_type, normalize_message(message), *frames))
+    return hashlib.blake2b(payload.encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+
+
 # ---------------- Language Parsers ----------------
 # Each parser returns an output dict or None.
 
@@ -232,4 +271,8 @@ def extract_stacktrace(raw: str, dedupe_duplicate_frames: bool = False):
     if dedupe_duplicate_frames:
         out["stack"] = dedupe_frames(out["stack"])
 
+    error = out["error"]
+    # Unknown traces have no type/message, fall back to their last line
+    message = error["message"] if error["type"] else (raw.strip().splitlines() or [""])[-1]
+    error["fingerprint"] = fingerprint(error["type"], message, top_frames(raw, out["lang"]))
     return out
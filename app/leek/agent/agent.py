@@ -2,78 +2,245 @@ import gevent
 from gevent import monkey
 monkey.patch_all()
 
+from gevent.event import Event
+
+import os
 import json
-from signal import signal, SIGTERM
+import time
+import zlib
+from signal import signal, SIGTERM, SIG_DFL
 from multiprocessing import Process
 
 from leek.agent.logger import get_logger
 from leek.agent.consumer import LeekConsumer
+from leek.agent.rules import InvalidRule
+from leek.agent.metrics import start_metrics_server
 
 logger = get_logger(__name__)
 
+SUBSCRIPTIONS_FILE = "/opt/app/conf/subscriptions.json"
+
+# Time given to the subscription processes to flush and ack their batches on SIGTERM before being killed,
+# keep it below the stop timeout of the process manager (supervisord stopwaitsecs)
+LEEK_AGENT_SHUTDOWN_TIMEOUT_IN_SECONDS = int(os.environ.get("LEEK_AGENT_SHUTDOWN_TIMEOUT_IN_SECONDS", 20))
+# Part of the shutdown timeout kept to close channels and connections once drained
+SHUTDOWN_MARGIN_S = 3
+# How often the subscriptions file is checked for changes and dead subscription processes are restarted
+LEEK_AGENT_RELOAD_INTERVAL_IN_SECONDS = int(os.environ.get("LEEK_AGENT_RELOAD_INTERVAL_IN_SECONDS", 5))
+# Number of processes shared by the subscriptions without a dedicated process, each one runs its consumers as greenlets
+LEEK_AGENT_SHARED_PROCESSES = int(os.environ.get("LEEK_AGENT_SHARED_PROCESSES", 1))
+# Delay before rebuilding a consumer that failed within a (shared) process
+CONSUMER_RESTART_DELAY_S = 10
+# Memory budget of the subscriptions that do not set one, see LeekConsumer
+DEFAULT_MEMORY_BUDGET_IN_MB = 256
+
 
 class LeekAgent:
     """Main server object, which:
         - Load subscriptions from config file.
-        - Orchestrates capturing of celery events.
+        - Orchestrates capturing of celery events, one process per subscription, or a few processes shared by the
+          low volume subscriptions (dedicated_process=false), each consumer running in its own greenlet.
         - Fanout to API webhooks endpoints
+        - Watch the subscriptions file and start/stop/restart only the processes whose subscriptions changed
     """
 
     def __init__(self):
-        self.consumers = []
-        self.proc = []
-        self.subscriptions = self.load_subscriptions()
-        self.loop = None
-
-        if not len(self.subscriptions):
-            logger.warning("No subscriptions found, Consider adding subscriptions through environment variable or UI.")
-            return
-
-        logger.info("Building consumers...")
-        for subscription in self.subscriptions:
-            subscription_name = self.infer_subscription_name(subscription)
-            consumer = LeekConsumer(subscription_name, **subscription)
-            self.consumers.append(consumer)
-        logger.info("Consumers built...")
+        # Running subscriptions by name, grouped by process (unit)
+        self.units = {}
+        self.processes = {}
+        # Stable index of each process, used to derive its metrics port
+        self.slots = {}
+        self.subscriptions_mtime = None
+        self.stopping = Event()
 
     @staticmethod
     def infer_subscription_name(subscription):
         return f"{subscription.get('app_name')}-{subscription.get('app_env')}"
 
+    @staticmethod
+    def infer_unit_name(name, subscription):
+        if subscription.get("dedicated_process", True):
+            return name
+        # Stable across reloads, adding/removing a subscription only restarts the process it belongs to
+        return f"shared-{zlib.crc32(name.encode('utf-8')) % max(1, LEEK_AGENT_SHARED_PROCESSES)}"
+
     @staticmethod
     def load_subscriptions():
         logger.info(f"Loading subscriptions...")
 
         # FROM JSON FILE
-        subscriptions_file = "/opt/app/conf/subscriptions.json"
-        with open(subscriptions_file) as json_file:
+        with open(SUBSCRIPTIONS_FILE) as json_file:
             subscriptions = json.load(json_file)
 
         logger.info(f"Found {len(subscriptions)} subscriptions!")
         return subscriptions
 
     def start(self):
-        if not len(self.consumers):
-            return
-
         logger.info("Starting Leek Agent...")
-
         signal(SIGTERM, self.stop)
-        for consumer in self.consumers:
-            p = Process(target=consumer.run)
-            p.start()
-            self.proc.append(p)
 
-        for p in self.proc:
-            p.join()
+        self.reload()
+        if not len(self.units):
+            logger.warning("No subscriptions found, Consider adding subscriptions through environment variable or UI.")
+
+        # Wakes up early on SIGTERM
+        while not self.stopping.wait(timeout=LEEK_AGENT_RELOAD_INTERVAL_IN_SECONDS):
+            self.reload()
+            self.restart_dead_subscriptions()
 
+        logger.info("Draining consumers...")
+        self.join_processes(list(self.processes.values()))
         logger.info("Leek Agent stopped!")
 
+    def reload(self):
+        """
+        Reconcile the running subscriptions with the subscriptions file, if it changed since the latest reload
+        """
+        try:
+            mtime = os.stat(SUBSCRIPTIONS_FILE).st_mtime_ns
+            if mtime == self.subscriptions_mtime:
+                return
+            subscriptions = self.load_subscriptions()
+        except (OSError, json.decoder.JSONDecodeError) as e:
+            # Missing or being written, keep the running subscriptions and retry on next tick
+            logger.warning(f"Failed to load subscriptions, keeping the running ones: {e}")
+            return
+        self.subscriptions_mtime = mtime
+
+        desired = {}
+        for subscription in subscriptions:
+            name = self.infer_subscription_name(subscription)
+            desired.setdefault(self.infer_unit_name(name, subscription), {})[name] = subscription
+        removed = [unit for unit in self.units if unit not in desired]
+        changed = [unit for unit in self.units if unit in desired and desired[unit] != self.units[unit]]
+        for unit in removed:
+            logger.info(f"Subscriptions {list(self.units[unit])} removed, stopping {unit}...")
+        for unit in changed:
+            logger.info(f"Subscriptions {list(desired[unit])} changed, restarting {unit}...")
+        # Drain all of them at once, within a single shutdown timeout
+        self.stop_units(removed + changed)
+        for unit in removed:
+            self.slots.pop(unit)
+        for unit, unit_subscriptions in desired.items():
+            if unit not in self.units:
+                if unit not in changed:
+                    logger.info(f"Subscriptions {list(unit_subscriptions)} added, starting {unit}...")
+                self.start_unit(unit, unit_subscriptions)
+
+    def restart_dead_subscriptions(self):
+        for unit, process in list(self.processes.items()):
+            if process.is_alive() or self.stopping.is_set():
+                continue
+            if process.exitcode == 0:
+                # Drained on SIGTERM or no consumer to run (invalid rules), restarting it would not help. The
+                # subscriptions are kept, the unit is started again once they change.
+                logger.info(f"Process {unit} stopped, it will be started again if its subscriptions change")
+                self.processes.pop(unit)
+                continue
+            logger.warning(f"Process {unit} exited with code {process.exitcode}, restarting it...")
+            self.start_unit(unit, self.units[unit])
+
+    def start_unit(self, unit, subscriptions):
+        if unit not in self.slots:
+            used = set(self.slots.values())
+            self.slots[unit] = next(index for index in range(len(used) + 1) if index not in used)
+        p = Process(target=self.run_consumers, args=(subscriptions, self.slots[unit]), name=unit)
+        p.start()
+        self.units[unit] = subscriptions
+        self.processes[unit] = p
+
+    def stop_units(self, units):
+        processes = [self.processes.pop(unit) for unit in units if unit in self.processes]
+        for unit in units:
+            self.units.pop(unit)
+        self.join_processes(processes)
+
+    @staticmethod
+    def join_processes(processes):
+        """
+        Ask the subscription processes to drain, kill the ones that do not exit within the shutdown timeout
+        """
+        for p in processes:
+            p.terminate()
+        deadline = time.time() + LEEK_AGENT_SHUTDOWN_TIMEOUT_IN_SECONDS
+        for p in processes:
+            p.join(timeout=max(0, deadline - time.time()))
+            if p.is_alive():
+                logger.warning(f"Subscription {p.name} did not stop within the shutdown timeout, killing it")
+                p.kill()
+                p.join()
+
+    @staticmethod
+    def split_memory_budget(subscriptions):
+        """
+        Memory budget of each consumer of a process, in megabytes.
+        The budget bounds the messages held by a process: the consumers of a shared process split the largest budget
+        of its subscriptions, in proportion to their own budget, rather than each one holding a full budget.
+        """
+        budgets = {
+            name: subscription.get("memory_budget_in_mb", DEFAULT_MEMORY_BUDGET_IN_MB)
+            for name, subscription in subscriptions.items()
+        }
+        if len(budgets) <= 1:
+            return budgets
+        total, claimed = max(budgets.values()), sum(budgets.values())
+        return {name: total * budget / claimed for name, budget in budgets.items()}
+
+    @staticmethod
+    def run_consumers(subscriptions, index):
+        """
+        Run the consumers of a process, each one in its own greenlet sharing the process event loop
+        """
+        # Replace the handler inherited from the agent process
+        signal(SIGTERM, SIG_DFL)
+        stopping = Event()
+        consumers = {}
+        memory_budgets = LeekAgent.split_memory_budget(subscriptions)
+
+        def run_consumer(name, subscription):
+            settings = {k: v for k, v in subscription.items() if k != "dedicated_process"}
+            settings["memory_budget_in_mb"] = memory_budgets[name]
+            while not stopping.is_set():
+                try:
+                    # Consumers are built from the subscription process, the agent process holds no broker/API
+                    # connection
+                    consumers[name] = LeekConsumer(name, **settings)
+                    consumers[name].run()
+                    return
+                except InvalidRule as e:
+                    # Misconfigured, restarting would fail the same way
+                    logger.error(f"Consumer {name} has invalid event rules: {e}, not starting it")
+                    consumers.pop(name, None)
+                    return
+                except Exception as e:
+                    # Let the other consumers of the process run
+                    logger.error(f"Consumer {name} failed: {e}, restarting it...", exc_info=True)
+                    consumers.pop(name, None)
+                    stopping.wait(timeout=CONSUMER_RESTART_DELAY_S)
+
+        greenlets = {}
+        for name, subscription in subscriptions.items():
+            greenlets[name] = gevent.spawn(run_consumer, name, subscription)
+            greenlets[name].name = name
+
+        def shutdown():
+            stopping.set()
+            drain_timeout = max(1, LEEK_AGENT_SHUTDOWN_TIMEOUT_IN_SECONDS - SHUTDOWN_MARGIN_S)
+            for name, greenlet in greenlets.items():
+                if name in consumers:
+                    # Drain concurrently, the consumer greenlet returns once drained
+                    gevent.spawn(consumers[name].shutdown, drain_timeout)
+                else:
+                    # Still connecting or waiting for a restart, nothing to drain
+                    greenlet.kill(block=False)
+
+        gevent.signal_handler(SIGTERM, shutdown)
+        start_metrics_server(index)
+        gevent.joinall(list(greenlets.values()))
+
     def stop(self, _signal_received, _frame):
-        # Handle any cleanup here
         logger.info("SIGTERM detected. Exiting gracefully")
-        for p in self.proc:
-            p.kill()
+        self.stopping.set()
 
 
 if __name__ == '__main__':
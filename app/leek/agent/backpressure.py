@@ -0,0 +1,72 @@
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import gevent
+
+
+class AIMDController:
+    """
+    Additive increase / multiplicative decrease of the batch size, driven by the API overload signal
+    (429 with Retry-After).
+
+    - Every batch accepted by the API grows the batch limit by a constant step, up to the configured maximum.
+    - Every overload signal halves the limit, down to the minimum, and pauses all the senders of the consumer
+      until the Retry-After delay elapses, which lowers the send rate without dropping the broker channel.
+    """
+    DECREASE_FACTOR = 0.5
+    # Number of accepted batches to grow back from the minimum to the maximum limit
+    INCREASE_STEPS = 20
+    # Delay used when the API does not tell how long to wait
+    DEFAULT_RETRY_AFTER_S = 5
+    MAX_RETRY_AFTER_S = 60
+
+    def __init__(self, max_limit: int, min_limit: int = 10):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.step = max(1, (self.max_limit - self.min_limit) // self.INCREASE_STEPS)
+        self.limit = self.max_limit
+        self.resume_at = 0
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + self.step)
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        self.limit = max(self.min_limit, int(self.limit * self.DECREASE_FACTOR))
+        if retry_after is None:
+            retry_after = self.DEFAULT_RETRY_AFTER_S
+        retry_after = min(self.MAX_RETRY_AFTER_S, max(0, retry_after))
+        self.resume_at = max(self.resume_at, time.time() + retry_after)
+
+    def wait(self) -> float:
+        """
+        Block the calling greenlet while the API asked to slow down
+        :return: time waited in seconds
+        """
+        delay = self.resume_at - time.time()
+        if delay <= 0:
+            return 0
+        gevent.sleep(delay)
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+        """
+        Retry-After header, in delay-seconds or HTTP-date form (RFC 9110), as a delay in seconds
+        :return: None if missing or malformed
+        """
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            # Obsolete formats without a zone, HTTP dates are GMT
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, date.timestamp() - now)
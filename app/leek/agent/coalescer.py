@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from leek.agent.models.task import Task, STATES_TERMINAL
+from leek.agent.models.worker import Worker
+
+
+@dataclass
+class HeldTask:
+    """
+    A non terminal task kept back from shipping, waiting for its next events.
+    """
+    task: Task
+    held_at: float
+    # Batches whose messages can't be acked until this task is shipped
+    seqs: Set[int] = field(default_factory=set)
+
+
+class Coalescer:
+    """
+    Hold non terminal task events for a short window so that events of the same task spread across
+    consecutive batches (QUEUED, RECEIVED, STARTED, SUCCEEDED...) are merged by the agent with Task.merge
+    and indexed by a single scripted update instead of one per batch.
+
+    Held tasks are released when they reach a terminal state, when they are held for longer than the window,
+    when the number of held tasks exceeds the limit (oldest first) or, on demand, when the batches they hold
+    back are older than a given batch. Worker events are never held.
+    The coalescer is not safe for concurrent use, callers are expected to serialize access to it.
+    """
+
+    def __init__(self, window_in_seconds: float, max_held: int):
+        self.window_in_seconds = window_in_seconds
+        self.max_held = max_held
+        # Ordered by the time the task was first held
+        self.held: Dict[str, HeldTask] = OrderedDict()
+
+    def __len__(self):
+        return len(self.held)
+
+    def coalesce(
+            self, seq: int, events: Dict[str, Union[Task, Worker]], release_all: bool = False,
+            release_before: Optional[int] = None,
+    ) -> Tuple[List[Union[Task, Worker]], List[int], List[int]]:
+        """
+        Merge the validated events of a batch with the held tasks
+        :param seq: sequence number of the batch the events come from
+        :param events: validated events of the batch
+        :param release_all: release every held task (shutdown), not only the expired ones
+        :param release_before: also release the tasks holding back a batch older than this one
+        :return: events to ship now, batches newly holding a task (once per task) and batches released
+        by the shipped tasks (once per task)
+        """
+        now = time.time()
+        ship, holding, released = [], [], []
+        for _id, event in events.items():
+            if not isinstance(event, Task):
+                ship.append(event)
+                continue
+            held = self.held.get(_id)
+            if held is not None:
+                # The coming task may already merge several events of its batch, Task.merge counts it as one
+                events_count = held.task.events_count + event.events_count
+                transitions = [*event.events, *held.task.events][:21]
+                held.task.merge(event)
+                held.task.events_count = events_count
+                held.task.events = transitions
+                event = held.task
+            if event.state in STATES_TERMINAL:
+                if held is not None:
+                    del self.held[_id]
+                    released.extend(held.seqs)
+                ship.append(event)
+                continue
+            if held is None:
+                held = self.held[_id] = HeldTask(task=event, held_at=now)
+            if seq not in held.seqs:
+                held.seqs.add(seq)
+                holding.append(seq)
+        # Bounded by count, release the oldest held tasks
+        while len(self.held) > self.max_held:
+            _, held = self.held.popitem(last=False)
+            released.extend(held.seqs)
+            ship.append(held.task)
+        if release_before is not None:
+            for _id in [_id for _id, held in self.held.items() if min(held.seqs) < release_before]:
+                held = self.held.pop(_id)
+                released.extend(held.seqs)
+                ship.append(held.task)
+        if release_all:
+            expired, expired_released = self.release_expired(float("inf"))
+        else:
+            expired, expired_released = self.release_expired(now)
+        return ship + expired, holding, released + expired_released
+
+    def has_expired(self, now: float = None) -> bool:
+        if not len(self.held):
+            return False
+        now = time.time() if now is None else now
+        return now - next(iter(self.held.values())).held_at >= self.window_in_seconds
+
+    def release_expired(self, now: float = None) -> Tuple[List[Task], List[int]]:
+        """
+        Release tasks held for longer than the window
+        :return: tasks to ship and batches they release
+        """
+        now = time.time() if now is None else now
+        ship, released = [], []
+        while self.has_expired(now):
+            _, held = self.held.popitem(last=False)
+            released.extend(held.seqs)
+            ship.append(held.task)
+        return ship, released
+
+    def clear(self):
+        self.held.clear()
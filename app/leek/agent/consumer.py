@@ -1,20 +1,36 @@
-import sys
+import os
+import re
 import time
 import random
 import socket
 from urllib.parse import urljoin
-from collections import OrderedDict
-from typing import Dict, List, Union, Iterable
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union, Iterable
 
+import gevent
 import requests
+from gevent.lock import RLock
+from gevent.pool import Pool
 from requests import adapters
 
 from kombu import Exchange, Queue, Connection
 from kombu.mixins import ConsumerMixin
 from kombu.exceptions import OperationalError, ChannelError
 
+from leek.serialization import json_dumps
 from leek.agent.logger import get_logger
-from leek.agent.adapters.serializer import validate_payload
+from leek.agent.adapters.kwargs_policy import KwargsPolicy
+from leek.agent.adapters.serializer import validate_payload, to_docs
+from leek.agent.encoding import IDENTITY, compress, negotiate_encoding
+from leek.agent.spool import Spool
+from leek.agent.deadletter import DeadLetters
+from leek.agent.shards import ValidationShards
+from leek.agent.coalescer import Coalescer
+from leek.agent.heartbeats import HeartbeatFilter
+from leek.agent.rules import EventRules
+from leek.agent.metrics import ConsumerMetrics
+from leek.agent.backpressure import AIMDController
 
 logger = get_logger(__name__)
 
@@ -24,16 +40,46 @@ def flatten(obj: Iterable[Union[List[Dict], Dict]]) -> Iterable[Dict]:
         if isinstance(sublist, list):
             for item in sublist:
                 yield item
-        elif isinstance(sublist, dict):
+        else:
+            # Malformed bodies included, rejected and dead-lettered by the validation
             yield sublist
 
 
+@dataclass
+class InflightBatch:
+    """
+    A batch handed to the API but not yet acknowledged to the broker.
+    """
+    seq: int
+    latest_delivery_tag: Any
+    delivery_tags: List[Any] = field(default_factory=list)
+    delivered: bool = False
+    # Number of tasks of this batch held back by the coalescer, the batch is acked once they are shipped
+    holds: int = 0
+    # Batches whose held tasks are shipped with this batch
+    releases: List[int] = field(default_factory=list)
+
+
+# Delivery outcomes
+DELIVERED = "delivered"
+UNAVAILABLE = "unavailable"  # API unreachable or temporarily unable to process, worth spooling
+REJECTED = "rejected"
+OVERLOADED = "overloaded"  # API asked to slow down (429), worth retrying after the Retry-After delay
+
+
 class LeekConsumer(ConsumerMixin):
     SUCCESS_STATUS_CODES = [200, 201]
     BACKOFF_STATUS_CODES = [400, 404, 503]
+    # API or search backend down/not ready, the batch is expected to be accepted later as is
+    UNAVAILABLE_STATUS_CODES = [404, 500, 502, 503, 504]
 
     # App/HTTP backoff (unchanged)
     BACKOFF_DELAY_S = 5
+    # Longest an overloaded batch is retried in place before backing off, the following batches wait for a sender
+    # meanwhile (the consume loop does not, see dispatch)
+    OVERLOAD_MAX_WAIT_S = 25
+    # Longest the consume loop waits for messages before performing the acks queued by the senders
+    ACK_INTERVAL_S = 0.2
 
     # Broker reconnect backoff
     RECONNECT_BASE_S = 2        # start at 2s
@@ -42,6 +88,12 @@ class LeekConsumer(ConsumerMixin):
 
     LEEK_WEBHOOKS_ENDPOINT = "/v1/events/process"
 
+    # Memory accounting, weight of the latest message size in the running average
+    MESSAGE_SIZE_SMOOTHING = 0.1
+    # Held tasks keep the acks of every later batch back. Past this share of the prefetch window unacked, the
+    # broker is about to stop delivering: held tasks are released rather than waiting for the coalescing window
+    COALESCING_MAX_UNACKED_RATIO = 0.8
+
     def __init__(
             self,
             subscription_name,
@@ -63,16 +115,111 @@ class LeekConsumer(ConsumerMixin):
             batch_max_size_in_mb=1,
             batch_max_number_of_messages=1000,
             batch_max_window_in_seconds=5,
+            # Hard ceiling for buffered message bodies plus the prefetch window
+            memory_budget_in_mb=256,
+            # Request body compression, negotiated with the API: "zstd" | "gzip" | "none"
+            compression: str = "gzip",
+            # Hold non terminal tasks to merge them with their next events, 0 to disable
+            coalescing_window_in_seconds: float = 0,
+            coalescing_max_held_tasks: int = 10000,
+            # Drop/sample rules evaluated before validation, e.g. [{"names": ["*.healthcheck"], "states": ["SUCCEEDED"], "keep": 0.01}]
+            event_rules: List[Dict] = None,
+            # Forward worker heartbeats only on material changes or once per interval, 0 to forward all of them
+            heartbeat_interval_in_seconds: float = 0,
+            heartbeat_active_delta: int = 5,
+            heartbeat_processed_delta: int = 1000,
+            # Number of processes validating/normalizing events, partitioned by task uuid
+            shards: int = 1,
+            # Durable local spool used while the API is unavailable
+            spool_enabled: bool = False,
+            spool_dir: str = "/opt/app/spool",
+            spool_max_size_in_mb: int = 1024,
+            spool_segment_max_size_in_mb: int = 64,
+            spool_fsync_policy: str = "segment",
+            # Local file of the events that can't be processed, they are dropped (and acked) either way
+            dead_letter_enabled: bool = True,
+            dead_letter_dir: str = "/opt/app/dead-letters",
+            dead_letter_max_size_in_mb: int = 64,
             # Optional: allow failover strategy if multiple URLs are given (semicolon-separated)
             failover_strategy: str = "round-robin",  # or "shuffle"
     ):
         # HTTP batch transport settings
         self.batch = OrderedDict()
+        self.batch_size_in_bytes = 0
         self.batch_max_size_in_mb = batch_max_size_in_mb
+        self.batch_max_size_in_bytes = batch_max_size_in_mb * 1024 * 1024
         self.batch_max_number_of_messages = batch_max_number_of_messages
         self.batch_max_window_in_seconds = batch_max_window_in_seconds
         self.batch_last_sent_at = time.time()
         self.batch_latest_delivery_tag = None
+        # Adapts the number of messages per batch and the send rate to the API overload signal
+        self.throttle = AIMDController(batch_max_number_of_messages)
+        # Serializes batch mutations, send() and ack() between the consume loop and the background flusher,
+        # the Kombu channel is not safe for concurrent use.
+        self.lock = RLock()
+        self.flusher = None
+        # Pipelined delivery, up to `concurrency_pool_size` batches in flight to the API.
+        # Acks are advanced (in order) only up to the highest contiguous delivered batch.
+        self.senders = Pool(concurrency_pool_size)
+        self.inflight = OrderedDict()
+        self.batch_seq = 0
+        # Encoded batches waiting for a sender, handed to the senders in order by the dispatcher. The consume loop
+        # never waits for a sender: the unacked messages of the waiting batches count against the prefetch window,
+        # the broker stops delivering once it is exhausted while the loop keeps acking and heartbeating.
+        self.ready = deque()
+        self.dispatcher = None
+        # Acks decided by the senders, performed by the consume loop between two drain_events (see on_iteration)
+        self.pending_acks = []
+
+        # COALESCING — held tasks keep their batches unacked, acks of the following batches wait for them too
+        self.coalescer = None
+        if coalescing_window_in_seconds > 0:
+            self.coalescer = Coalescer(coalescing_window_in_seconds, coalescing_max_held_tasks)
+
+        # RULES
+        self.event_rules = EventRules(event_rules) if event_rules else None
+
+        # KWARGS — per application budget of the flattened kwargs, advertised by the API, see app_is_ready()
+        self.kwargs_policy = None
+
+        # HEARTBEATS
+        self.heartbeats = None
+        if heartbeat_interval_in_seconds > 0:
+            self.heartbeats = HeartbeatFilter(
+                heartbeat_interval_in_seconds,
+                active_delta=heartbeat_active_delta,
+                processed_delta=heartbeat_processed_delta,
+            )
+
+        # METRICS — bound from the consumer process, see run()
+        self.metrics = ConsumerMetrics(subscription_name)
+
+        # SHARDS — started lazily from the consumer process, see run()
+        self.shards = shards
+        self.validation_shards = None
+
+        # SPOOL — when enabled, batches the API can't take are written to disk and acked,
+        # then replayed in order once the API recovers. While the spool is not drained,
+        # new batches are appended to it as well to preserve ordering.
+        self.spool = None
+        self.spooling = False
+        self.replayer = None
+        if spool_enabled:
+            self.spool = Spool(
+                os.path.join(spool_dir, subscription_name),
+                max_size_in_mb=spool_max_size_in_mb,
+                segment_max_size_in_mb=spool_segment_max_size_in_mb,
+                fsync_policy=spool_fsync_policy,
+            )
+            self.spooling = len(self.spool) > 0
+
+        # DEAD LETTERS
+        self.dead_letters = None
+        if dead_letter_enabled:
+            self.dead_letters = DeadLetters(
+                os.path.join(dead_letter_dir, f"{subscription_name}.jsonl"),
+                max_size_in_mb=dead_letter_max_size_in_mb,
+            )
 
         # API
         self.subscription_name = subscription_name
@@ -81,6 +228,12 @@ class LeekConsumer(ConsumerMixin):
             f"Building consumer [Subscription={subscription_name}, Prefetch={self.prefetch_count}]"
         )
 
+        # MEMORY — the prefetch window shrinks when messages grow so that the number of
+        # unacked messages held by this process (buffered + prefetched) stays within the budget
+        self.memory_budget_in_bytes = memory_budget_in_mb * 1024 * 1024
+        self.message_average_size_in_bytes = None
+        self.prefetch_window = prefetch_count
+
         self.api_url = api_url
         self.app_name = app_name
         self.app_env = app_env
@@ -92,6 +245,9 @@ class LeekConsumer(ConsumerMixin):
             "x-leek-app-key": app_key,
             "x-leek-app-env": app_env,
         }
+        self.compression = compression
+        # Updated once the API advertises the encodings it accepts
+        self.content_encoding = IDENTITY
 
         # BROKER — enable heartbeats; allow URL failover
         # Kombu supports a semicolon-separated list: "amqps://A;amqps://B"
@@ -128,6 +284,9 @@ class LeekConsumer(ConsumerMixin):
 
         # Internal flag used by our app-level backoff
         self.should_stop = False
+        # Cooperative shutdown, see shutdown()
+        self.consuming = False
+        self.shutting_down = False
 
     # ---------- Connection helpers ----------
 
@@ -212,11 +371,16 @@ class LeekConsumer(ConsumerMixin):
     def get_consumers(self, Consumer, channel):
         logger.info("Configuring channel...")
         # QoS must be set every time the channel is (re)opened
-        if self.connection.transport.driver_type == "redis":
-            channel.basic_qos(prefetch_size=0, prefetch_count=self.prefetch_count)
-        else:
-            channel.basic_qos(prefetch_size=0, prefetch_count=self.prefetch_count, a_global=False)
-        self.channel = channel
+        with self.lock:
+            self.channel = channel
+            # Delivery tags are scoped to the channel, unacked messages of the previous channel will be redelivered
+            self.init_batch()
+            self.inflight.clear()
+            self.ready.clear()
+            self.pending_acks.clear()
+            if self.coalescer is not None:
+                self.coalescer.clear()
+            self.set_qos(self.prefetch_window)
         logger.info("Channel Configured...")
 
         logger.info("Creating consumer...")
@@ -230,6 +394,12 @@ class LeekConsumer(ConsumerMixin):
         logger.info("Consumer created!")
         return [consumer]
 
+    def set_qos(self, prefetch_count):
+        if self.connection.transport.driver_type == "redis":
+            self.channel.basic_qos(prefetch_size=0, prefetch_count=prefetch_count)
+        else:
+            self.channel.basic_qos(prefetch_size=0, prefetch_count=prefetch_count, a_global=False)
+
     def on_connection_revived(self):
         logger.info("Connection revived! Re-declaring topology & QoS.")
         try:
@@ -239,59 +409,366 @@ class LeekConsumer(ConsumerMixin):
 
     def on_consume_ready(self, connection, channel, consumers, **kwargs):
         logger.info("Consumer ready!")
+        self.consuming = True
+        self.start_flusher()
+        if self.spooling:
+            self.start_replayer()
 
     def on_consume_end(self, connection, channel):
         logger.info("Consumer end!")
+        self.consuming = False
+
+    def on_iteration(self):
+        self.flush_acks()
 
     # ---------- Message handling ----------
 
     def on_message(self, body, message):
-        if self.should_stop is not True:
+        with self.lock:
+            full = self.handle_message(body, message)
+        if full:
+            self.send()
+
+    def handle_message(self, body, message) -> bool:
+        """
+        Buffer the message and tell whether the batch is fulfilled and should be sent
+        """
+        if self.should_stop is not True and not self.shutting_down:
+            message_size = self.get_message_size(message)
             self.batch.update({message.delivery_tag: body})
+            self.metrics.consumed(len(body) if isinstance(body, list) else 1)
+            self.batch_size_in_bytes += message_size
             self.batch_latest_delivery_tag = message.delivery_tag
-            if (sys.getsizeof(self.batch) / 1024 / 1024) >= self.batch_max_size_in_mb:
+            self.track_message_size(message_size)
+            if self.batch_size_in_bytes >= self.batch_max_size_in_bytes:
                 logger.debug("BATCH: maximum size in mb reached, send!")
-            elif len(self.batch) >= self.batch_max_number_of_messages:
-                logger.debug("BATCH: maximum number of messages reached, send!")
+            elif len(self.batch) >= self.throttle.limit:
+                logger.debug(f"BATCH: maximum number of messages ({self.throttle.limit}) reached, send!")
+            elif len(self.batch) >= self.prefetch_window:
+                logger.debug("BATCH: memory budget reached, send!")
+            elif self.coalescing_stalls():
+                logger.debug("BATCH: unacked messages held back by the coalescer, send!")
             elif (time.time() - self.batch_last_sent_at) >= self.batch_max_window_in_seconds:
                 logger.debug("BATCH: maximum wait window reached, send!")
             else:
                 logger.debug(f"BATCH: not yet fulfilled, {len(self.batch)} skip!")
-                return
-            self.send()
+                return False
+            return True
+        return False
+
+    @staticmethod
+    def get_message_size(message):
+        """
+        Size of the message as received from the broker (encoded body), the decoded body is
+        a nested dict and its container size does not account for the events it holds.
+        """
+        return len(message.body or b"")
+
+    def track_message_size(self, message_size):
+        """
+        Keep a running average of the messages size and adapt the prefetch window to it,
+        so that buffered bodies plus the messages prefetched by the broker fit the memory budget.
+        """
+        if self.message_average_size_in_bytes is None:
+            self.message_average_size_in_bytes = message_size
+        else:
+            self.message_average_size_in_bytes += \
+                (message_size - self.message_average_size_in_bytes) * self.MESSAGE_SIZE_SMOOTHING
+
+        window = self.prefetch_count
+        if self.message_average_size_in_bytes:
+            window = int(self.memory_budget_in_bytes // self.message_average_size_in_bytes)
+        window = max(1, min(self.prefetch_count, window))
+
+        # Only re-negotiate QoS on significant changes to avoid flooding the broker with basic.qos frames
+        if abs(window - self.prefetch_window) >= max(1, self.prefetch_window // 10):
+            logger.info(
+                f"Memory budget: average message size is {int(self.message_average_size_in_bytes)} bytes, "
+                f"prefetch window {self.prefetch_window} => {window}"
+            )
+            self.prefetch_window = window
+            if self.channel is not None:
+                self.set_qos(window)
+
+    # ---------- Timer driven flush ----------
+
+    def start_flusher(self):
+        if self.flusher is None or self.flusher.dead:
+            self.flusher = gevent.spawn(self.flush_periodically)
+            self.flusher.name = f"{self.subscription_name}-flusher"
+
+    def flush_periodically(self):
+        """
+        Send (and ack) partial batches once their window expires, even if no new message arrives.
+        Otherwise, on quiet environments, events stay buffered and unacked until the next celery event.
+        """
+        interval = min(1, self.batch_max_window_in_seconds)
+        while True:
+            gevent.sleep(interval)
+            with self.lock:
+                if self.should_stop:
+                    continue
+                if self.should_release_held_tasks():
+                    logger.debug("BATCH: coalescing window reached for held tasks, send!")
+                elif not len(self.batch):
+                    continue
+                elif (time.time() - self.batch_last_sent_at) < self.batch_max_window_in_seconds:
+                    continue
+                else:
+                    logger.debug("BATCH: maximum wait window reached while idle, send!")
+            try:
+                self.send()
+            except Exception as ex:
+                logger.error(f"Failed to flush batch: {ex}", exc_info=True)
 
     def init_batch(self):
         self.batch = OrderedDict()
+        self.batch_size_in_bytes = 0
         self.batch_last_sent_at = time.time()
         self.batch_latest_delivery_tag = None
 
-    def ack(self):
-        logger.debug(f"Latest delivery tag: {self.batch_latest_delivery_tag}")
+    def checkout_batch(self):
+        """
+        Detach the current batch and register it as in flight, must be called with the lock held.
+        """
+        self.batch_seq += 1
+        entry = InflightBatch(
+            seq=self.batch_seq,
+            latest_delivery_tag=self.batch_latest_delivery_tag,
+            delivery_tags=list(self.batch.keys()),
+        )
+        self.inflight[entry.seq] = entry
+        payload = list(flatten(self.batch.values()))
+        self.init_batch()
+        return entry.seq, payload
+
+    def ack(self, latest_delivery_tag, delivery_tags):
+        logger.debug(f"Latest delivery tag: {latest_delivery_tag}")
         if self.connection.transport.driver_type == "redis":
-            for delivery_tag in self.batch.keys():
+            for delivery_tag in delivery_tags:
                 self.channel.basic_ack(delivery_tag)
         else:
-            self.channel.basic_ack(self.batch_latest_delivery_tag, multiple=True)
-        self.init_batch()
+            self.channel.basic_ack(latest_delivery_tag, multiple=True)
+        self.metrics.acked(len(delivery_tags))
+
+    def count_unacked_messages(self):
+        return len(self.batch) + sum(len(entry.delivery_tags) for entry in self.inflight.values()) + \
+            sum(len(delivery_tags) for _, delivery_tags in self.pending_acks)
+
+    def mark_delivered(self, seq):
+        """
+        Mark the batch as delivered and queue the ack of every contiguous delivered batch from the head of the
+        pipeline. A batch delivered before an older one is acked only once the older one is delivered too.
+        Called by the senders, the acks are performed by the consume loop, see flush_acks.
+        """
+        with self.lock:
+            entry = self.inflight.get(seq)
+            if entry is None:
+                # Channel was re-opened or consumer backed off, the messages will be redelivered
+                return
+            entry.delivered = True
+            for released_seq in entry.releases:
+                if released_seq in self.inflight:
+                    self.inflight[released_seq].holds -= 1
+            latest_delivery_tag, delivery_tags = None, []
+            while len(self.inflight):
+                head = next(iter(self.inflight.values()))
+                if not head.delivered or head.holds > 0:
+                    break
+                self.inflight.popitem(last=False)
+                if head.latest_delivery_tag is not None:
+                    latest_delivery_tag = head.latest_delivery_tag
+                delivery_tags.extend(head.delivery_tags)
+            if latest_delivery_tag is not None:
+                self.pending_acks.append((latest_delivery_tag, delivery_tags))
+
+    def flush_acks(self):
+        """
+        Perform the acks queued by the senders, from the consume loop only: the channel is not safe for concurrent
+        use, and drain_events is reading from it while the senders complete.
+        """
+        with self.lock:
+            if not len(self.pending_acks):
+                return
+            latest_delivery_tag = self.pending_acks[-1][0]
+            delivery_tags = [tag for _, tags in self.pending_acks for tag in tags]
+            self.pending_acks.clear()
+            self.ack(latest_delivery_tag, delivery_tags)
 
     def send(self):
-        start_time = time.time()
-        payload = flatten(self.batch.values())
+        with self.lock:
+            if not len(self.batch) and not self.should_release_held_tasks():
+                return
+            seq, payload = self.checkout_batch()
+            if self.event_rules is not None and len(payload):
+                count = len(payload)
+                payload = self.event_rules.filter(payload)
+                self.metrics.filtered(count - len(payload))
+            if self.heartbeats is not None and len(payload):
+                count = len(payload)
+                payload = self.heartbeats.filter(payload)
+                self.metrics.heartbeats_dropped(count - len(payload))
+        rejected = []
+        data = None
         try:
-            events = validate_payload(payload, self.app_env)
-            docs = [event.to_doc() for _, event in events.items()]
+            if self.validation_shards is not None and self.coalescer is None:
+                # Docs are serialized and encoded by the shards
+                data, count = self.validation_shards.encode(payload, rejected, self.kwargs_policy)
+            else:
+                events = self.validate(payload, rejected) if len(payload) else {}
+                if self.coalescer is not None:
+                    events = self.coalesce(seq, events)
+                else:
+                    events = events.values()
+            if self.kwargs_policy is not None:
+                self.metrics.kwargs_pruned(self.kwargs_policy.take_pruned())
         except Exception as ex:
             logger.error(ex)
+            self.backoff()
             return
+        if data is None:
+            docs = to_docs(events, rejected)
+            data, count = json_dumps(docs), len(docs)
+        self.reject(len(payload), rejected)
+        self.ready.append((seq, data, count))
+        if self.dispatcher is None or self.dispatcher.dead:
+            self.dispatcher = gevent.spawn(self.dispatch)
+            self.dispatcher.name = f"{self.subscription_name}-dispatcher"
+
+    def dispatch(self):
+        """
+        Hand the ready batches to the senders, in order, as soon as a sender is available
+        """
+        while len(self.ready):
+            self.senders.wait_available()
+            seq, data, count = self.ready.popleft()
+            if seq not in self.inflight:
+                # Backed off or channel re-opened meanwhile, the messages will be redelivered
+                continue
+            self.senders.spawn(self.deliver, seq, data, count)
+
+    def should_release_held_tasks(self):
+        if self.coalescer is None or not len(self.coalescer):
+            return False
+        return self.shutting_down or self.coalescer.has_expired() or self.coalescing_stalls()
+
+    def coalescing_stalls(self) -> bool:
+        """
+        Whether the messages kept unacked by the held tasks are about to exhaust the prefetch window
+        """
+        if self.coalescer is None or not len(self.coalescer):
+            return False
+        return self.count_unacked_messages() >= self.prefetch_window * self.COALESCING_MAX_UNACKED_RATIO
+
+    def coalesce(self, seq, events):
+        """
+        Hold back the non terminal tasks of the batch and ship the released ones with it
+        """
+        with self.lock:
+            entry = self.inflight.get(seq)
+            if entry is None:
+                # Backed off while validating, the messages will be redelivered
+                return []
+            events, holding, released = self.coalescer.coalesce(
+                seq, events, release_all=self.shutting_down, release_before=seq if self.coalescing_stalls() else None
+            )
+            for holding_seq in holding:
+                self.inflight[holding_seq].holds += 1
+            entry.releases.extend(released)
+            return events
+
+    def validate(self, payload, rejected=None):
+        if self.validation_shards is not None:
+            return self.validation_shards.validate(payload, rejected, self.kwargs_policy)
+        return validate_payload(payload, self.app_env, rejected, self.kwargs_policy)
+
+    def reject(self, count, rejected):
+        """
+        Count and dead-letter the events dropped from a batch, their messages are acked with the rest of the batch
+        """
+        self.metrics.validated(count, rejected)
+        if len(rejected) and self.dead_letters is not None:
+            self.dead_letters.write(rejected)
+
+    def deliver(self, seq, data: bytes, count: int):
+        """
+        :param data: JSON encoded docs of the batch
+        :param count: number of docs
+        """
+        if not count:
+            # Every event of the batch was dropped, or every task is held by the coalescer
+            self.mark_delivered_or_backoff(seq)
+            return
+        self.metrics.encoded(len(data))
+        # Keep ordering, do not overtake batches waiting in the spool
+        if self.spooling and self.spool_batch(data):
+            self.metrics.spooled(count)
+            self.mark_delivered_or_backoff(seq)
+            return
+        outcome = self.post(data)
+        # Overloaded, retry in place (senders are paused until Retry-After) rather than restarting the consumer
+        deadline = time.time() + self.OVERLOAD_MAX_WAIT_S
+        while outcome == OVERLOADED and self.throttle.resume_at <= deadline:
+            if seq not in self.inflight:
+                # Backed off meanwhile, the messages will be redelivered
+                return
+            outcome = self.post(data)
+        if outcome == DELIVERED:
+            self.metrics.sent(count)
+            self.mark_delivered_or_backoff(seq)
+            return
+        if outcome in (UNAVAILABLE, OVERLOADED) and self.spool is not None and self.spool_batch(data):
+            logger.warning(f"API unavailable, batch spooled to disk ({self.spool.size_in_bytes} bytes spooled)")
+            self.metrics.spooled(count)
+            self.mark_delivered_or_backoff(seq)
+            return
+        self.backoff()
+
+    def mark_delivered_or_backoff(self, seq):
+        try:
+            self.mark_delivered(seq)
+        except Exception as ex:
+            logger.error("Unhealthy connection!")
+            logger.error(ex)
+            self.backoff()
+
+    def post(self, data: bytes) -> str:
+        """
+        Post an encoded batch to the API
+        :param data: JSON encoded batch of docs
+        :return: delivery outcome, one of DELIVERED, UNAVAILABLE, OVERLOADED or REJECTED
+        """
+        self.throttle.wait()
+        start_time = time.time()
+        outcome = self.post_batch(data)
+        self.metrics.posted(outcome, time.time() - start_time)
+        return outcome
+
+    def post_batch(self, data: bytes) -> str:
+        start_time = time.time()
+        content_encoding = self.content_encoding
+        headers = {"Content-Type": "application/json"}
+        if content_encoding != IDENTITY:
+            headers["Content-Encoding"] = content_encoding
         try:
             response = self.session.post(
-                url=urljoin(self.api_url, self.LEEK_WEBHOOKS_ENDPOINT), json=docs
+                url=urljoin(self.api_url, self.LEEK_WEBHOOKS_ENDPOINT),
+                data=compress(data, content_encoding),
+                headers=headers,
             )
             response.raise_for_status()
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             logger.error("Failed to connect to Leek API, Leek is Down.")
+            return UNAVAILABLE
         except requests.exceptions.HTTPError as e:
             status_code = e.response.status_code
+            if status_code == 429:
+                retry_after = self.throttle.parse_retry_after(e.response.headers.get("Retry-After"))
+                self.throttle.on_overload(retry_after)
+                logger.warning(
+                    f"API overloaded, retry after {retry_after} seconds, batch limit lowered to {self.throttle.limit}"
+                )
+                return OVERLOADED
             if status_code in self.BACKOFF_STATUS_CODES:
                 logger.warning(e.response.content)
                 logger.warning(
@@ -301,21 +778,106 @@ class LeekConsumer(ConsumerMixin):
             else:
                 logger.error(e.response.content)
                 logger.error(f"status code: {e.response.status_code}")
+            return UNAVAILABLE if status_code in self.UNAVAILABLE_STATUS_CODES else REJECTED
         else:
             if response.status_code in self.SUCCESS_STATUS_CODES:
-                try:
-                    logger.debug("--- Processed by API in %s seconds ---" % (time.time() - start_time))
-                    if response.status_code == 201:
-                        self.ack()
+                logger.debug("--- Processed by API in %s seconds ---" % (time.time() - start_time))
+                self.throttle.on_success()
+                return DELIVERED
+        return REJECTED
+
+    # ---------- Spool ----------
+
+    def spool_batch(self, data: bytes) -> bool:
+        with self.lock:
+            if not self.spool.append(data):
+                logger.error(f"Spool is full ({self.spool.size_in_bytes} bytes), can't spool batch!")
+                return False
+            self.spooling = True
+        self.start_replayer()
+        return True
+
+    def start_replayer(self):
+        if self.replayer is None or self.replayer.dead:
+            self.replayer = gevent.spawn(self.replay_spool)
+            self.replayer.name = f"{self.subscription_name}-replayer"
+
+    def replay_spool(self):
+        """
+        Replay spooled batches to the API in order, until the spool is drained
+        """
+        while True:
+            with self.lock:
+                record = self.spool.peek()
+                if record is None:
+                    self.spooling = False
+                    logger.info("Spool drained!")
                     return
-                except Exception as ex:
-                    logger.error("Unhealthy connection!")
-                    logger.error(ex)
-        self.backoff()
+            outcome = self.post(record.data)
+            if outcome == UNAVAILABLE:
+                gevent.sleep(self.BACKOFF_DELAY_S)
+                continue
+            if outcome == OVERLOADED:
+                # Next post waits for the Retry-After delay
+                continue
+            if outcome == REJECTED:
+                logger.error(f"Spooled batch {record.segment}:{record.index} rejected by the API, dropped!")
+            with self.lock:
+                self.spool.commit(record)
 
     def backoff(self):
+        self.metrics.backoff()
+        with self.lock:
+            self.should_stop = True
+            self.init_batch()
+            # Batches still in flight will not be acked, their messages are redelivered once the channel is closed
+            self.inflight.clear()
+            self.ready.clear()
+            if self.coalescer is not None:
+                self.coalescer.clear()
+
+    # ---------- Shutdown ----------
+
+    def shutdown(self, timeout):
+        """
+        Cooperative shutdown: stop buffering new messages, flush the current batch (and the held tasks) to the API,
+        wait for the batches in flight to be acked, then leave the consume loop which cancels the consumer and
+        closes the channel. Messages not acked within the timeout (or prefetched but not yet buffered) are
+        redelivered by the broker.
+        """
+        if self.shutting_down:
+            return
+        logger.info(f"Shutting down, draining within {timeout} seconds...")
+        self.shutting_down = True
+        if self.consuming and not self.should_stop:
+            with gevent.Timeout(timeout, False):
+                self.send()
+                if self.dispatcher is not None:
+                    self.dispatcher.join()
+                self.senders.join()
+                # Let the consume loop perform the last acks
+                while len(self.pending_acks):
+                    gevent.sleep(self.ACK_INTERVAL_S)
+            if len(self.inflight) or len(self.pending_acks):
+                logger.warning(f"{len(self.inflight) + len(self.pending_acks)} batches not acked within the shutdown "
+                               f"timeout, their messages will be redelivered")
+            else:
+                logger.info("Drained!")
+        for greenlet in (self.flusher, self.replayer, self.dispatcher):
+            if greenlet is not None:
+                greenlet.kill(block=False)
         self.should_stop = True
-        self.init_batch()
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+        if self.validation_shards is not None:
+            self.validation_shards.close()
+        try:
+            self.connection.release()
+        except Exception:
+            pass
+        logger.info("Consumer stopped!")
 
     # ---------- Main run loop with resilient reconnect ----------
 
@@ -325,9 +887,15 @@ class LeekConsumer(ConsumerMixin):
         and if it exits due to OperationalError/ChannelError (typical during maintenance),
         we reconnect & restart.
         """
-        while True:
+        self.metrics.bind(self)
+        if self.shards > 1 and self.validation_shards is None:
+            self.validation_shards = ValidationShards(self.subscription_name, self.shards, self.app_env)
+
+        while not self.shutting_down:
             # Wait for API health if we previously backed off due to API errors
             time.sleep(self.BACKOFF_DELAY_S)
+            if self.shutting_down:
+                break
             if self.app_is_ready():
                 logger.info("App is ready!")
             else:
@@ -337,18 +905,22 @@ class LeekConsumer(ConsumerMixin):
 
             try:
                 # This blocks until an error happens or should_stop toggles
+                kwargs.setdefault("safety_interval", self.ACK_INTERVAL_S)
                 super(LeekConsumer, self).run(_tokens=1, **kwargs)
             except (OperationalError, ChannelError, socket.error) as exc:
                 # Connection/channel broke (maintenance window, broker restart, etc.)
                 logger.warning(f"Consumer loop interrupted: {exc}. Will attempt to reconnect...")
-                self._reopen_after_connection_loss()
+                if not self.shutting_down:
+                    self._reopen_after_connection_loss()
                 # Loop continues and we re-enter run()
                 continue
             except Exception as exc:
                 # Unknown error: log and attempt a controlled restart
                 logger.error(f"Unexpected error in consumer loop: {exc}", exc_info=True)
-                self._reopen_after_connection_loss()
+                if not self.shutting_down:
+                    self._reopen_after_connection_loss()
                 continue
+        self.close()
 
     def app_is_ready(self):
         try:
@@ -362,5 +934,28 @@ class LeekConsumer(ConsumerMixin):
             logger.warning(e.response.content)
         else:
             if response.status_code == 200:
+                self.content_encoding = negotiate_encoding(self.compression, response.headers.get("Accept-Encoding"))
+                logger.info(f"Events will be sent with {self.content_encoding} encoding")
+                self.kwargs_policy = self.get_kwargs_policy(response)
                 return True
         return False
+
+    @staticmethod
+    def get_kwargs_policy(response) -> Optional[KwargsPolicy]:
+        """
+        Kwargs policy of the application, advertised by the readiness check (older APIs answer with plain text)
+        """
+        try:
+            settings = response.json()
+        except ValueError:
+            return None
+        policy = settings.get("kwargs_policy") if isinstance(settings, dict) else None
+        if not policy:
+            return None
+        try:
+            kwargs_policy = KwargsPolicy.compile(policy)
+        except (ValueError, TypeError, re.error) as e:
+            logger.warning(f"Ignoring invalid kwargs policy {policy}: {e}")
+            return None
+        logger.info(f"Kwargs will be flattened with policy {policy}")
+        return kwargs_policy
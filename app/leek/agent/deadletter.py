@@ -0,0 +1,49 @@
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from leek.serialization import json_dumps
+from leek.agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeadLetters:
+    """
+    Local dead-letter file of the events the agent could not process, one JSON document per line.
+
+    The file is rotated (a single previous generation is kept as `<path>.1`) once it exceeds its maximum size,
+    dead letters are meant for troubleshooting, not for replay.
+    """
+
+    def __init__(self, path: str, max_size_in_mb: int = 64):
+        self.path = path
+        self.max_size_in_bytes = max_size_in_mb * 1024 * 1024
+
+    def write(self, rejected: List[Tuple[str, str, Any]]):
+        """
+        Append rejected events
+        :param rejected: (reason, error, event) tuples
+        """
+        if not len(rejected):
+            return
+        now = time.time()
+        lines = b"".join(self.encode(now, reason, error, event) for reason, error, event in rejected)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(lines)
+                size = f.tell()
+            if size > self.max_size_in_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except OSError as ex:
+            logger.error(f"Failed to write {len(rejected)} dead letters to {self.path}: {ex}")
+
+    @staticmethod
+    def encode(at: float, reason: str, error: str, event: Any) -> bytes:
+        record: Dict[str, Any] = {"at": at, "reason": reason, "error": error, "event": event}
+        try:
+            return json_dumps(record) + b"\n"
+        except (TypeError, ValueError):
+            record["event"] = repr(event)
+            return json_dumps(record) + b"\n"
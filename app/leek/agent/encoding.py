@@ -0,0 +1,57 @@
+import zlib
+from typing import Optional
+
+try:
+    import zstandard  # Better ratio and faster than gzip if available
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+IDENTITY = "identity"
+
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Ordered by preference
+SUPPORTED_ENCODINGS = (ZSTD, GZIP) if zstandard else (GZIP,)
+
+
+def negotiate_encoding(preferred: Optional[str], accepted: Optional[str]) -> str:
+    """
+    Pick the request body encoding from the subscription preference and the encodings advertised by the API
+    through the `Accept-Encoding` header of the readiness endpoint (RFC 7694).
+
+    ------------------------------------------------------------
+    Parameters
+    ------------------------------------------------------------
+    preferred : str | None
+        Subscription compression setting: "zstd", "gzip" or "none".
+
+    accepted : str | None
+        Value of the `Accept-Encoding` response header, e.g. "zstd, gzip".
+        Older API versions do not advertise it and only accept uncompressed bodies.
+
+    ------------------------------------------------------------
+    Returns
+    ------------------------------------------------------------
+    str
+        One of "zstd", "gzip" or "identity".
+    """
+    if not preferred or preferred == "none" or not accepted:
+        return IDENTITY
+    accepted = {e.split(";")[0].strip().lower() for e in accepted.split(",")}
+    candidates = [preferred] + [e for e in SUPPORTED_ENCODINGS if e != preferred]
+    for encoding in candidates:
+        if encoding in SUPPORTED_ENCODINGS and encoding in accepted:
+            return encoding
+    return IDENTITY
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == GZIP:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    return data
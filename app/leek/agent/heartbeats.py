@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+HEARTBEAT = "worker-heartbeat"
+ONLINE = "worker-online"
+OFFLINE = "worker-offline"
+
+
+@dataclass
+class ForwardedHeartbeat:
+    timestamp: float
+    active: Optional[int]
+    processed: Optional[int]
+
+
+class HeartbeatFilter:
+    """
+    Forward worker heartbeats only when they carry news.
+
+    Celery workers send a heartbeat every ~2 seconds, each one ends up as a scripted update of the worker document.
+    A heartbeat is forwarded when:
+        - It is the first one of the worker (since the agent started or the worker went online)
+        - The number of active tasks changed by at least `active_delta`, or the worker went idle/busy
+        - The number of processed tasks grew by at least `processed_delta`
+        - `interval_in_seconds` elapsed (worker clock) since the latest forwarded heartbeat
+
+    Other heartbeats are dropped (and acked with their batch). State transitions (online/offline) are always
+    forwarded. The filter is not safe for concurrent use, callers are expected to serialize access to it.
+    """
+    # Bound the state kept for workers that disappear without an offline event
+    MAX_WORKERS = 10000
+
+    def __init__(self, interval_in_seconds: float, active_delta: int = 5, processed_delta: int = 1000):
+        self.interval_in_seconds = interval_in_seconds
+        self.active_delta = active_delta
+        self.processed_delta = processed_delta
+        self.workers: Dict[str, ForwardedHeartbeat] = OrderedDict()
+
+    def filter(self, payload: List[Dict]) -> List[Dict]:
+        forwarded = []
+        for event in payload:
+            if not isinstance(event, dict):
+                # Malformed, left to the validation
+                forwarded.append(event)
+                continue
+            ev_type = event.get("type")
+            if ev_type == HEARTBEAT:
+                if self.should_forward(event):
+                    forwarded.append(event)
+                continue
+            if ev_type == ONLINE or ev_type == OFFLINE:
+                # Next heartbeat is forwarded whatever it holds
+                self.workers.pop(event.get("hostname"), None)
+            forwarded.append(event)
+        return forwarded
+
+    def should_forward(self, event: Dict) -> bool:
+        hostname = event.get("hostname")
+        timestamp = event.get("timestamp")
+        active = event.get("active")
+        processed = event.get("processed")
+        if not isinstance(timestamp, (int, float)) or not all(v is None or isinstance(v, int) for v in (active, processed)):
+            # Malformed, left to the validation
+            return True
+        latest = self.workers.get(hostname)
+        if latest is None or self.is_news(latest, timestamp, active, processed):
+            self.workers[hostname] = ForwardedHeartbeat(timestamp=timestamp, active=active, processed=processed)
+            self.workers.move_to_end(hostname)
+            if len(self.workers) > self.MAX_WORKERS:
+                self.workers.popitem(last=False)
+            return True
+        return False
+
+    def is_news(self, latest: ForwardedHeartbeat, timestamp: float, active, processed) -> bool:
+        if timestamp - latest.timestamp >= self.interval_in_seconds:
+            return True
+        if active != latest.active:
+            if active is None or latest.active is None:
+                return True
+            if (active == 0) != (latest.active == 0):
+                return True
+            if abs(active - latest.active) >= self.active_delta:
+                return True
+        if (processed is None) != (latest.processed is None):
+            return True
+        if processed is not None:
+            # Also forward a counter reset (worker restarted with the same hostname)
+            if processed - latest.processed >= self.processed_delta or processed < latest.processed:
+                return True
+        return False
@@ -0,0 +1,191 @@
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+    from prometheus_client.core import REGISTRY, CounterMetricFamily
+except ImportError:
+    Counter = Gauge = Histogram = start_http_server = None
+
+from leek.agent.adapters import parse_cache
+from leek.agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Each subscription process serves its own metrics on the base port + the subscription index, disabled if not set
+LEEK_AGENT_METRICS_PORT = os.environ.get("LEEK_AGENT_METRICS_PORT")
+
+ENABLED = start_http_server is not None and bool(LEEK_AGENT_METRICS_PORT)
+
+if ENABLED:
+    EVENTS_CONSUMED = Counter(
+        "leek_agent_events_consumed_total", "Celery events received from the broker", ["subscription"]
+    )
+    EVENTS_SENT = Counter(
+        "leek_agent_events_sent_total", "Events (merged per task/worker) accepted by the API", ["subscription"]
+    )
+    EVENTS_SPOOLED = Counter(
+        "leek_agent_events_spooled_total", "Events (merged per task/worker) written to the spool", ["subscription"]
+    )
+    EVENTS_FILTERED = Counter(
+        "leek_agent_events_filtered_total", "Events dropped or sampled out by the subscription rules", ["subscription"]
+    )
+    HEARTBEATS_DROPPED = Counter(
+        "leek_agent_heartbeats_dropped_total", "Worker heartbeats not forwarded, nothing changed materially",
+        ["subscription"]
+    )
+    VALIDATION_FAILURES = Counter(
+        "leek_agent_validation_failures_total", "Events dropped by the validation", ["subscription", "reason"]
+    )
+    KWARGS_PRUNED = Counter(
+        "leek_agent_kwargs_pruned_total", "Flattened kwargs keys dropped or collapsed by the application kwargs policy",
+        ["subscription", "reason"]
+    )
+    BATCH_SIZE_EVENTS = Histogram(
+        "leek_agent_batch_size_events", "Number of events per batch", ["subscription"],
+        buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    )
+    BATCH_SIZE_BYTES = Histogram(
+        "leek_agent_batch_size_bytes", "Size of the encoded (uncompressed) batches", ["subscription"],
+        buckets=(1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024),
+    )
+    API_LATENCY = Histogram(
+        "leek_agent_api_latency_seconds", "Latency of the batches posted to the API", ["subscription", "outcome"],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    BACKOFFS = Counter(
+        "leek_agent_backoffs_total", "Consumer backoffs, buffered and in flight messages are redelivered",
+        ["subscription"]
+    )
+    MESSAGES_ACKED = Counter(
+        "leek_agent_messages_acked_total", "Messages acknowledged to the broker", ["subscription"]
+    )
+    SECONDS_SINCE_LAST_ACK = Gauge(
+        "leek_agent_seconds_since_last_ack", "Time elapsed since the latest ack to the broker", ["subscription"]
+    )
+    UNACKED_MESSAGES = Gauge(
+        "leek_agent_unacked_messages", "Messages buffered or in flight, not yet acknowledged", ["subscription"]
+    )
+    PREFETCH_WINDOW = Gauge(
+        "leek_agent_prefetch_window", "Current prefetch window negotiated with the broker", ["subscription"]
+    )
+    BATCH_LIMIT = Gauge(
+        "leek_agent_batch_limit", "Current maximum number of messages per batch, lowered when the API is overloaded",
+        ["subscription"]
+    )
+
+    class ParseCacheCollector:
+        """
+        Hits/misses of the args, kwargs and traceback parse caches of the process and its validation shards,
+        the hit rate is derived by the scraper, e.g. rate(hits[5m]) / (rate(hits[5m]) + rate(misses[5m]))
+        """
+
+        def collect(self):
+            hits = CounterMetricFamily(
+                "leek_agent_parse_cache_hits", "Parse results served from the cache", labels=["cache"]
+            )
+            misses = CounterMetricFamily(
+                "leek_agent_parse_cache_misses", "Raw strings parsed and added to the cache", labels=["cache"]
+            )
+            for name, (cache_hits, cache_misses) in parse_cache.total_stats().items():
+                hits.add_metric([name], cache_hits)
+                misses.add_metric([name], cache_misses)
+            yield hits
+            yield misses
+
+    REGISTRY.register(ParseCacheCollector())
+
+
+def start_metrics_server(index: int):
+    """
+    Serve the metrics of the current (subscription) process, must be called from the subscription process
+    """
+    if not ENABLED:
+        return
+    port = int(LEEK_AGENT_METRICS_PORT) + index
+    start_http_server(port)
+    logger.info(f"Serving metrics on port {port}")
+
+
+class ConsumerMetrics:
+    """
+    Metrics of a subscription consumer. Rates (events consumed/sent per second) are derived from the counters
+    by the scraper, e.g. rate(leek_agent_events_sent_total[1m]).
+
+    Labelled series are only created once bound from the subscription process, so that a process does not
+    expose the (stale) series of the other subscriptions built by the parent process. Until then, or when
+    prometheus_client is not installed, every call is a no-op.
+    """
+
+    def __init__(self, subscription_name: str):
+        self.subscription_name = subscription_name
+        self.enabled = False
+        self.last_ack_at = time.time()
+
+    def bind(self, consumer):
+        if not ENABLED or self.enabled:
+            return
+        labels = {"subscription": self.subscription_name}
+        self.events_consumed = EVENTS_CONSUMED.labels(**labels)
+        self.events_sent = EVENTS_SENT.labels(**labels)
+        self.events_spooled = EVENTS_SPOOLED.labels(**labels)
+        self.heartbeats_dropped_total = HEARTBEATS_DROPPED.labels(**labels)
+        self.events_filtered = EVENTS_FILTERED.labels(**labels)
+        self.batch_size_events = BATCH_SIZE_EVENTS.labels(**labels)
+        self.batch_size_bytes = BATCH_SIZE_BYTES.labels(**labels)
+        self.backoffs = BACKOFFS.labels(**labels)
+        self.messages_acked = MESSAGES_ACKED.labels(**labels)
+        SECONDS_SINCE_LAST_ACK.labels(**labels).set_function(lambda: time.time() - self.last_ack_at)
+        UNACKED_MESSAGES.labels(**labels).set_function(consumer.count_unacked_messages)
+        PREFETCH_WINDOW.labels(**labels).set_function(lambda: consumer.prefetch_window)
+        BATCH_LIMIT.labels(**labels).set_function(lambda: consumer.throttle.limit)
+        self.enabled = True
+
+    def consumed(self, count: int):
+        if self.enabled:
+            self.events_consumed.inc(count)
+
+    def filtered(self, count: int):
+        if self.enabled and count:
+            self.events_filtered.inc(count)
+
+    def heartbeats_dropped(self, count: int):
+        if self.enabled and count:
+            self.heartbeats_dropped_total.inc(count)
+
+    def validated(self, count: int, rejected: List[Tuple[str, str, Any]]):
+        if self.enabled:
+            self.batch_size_events.observe(count)
+            for reason, _, _ in rejected:
+                VALIDATION_FAILURES.labels(subscription=self.subscription_name, reason=reason).inc()
+
+    def kwargs_pruned(self, pruned: Dict[str, int]):
+        if self.enabled:
+            for reason, count in pruned.items():
+                KWARGS_PRUNED.labels(subscription=self.subscription_name, reason=reason).inc(count)
+
+    def encoded(self, size_in_bytes: int):
+        if self.enabled:
+            self.batch_size_bytes.observe(size_in_bytes)
+
+    def posted(self, outcome: str, latency_in_seconds: float):
+        if self.enabled:
+            API_LATENCY.labels(subscription=self.subscription_name, outcome=outcome).observe(latency_in_seconds)
+
+    def sent(self, count: int):
+        if self.enabled:
+            self.events_sent.inc(count)
+
+    def spooled(self, count: int):
+        if self.enabled:
+            self.events_spooled.inc(count)
+
+    def acked(self, count: int):
+        self.last_ack_at = time.time()
+        if self.enabled:
+            self.messages_acked.inc(count)
+
+    def backoff(self):
+        if self.enabled:
+            self.backoffs.inc()
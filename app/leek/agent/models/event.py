@@ -1,6 +1,7 @@
 import abc
-from typing import Union
-from dataclasses import dataclass
+from operator import attrgetter
+from typing import Iterable, List, Tuple, Union
+from dataclasses import dataclass, fields
 
 
 class EventKind:
@@ -8,7 +9,61 @@ class EventKind:
     WORKER = "worker"
 
 
-@dataclass()
+def create_method(name: str, body: List[str], args: str = "self"):
+    """
+    Compile a method specialized to the fields of a model, the same way dataclasses generate __init__
+    """
+    namespace = {}
+    exec("\n".join([f"def {name}({args}):", *(f"    {line}" for line in body)]), {}, namespace)
+    return namespace[name]
+
+
+def slotted(cls):
+    """
+    Dataclass without per instance __dict__ (dataclass(slots=True) requires python 3.10), a prefetch window
+    buffers tens of thousands of events.
+
+    The model fields are precomputed once: FIELDS in declaration order and `values`, which reads all of them at once.
+    Methods visiting every field of the model (to_doc, update, unpickling) are generated with the fields unrolled.
+    """
+    cls = dataclass(cls)
+    names = tuple(f.name for f in fields(cls))
+    inherited = {name for base in cls.__mro__[1:] for name in getattr(base, "__slots__", ())}
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ("__dict__", "__weakref__")}
+    namespace["__slots__"] = tuple(name for name in names if name not in inherited)
+    namespace["FIELDS"] = names
+    namespace["values"] = attrgetter(*names)
+    namespace["to_doc"] = create_method("to_doc", [
+        "doc = {}",
+        *(line for name in names for line in (
+            f"value = self.{name}",
+            "if value is not None:",
+            f"    doc['{name}'] = value",
+        )),
+        "return doc",
+    ])
+    namespace["update"] = create_method("update", [
+        *(line for name in names for line in (
+            f"value = coming.{name}",
+            "if value is not None:",
+            f"    self.{name} = value",
+        )),
+    ], args="self, coming")
+    namespace["__setstate__"] = create_method("__setstate__", [
+        f"({', '.join(f'self.{name}' for name in names)},) = state",
+    ], args="self, state")
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def model_fields(model, names: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Fields of the model among `names`, merges only visit the fields they may upsert
+    """
+    names = frozenset(names)
+    return tuple(name for name in model.FIELDS if name in names)
+
+
+@slotted
 class EV:
     id: str
     app_env: str
@@ -21,11 +76,17 @@ class EV:
     utcoffset: int
     pid: int
 
-    def to_doc(self):
-        return {k: v for k, v in self.__dict__.items() if v is not None}
+    def __getstate__(self):
+        return self.values(self)
+
+    # to_doc(self), update(self, coming) and __setstate__(self, state) are generated by @slotted
 
-    def update(self, coming):
-        for key, value in coming.__dict__.items():
+    def upsert(self, coming, keys: Tuple[str, ...]):
+        """
+        Same as update, restricted to the given fields
+        """
+        for key in keys:
+            value = getattr(coming, key)
             if value is not None:
                 setattr(self, key, value)
 
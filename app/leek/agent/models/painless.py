@@ -0,0 +1,206 @@
+"""
+Generate the task-merge painless script (conf/painless/TaskMerge.groovy) from the task merge rules, so that the
+index merges tasks exactly as the agent does.
+
+    python -m leek.agent.models.painless          # Regenerate the script
+    python -m leek.agent.models.painless --check  # Exit with an error if the script is not up to date, or if
+                                                  # Task.merge does not follow the rules
+"""
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from leek.agent.models.task import (
+    STATES, TASK_MERGE_PLAN, MERGE_ALL, MergePlan, Task, UPDATE, UPSERT, SKIP,
+)
+
+TASK_MERGE_SCRIPT = Path(__file__).resolve().parents[3] / "conf" / "painless" / "TaskMerge.groovy"
+
+HEADER = """\
+// GENERATED by `python -m leek.agent.models.painless` from the task merge rules (leek/agent/models/task.py),
+// do not edit: change the rules and regenerate this script.
+
+int new_events_count = params.events_count;
+List new_events = params.events;
+
+int events_count = ctx._source.events_count;
+List events = ctx._source.events;
+
+String stored = ctx._source.state;
+String coming = params.state;
+// States unknown to the rules are merged as is
+int plan = 0;
+"""
+
+FOOTER = """\
+// Introduce custom states
+if (ctx._source.retries != null && ctx._source.retries > 0) {
+    if (ctx._source.state == "FAILED") {
+        ctx._source.state = "CRITICAL";
+    }
+    else if (ctx._source.state == "SUCCEEDED") {
+        ctx._source.state = "RECOVERED";
+    }
+}
+
+// If parent/root is self fix
+if (ctx._source.root_id != null && ctx._source.root_id.equals(ctx._source.id) ) {
+    ctx._source.root_id = null;
+}
+if (ctx._source.parent_id != null && ctx._source.parent_id.equals(ctx._source.id) ) {
+    ctx._source.parent_id = null;
+}
+
+// Increment events count
+ctx._source.events_count = events_count + new_events_count;
+// Record only past 21 task states transitions
+events.addAll(0, new_events);
+if (events.size() > 21) {
+    events = events.subList(0, 21);
+}
+ctx._source.events = events;
+"""
+
+
+def any_of(variable: str, states: List[str]) -> str:
+    return " || ".join(f'{variable} == "{state}"' for state in states)
+
+
+def group_by(keys, outcome) -> List[Tuple[object, List[str]]]:
+    """
+    Group the keys with the same outcome, in order of first appearance
+    """
+    groups: Dict[object, List[str]] = {}
+    for key in keys:
+        groups.setdefault(outcome(key), []).append(key)
+    return list(groups.items())
+
+
+def upsert_lines(fields: Tuple[str, ...], indent: str) -> List[str]:
+    return [
+        f'{indent}if (params["{name}"] != null) {{ ctx._source["{name}"] = params["{name}"]; }}' for name in fields
+    ]
+
+
+def plan_lines(plan: MergePlan) -> List[str]:
+    if plan.action == UPDATE:
+        return [
+            "    // Merge every attribute set by the coming event",
+            "    for (def entry : params.entrySet()) {",
+            "        if (entry.getValue() != null) {",
+            "            ctx._source[entry.getKey()] = entry.getValue();",
+            "        }",
+            "    }",
+        ]
+    if plan.action == SKIP:
+        return [
+            "    // Keep the stored task as is",
+            "    ctx.op = 'none';",
+        ]
+    if plan.action == UPSERT:
+        lines = ["    // Resolve conflict and merge the safe attributes", *upsert_lines(plan.fields, "    ")]
+        for state, fields in plan.carried:
+            lines += [
+                f'    if (new_events.contains("{state}")) {{',
+                f"        // {state} already merged by the agent, its attributes should not be lost",
+                *upsert_lines(fields, "        "),
+                "    }",
+            ]
+        return lines
+    raise ValueError(f"Unknown merge action {plan.action}")
+
+
+def generate_task_merge_script() -> str:
+    plans = [MERGE_ALL]
+    for plan in TASK_MERGE_PLAN.values():
+        if plan not in plans:
+            plans.append(plan)
+    index = {plan: i for i, plan in enumerate(plans)}
+
+    def outcome(stored, coming):
+        """
+        Plan ids when the coming event is in order and out of order
+        """
+        return index[TASK_MERGE_PLAN[(stored, coming, True)]], index[TASK_MERGE_PLAN[(stored, coming, False)]]
+
+    lines = [
+        "if (ctx._source.uuid == null) {",
+        "    // First time to index",
+        "    plan = 0;",
+        "}",
+    ]
+    coming_groups = group_by(STATES, lambda coming: tuple(outcome(stored, coming) for stored in STATES))
+    for _, coming_states in coming_groups:
+        lines.append(f"else if ({any_of('coming', coming_states)}) {{")
+        stored_groups = group_by(STATES, lambda stored: outcome(stored, coming_states[0]))
+        if len(stored_groups) == 1:
+            # Same plan whatever the stored state
+            (in_order, _), _ = stored_groups[0]
+            lines += [f"    plan = {in_order};", "}"]
+            continue
+        for i, ((in_order, out_of_order), stored_states) in enumerate(stored_groups):
+            lines.append(f"    {'if' if i == 0 else 'else if'} ({any_of('stored', stored_states)}) {{")
+            if in_order == out_of_order:
+                lines.append(f"        plan = {in_order};")
+            else:
+                lines.append(
+                    f"        plan = ctx._source.exact_timestamp < params.exact_timestamp ? {in_order} : {out_of_order};"
+                )
+            lines.append("    }")
+        lines.append("}")
+    lines.append("")
+
+    for i, plan in enumerate(plans):
+        lines.append(f"{'if' if i == 0 else 'else if'} (plan == {i}) {{")
+        lines += plan_lines(plan)
+        lines.append("}")
+    lines.append("")
+    return "\n".join([HEADER, *lines, FOOTER])
+
+
+def check_task_merge() -> List[str]:
+    """
+    Merge a task of every state with an event of every state, in and out of order, and check that the attributes
+    changed by Task.merge are the ones of the plan the script is generated from
+    :return: mismatches
+    """
+    # Either set by the merge itself, or identical on both sides (retries would introduce custom states)
+    ignored = {"id", "uuid", "state", "exact_timestamp", "retries", "events", "events_count"}
+
+    def make_task(prefix, state, exact_timestamp, events):
+        values = {name: f"{prefix}-{name}" for name in Task.FIELDS if name not in ignored}
+        return Task(**values, id="uuid", uuid="uuid", state=state, exact_timestamp=exact_timestamp, events=events)
+
+    mismatches = []
+    for (stored_state, coming_state, in_order), plan in TASK_MERGE_PLAN.items():
+        for carried in ((), tuple(state for state, _ in plan.carried)):
+            stored = make_task("stored", stored_state, 1.0, [stored_state])
+            coming = make_task("coming", coming_state, 2.0 if in_order else 0.0, [coming_state, *carried])
+            stored.merge(coming)
+            merged = {name for name, value in stored.to_doc().items() if value == f"coming-{name}"}
+            if plan.action == UPDATE:
+                expected = set(Task.FIELDS) - ignored
+            elif plan.action == SKIP:
+                expected = set()
+            else:
+                expected = {*plan.fields, *(name for state, fields in plan.carried if state in carried
+                                            for name in fields)} - ignored
+            if merged != expected:
+                mismatches.append(f"{stored_state} <- {coming_state} ({'in' if in_order else 'out of'} order, "
+                                  f"carrying {list(carried)}): merged {sorted(merged)}, expected {sorted(expected)}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    source = generate_task_merge_script()
+    if "--check" in sys.argv[1:]:
+        mismatches = check_task_merge()
+        if mismatches:
+            sys.exit("Task.merge does not follow the task merge rules:\n" + "\n".join(mismatches))
+        if TASK_MERGE_SCRIPT.read_text() != source:
+            sys.exit(f"{TASK_MERGE_SCRIPT} is out of date with the task merge rules, regenerate it with "
+                     f"`python -m leek.agent.models.painless`")
+        print(f"{TASK_MERGE_SCRIPT} is up to date")
+    else:
+        TASK_MERGE_SCRIPT.write_text(source)
+        print(f"Generated {TASK_MERGE_SCRIPT}")
@@ -1,7 +1,7 @@
-from typing import List, Union, Optional
+from typing import Dict, List, Union, Optional, Tuple
 from dataclasses import dataclass, field
 
-from leek.agent.models.event import EV
+from leek.agent.models.event import EV, slotted, model_fields
 
 QUEUED = "QUEUED"
 RECEIVED = "RECEIVED"
@@ -20,6 +20,8 @@ STATES_TERMINAL = frozenset([SUCCEEDED, FAILED, REJECTED, REVOKED, RECOVERED, CR
 STATES_SUCCESS = frozenset([SUCCEEDED, RECOVERED])
 STATES_EXCEPTION = frozenset([FAILED, RETRY, REJECTED, REVOKED, CRITICAL])
 STATES_UNREADY = frozenset([QUEUED, RECEIVED, STARTED])
+STATES = (QUEUED, RECEIVED, STARTED, RETRY, SUCCEEDED, FAILED, REJECTED, REVOKED, RECOVERED, CRITICAL)
+STATES_NOT_TERMINAL = tuple(state for state in STATES if state not in STATES_TERMINAL)
 
 TaskStateFields = dict(
     # -- No need to update this fields if coming task is out of order
@@ -28,7 +30,7 @@ TaskStateFields = dict(
     # -- Shared between states
     QUEUED_RECEIVED=("name", "name_parts", "args", "kwargs", "root_id", "parent_id", "eta", "expires", "retries",
                      "args_0", "args_1", "args_2", "args_3", "args_4", "args_5", "args_6", "args_7", "args_8",
-                     "args_9", "kwargs_flattened"),
+                     "args_9", "kwargs_flattened", "args_ref", "kwargs_ref"),
     FAILED_RETRY=("exception", "traceback", "lang", "error", "stack", "trace"),
     # -- Safe
     NOT_QUEUED=("worker",),
@@ -37,14 +39,14 @@ TaskStateFields = dict(
     STARTED=("started_at",),
     RETRY=("retried_at",),
     # TERMINAL STATES
-    SUCCEEDED=("succeeded_at", "result", "runtime",),
+    SUCCEEDED=("succeeded_at", "result", "result_ref", "runtime",),
     FAILED=("failed_at",),
     REJECTED=("rejected_at", "requeue",),
     REVOKED=("revoked_at", "terminated", "expired", "signum"),
 )
 
 
-@dataclass
+@slotted
 class Task(EV):
     # BASIC
     uuid: str
@@ -69,6 +71,10 @@ class Task(EV):
     # OUTPUT
     result: Optional[str] = None
     runtime: Optional[float] = None
+    # PAYLOAD POLICY — set by the API, listed for the merge rules of the index (see leek.agent.models.painless)
+    args_ref: Optional[dict] = None
+    kwargs_ref: Optional[dict] = None
+    result_ref: Optional[dict] = None
     # DEPENDENCIES
     root_id: Optional[str] = None
     parent_id: Optional[str] = None
@@ -108,76 +114,19 @@ class Task(EV):
     events: Optional[List[str]] = field(default_factory=lambda: [])
     events_count: Optional[int] = 1
 
-    def resolve_conflict_late_events(self, coming: "Task"):
-        """
-        Case:
-            - The task is already in terminal state, Resolve conflict and merge
-            - However, another event came late with a non terminal state:
-                - RETRY: Merge only if the Task not in FAILED or CRITICAL
-                - QUEUED | RECEIVED:
-        Note: This can happen if the events are queued our of order
-        :param coming: Late non terminal event
-        """
-        # Get safe attrs from coming task
-        attrs_to_upsert = list(TaskStateFields[coming.state])
-
-        # States with same attrs
-        if coming.state == RETRY:
-            if self.state not in [FAILED, CRITICAL]:
-                # update task with traceback/exception
-                attrs_to_upsert += list(TaskStateFields["FAILED_RETRY"])
-        elif coming.state in [QUEUED, RECEIVED]:
-            attrs_to_upsert += list(TaskStateFields["QUEUED_RECEIVED"])
-
-        # Merge
-        for key, value in coming.__dict__.items():
-            if value is not None and key in attrs_to_upsert:
-                setattr(self, key, value)
-
-    def resolve_conflict_wrong_timestamp(self, coming: "Task"):
-        # Get safe attrs from coming task
-        attrs_to_upsert = list(TaskStateFields[coming.state])
-
-        # States with same attrs
-        if coming.state == RETRY:
-            if self.state != RETRY:
-                # update task with traceback/exception
-                attrs_to_upsert += list(TaskStateFields["FAILED_RETRY"])
-
-        elif coming.state in [QUEUED, RECEIVED]:
-            if self.state not in [QUEUED, RECEIVED]:
-                attrs_to_upsert += list(TaskStateFields["QUEUED_RECEIVED"])
-
-        # Merge
-        for key, value in coming.__dict__.items():
-            if value is not None and key in attrs_to_upsert:
-                setattr(self, key, value)
-
-    def handle_non_terminal_event(self, coming: "Task"):
-        in_order = self.exact_timestamp < coming.exact_timestamp
-        if in_order:
-            # The two documents are in physical clock order and in state order, Safe to merge
-            self.update(coming)
-        elif self.state != coming.state:
-            # The two documents are out of order and has different non terminal states => Resolve conflict and merge
-            self.resolve_conflict_wrong_timestamp(coming)
-        else:
-            # The two documents are out of order and has the same state => Skip
-            pass
-
     def merge(self, coming: "Task"):
         events_count = self.events_count
         events = self.events
 
-        if coming.state in STATES_TERMINAL:
-            # Coming terminal event is safe to merge, no need to compare clocks/timestamps
+        in_order = self.exact_timestamp < coming.exact_timestamp
+        plan = TASK_MERGE_PLAN.get((self.state, coming.state, in_order), MERGE_ALL)
+        if plan.action == UPDATE:
             self.update(coming)
-        elif self.state in STATES_TERMINAL:
-            # The task is already in terminal state, Resolve conflict and merge
-            self.resolve_conflict_late_events(coming)
-        else:
-            # Handle non terminal events (Just merge | Resolve conflict and merge)
-            self.handle_non_terminal_event(coming)
+        elif plan.action == UPSERT:
+            self.upsert(coming, plan.fields)
+            for state, fields in plan.carried:
+                if state in coming.events:
+                    self.upsert(coming, fields)
 
         # Introduce custom states
         if self.retries:
@@ -199,3 +148,86 @@ class Task(EV):
         # Track the merge operation by the index (A)
         # events = [f"A:{coming.state}", *events[0:20]]
         self.events = events
+
+
+UPDATE = "update"  # Merge every attribute set by the coming event
+UPSERT = "upsert"  # Merge only the attributes of the listed groups
+SKIP = "skip"  # Keep the stored task as is
+IN_ORDER = (True,)
+OUT_OF_ORDER = (False,)
+ANY_ORDER = (True, False)
+
+# Merge rules of a stored task and a coming event, shared by Task.merge (agent) and the task-merge painless script
+# (index) generated from them by `python -m leek.agent.models.painless`. The first rule matching the
+# (stored state, coming state, in order) key wins, in order means the coming event is more recent.
+# Columns: stored states, coming states, ordering, action, groups of TaskStateFields to upsert, carried groups.
+# Carried groups are upserted only if the coming event already merges events of the given state (the agent
+# merged several events of the task before they reach the index).
+TASK_MERGE_RULES = (
+    # Coming terminal event is safe to merge, no need to compare clocks/timestamps
+    (STATES, STATES_TERMINAL, ANY_ORDER, UPDATE, (), ()),
+    # The task is already in terminal state, late non terminal event => Resolve conflict and merge
+    ((FAILED, CRITICAL), (RETRY,), ANY_ORDER, UPSERT, (RETRY,),
+     ((QUEUED, (QUEUED,)), (RECEIVED, (RECEIVED,)))),
+    (STATES_TERMINAL, (RETRY,), ANY_ORDER, UPSERT, (RETRY, "FAILED_RETRY"),
+     ((QUEUED, (QUEUED,)), (RECEIVED, (RECEIVED,)))),
+    (STATES_TERMINAL, (QUEUED,), ANY_ORDER, UPSERT, (QUEUED, "QUEUED_RECEIVED"),
+     ((RECEIVED, (RECEIVED,)),)),
+    (STATES_TERMINAL, (RECEIVED,), ANY_ORDER, UPSERT, (RECEIVED, "QUEUED_RECEIVED"),
+     ((QUEUED, (QUEUED,)),)),
+    (STATES_TERMINAL, (STARTED,), ANY_ORDER, UPSERT, (STARTED,),
+     ((QUEUED, (QUEUED, "QUEUED_RECEIVED")), (RECEIVED, (RECEIVED, "QUEUED_RECEIVED")))),
+    # Non terminal events in physical clock order => Just merge
+    (STATES_NOT_TERMINAL, STATES_NOT_TERMINAL, IN_ORDER, UPDATE, (), ()),
+    # Out of order with the same state => Skip
+    ((QUEUED,), (QUEUED,), OUT_OF_ORDER, SKIP, (), ()),
+    ((RECEIVED,), (RECEIVED,), OUT_OF_ORDER, SKIP, (), ()),
+    ((STARTED,), (STARTED,), OUT_OF_ORDER, SKIP, (), ()),
+    ((RETRY,), (RETRY,), OUT_OF_ORDER, SKIP, (), ()),
+    # Out of order with different states => Resolve conflict and merge
+    ((QUEUED, RECEIVED, STARTED), (RETRY,), OUT_OF_ORDER, UPSERT, (RETRY, "FAILED_RETRY"), ()),
+    ((RECEIVED,), (QUEUED,), OUT_OF_ORDER, UPSERT, (QUEUED,), ()),
+    ((QUEUED,), (RECEIVED,), OUT_OF_ORDER, UPSERT, (RECEIVED,), ()),
+    ((STARTED, RETRY), (QUEUED,), OUT_OF_ORDER, UPSERT, (QUEUED, "QUEUED_RECEIVED"), ()),
+    ((STARTED, RETRY), (RECEIVED,), OUT_OF_ORDER, UPSERT, (RECEIVED, "QUEUED_RECEIVED"), ()),
+    (STATES_NOT_TERMINAL, (STARTED,), OUT_OF_ORDER, UPSERT, (STARTED,), ()),
+)
+
+
+@dataclass(frozen=True)
+class MergePlan:
+    action: str
+    fields: Tuple[str, ...] = ()
+    carried: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+
+
+# States unknown to the rules are merged as is
+MERGE_ALL = MergePlan(UPDATE)
+
+
+def compile_merge_plan(rules) -> Dict[Tuple[str, str, bool], MergePlan]:
+    """
+    Expand the merge rules to a plan per (stored state, coming state, in order) key, with the attributes to upsert
+    """
+
+    def fields_of(groups):
+        return model_fields(Task, [name for group in groups for name in TaskStateFields[group]])
+
+    plan = {}
+    for stored_states, coming_states, orderings, action, groups, carried in rules:
+        for stored in stored_states:
+            for coming in coming_states:
+                for in_order in orderings:
+                    plan.setdefault((stored, coming, in_order), MergePlan(
+                        action,
+                        fields_of(groups),
+                        tuple((state, fields_of(carried_groups)) for state, carried_groups in carried),
+                    ))
+    missing = [(stored, coming) for stored in STATES for coming in STATES
+               if (stored, coming, True) not in plan or (stored, coming, False) not in plan]
+    if missing:
+        raise ValueError(f"Task merge rules do not cover {missing}")
+    return plan
+
+
+TASK_MERGE_PLAN = compile_merge_plan(TASK_MERGE_RULES)
@@ -1,7 +1,6 @@
 from typing import List, Optional
-from dataclasses import dataclass
 
-from leek.agent.models.event import EV
+from leek.agent.models.event import EV, slotted, model_fields
 
 
 class WorkerStateFields:
@@ -16,7 +15,7 @@ class WorkerStateFields:
     OFFLINE = ("offline_at",)
 
 
-@dataclass
+@slotted
 class Worker(EV):
     # BASIC
     hostname: str
@@ -37,11 +36,9 @@ class Worker(EV):
 
     def resolve_conflict(self, coming: "Worker"):
         # Get safe attrs from coming task
-        attrs_to_upsert = list(getattr(WorkerStateFields, coming.state))
+        attrs_to_upsert = WORKER_STATE_FIELDS[coming.state]
         # Merge
-        for key, value in coming.__dict__.items():
-            if value is not None and key in attrs_to_upsert:
-                setattr(self, key, value)
+        self.upsert(coming, attrs_to_upsert)
 
     def merge(self, coming: "Worker"):
         events_count = self.events_count
@@ -63,3 +60,9 @@ class Worker(EV):
         self.events_count = events_count + 1
 
         return merged
+
+
+# Worker fields of each group of WorkerStateFields, computed once rather than on every merge
+WORKER_STATE_FIELDS = {
+    state: model_fields(Worker, getattr(WorkerStateFields, state)) for state in ("ONLINE", "HEARTBEAT", "OFFLINE")
+}
@@ -0,0 +1,155 @@
+import re
+import zlib
+import fnmatch
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Pattern
+
+from leek.agent.adapters.task import TASK_STATE_MAPPING
+from leek.agent.adapters.worker import WORKER_STATE_MAPPING
+
+EVENT_STATE_BY_TYPE = {**TASK_STATE_MAPPING, **WORKER_STATE_MAPPING}
+EVENT_TYPES_BY_STATE = {}
+for _ev_type, _state in EVENT_STATE_BY_TYPE.items():
+    EVENT_TYPES_BY_STATE.setdefault(_state, set()).add(_ev_type)
+
+RULE_KEYS = frozenset(["names", "states", "types", "keep"])
+
+# Sampling resolution
+SAMPLING_BUCKETS = 10000
+
+
+class InvalidRule(ValueError):
+    pass
+
+
+def list_of_strings(rule: Dict, key: str) -> List[str]:
+    values = rule.get(key) or []
+    if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+        raise InvalidRule(f"Rule {key} should be a list of non empty strings")
+    return values
+
+
+@dataclass
+class CompiledRule:
+    # None matches any event type/name
+    types: Optional[FrozenSet[str]]
+    pattern: Optional[Pattern]
+    keep: float
+
+    @classmethod
+    def compile(cls, rule: Dict) -> "CompiledRule":
+        """
+        Compile a subscription rule:
+            {"names": ["*.healthcheck"], "states": ["SUCCEEDED"], "keep": 0.01}
+            {"names": ["myapp.chatty.*"], "types": ["task-received"], "keep": 0}
+        `names` are task name glob patterns, `states` (QUEUED, SUCCEEDED, HEARTBEAT...) and `types`
+        (task-sent, worker-heartbeat...) select the events, `keep` is the fraction of matching events kept.
+        Also used to validate the rules of the subscriptions (bootstrap, API), raises InvalidRule.
+        """
+        if not isinstance(rule, dict):
+            raise InvalidRule("Rule should be an object")
+        unknown = set(rule) - RULE_KEYS
+        if unknown:
+            raise InvalidRule(f"Unknown rule attributes {', '.join(sorted(map(str, unknown)))}")
+        types = set()
+        for ev_type in list_of_strings(rule, "types"):
+            if ev_type not in EVENT_STATE_BY_TYPE:
+                raise InvalidRule(f"Unknown event type {ev_type}")
+            types.add(ev_type)
+        for state in list_of_strings(rule, "states"):
+            if state not in EVENT_TYPES_BY_STATE:
+                raise InvalidRule(f"Unknown event state {state}")
+            types.update(EVENT_TYPES_BY_STATE[state])
+        keep = rule.get("keep")
+        if isinstance(keep, bool) or not isinstance(keep, (int, float)) or not 0 <= keep <= 1:
+            raise InvalidRule("Rule keep should be a fraction between 0 and 1")
+        names = rule.get("names") or []
+        if isinstance(names, str):
+            names = [names]
+        names = list_of_strings({"names": names}, "names")
+        # All the globs of a rule are matched by a single regex
+        pattern = re.compile("|".join(fnmatch.translate(name) for name in names)) if names else None
+        return cls(types=frozenset(types) if types else None, pattern=pattern, keep=float(keep))
+
+    def matches(self, ev_type: str, name: Optional[str]) -> bool:
+        if self.types is not None and ev_type not in self.types:
+            return False
+        if self.pattern is not None and (name is None or self.pattern.match(name) is None):
+            return False
+        return True
+
+
+class EventRules:
+    """
+    Drop and sample rules of a subscription, evaluated on raw events before any validation/normalization.
+
+    Rules are evaluated in order, the first matching rule decides the fraction of events kept, events matching
+    no rule are kept. The decision only depends on the event type and task name, it is computed once per
+    (type, name) and cached. Only sent/received task events carry the task name, the name of the other task
+    events is recalled from the task uuid. Sampling is deterministic per task (uuid) or worker (hostname),
+    a sampled task keeps all of its matching events.
+    The rules are not safe for concurrent use, callers are expected to serialize access to them.
+    """
+    DECISIONS_CACHE_SIZE = 10000
+    NAMES_CACHE_SIZE = 100000
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = [CompiledRule.compile(rule) for rule in rules]
+        # Names are only needed if a rule matches names
+        self.track_names = any(rule.pattern is not None for rule in self.rules)
+        self.decisions: Dict = {}
+        self.names: Dict[str, str] = OrderedDict()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def decide(self, ev_type: str, name: Optional[str]) -> float:
+        key = (ev_type, name)
+        keep = self.decisions.get(key)
+        if keep is None:
+            keep = 1.0
+            for rule in self.rules:
+                if rule.matches(ev_type, name):
+                    keep = rule.keep
+                    break
+            if len(self.decisions) >= self.DECISIONS_CACHE_SIZE:
+                self.decisions.clear()
+            self.decisions[key] = keep
+        return keep
+
+    def recall_name(self, uuid, name: Optional[str]) -> Optional[str]:
+        if name is not None:
+            if uuid not in self.names:
+                self.names[uuid] = name
+                if len(self.names) > self.NAMES_CACHE_SIZE:
+                    self.names.popitem(last=False)
+            return name
+        return self.names.get(uuid)
+
+    def filter(self, payload: List[Dict]) -> List[Dict]:
+        kept = []
+        for event in payload:
+            if not isinstance(event, dict):
+                # Malformed, left to the validation
+                kept.append(event)
+                continue
+            ev_type, uuid, name = event.get("type"), event.get("uuid"), event.get("name")
+            if not isinstance(ev_type, str):
+                # Malformed, left to the validation
+                kept.append(event)
+                continue
+            if not isinstance(uuid, str):
+                uuid = None
+            if not isinstance(name, str):
+                name = None
+            if self.track_names and uuid is not None:
+                name = self.recall_name(uuid, name)
+            keep = self.decide(ev_type, name)
+            if keep >= 1:
+                kept.append(event)
+            elif keep > 0:
+                key = str(uuid if uuid is not None else event.get("hostname"))
+                if zlib.crc32(key.encode("utf-8")) % SAMPLING_BUCKETS < keep * SAMPLING_BUCKETS:
+                    kept.append(event)
+        return kept
@@ -0,0 +1,203 @@
+import os
+import zlib
+from multiprocessing import Pipe, Process
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from gevent.lock import Semaphore
+from gevent.socket import wait_read
+from gevent.threadpool import ThreadPool
+
+from leek.agent.logger import get_logger
+from leek.agent.models.task import Task
+from leek.agent.models.worker import Worker
+from leek.agent.adapters import parse_cache
+from leek.agent.adapters.kwargs_policy import KwargsPolicy
+from leek.agent.adapters.serializer import validate_payload, to_docs
+from leek.serialization import json_dumps
+
+logger = get_logger(__name__)
+
+
+class ShardError(Exception):
+    pass
+
+
+def shard_key(event: Dict) -> str:
+    """
+    Events of the same task (uuid) or worker (hostname) always land on the same shard,
+    so that they are merged together and in order by Task.merge/Worker.merge
+    """
+    if not isinstance(event, dict):
+        # Malformed, rejected by the validation of whatever shard it lands on
+        return ""
+    return str(event.get("uuid") or event.get("hostname") or "")
+
+
+class ValidationShards:
+    """
+    Fan out events validation and normalization of a subscription to N worker processes.
+
+    The consumer process stays the only one talking to the broker and the API, it partitions each batch by
+    task uuid/worker hostname and gathers the results back. Partitioning preserves the per-task merge
+    ordering, the merged result is the same as validating the whole batch in a single process.
+
+    Unless the consumer coalesces tasks across batches, shards also serialize and encode their partition
+    (see encode), so that the consumer process is left with little more than compressing and posting.
+    """
+
+    def __init__(self, subscription_name: str, count: int, app_env: str):
+        self.subscription_name = subscription_name
+        self.count = count
+        self.app_env = app_env
+        # Only one batch at a time goes through the pipes
+        self.lock = Semaphore()
+        self.processes = [None] * count
+        self.connections = [None] * count
+        # Pickling and writing a partition blocks until the shard reads it, done from native threads so that the
+        # consumer keeps acking and heartbeating meanwhile
+        self.senders = ThreadPool(count)
+        for i in range(count):
+            self.spawn(i)
+        logger.info(f"Started {count} validation shards for subscription {subscription_name}")
+
+    def spawn(self, i):
+        parent_conn, child_conn = Pipe()
+        # Under gevent monkey patching the pipe is a non-blocking socketpair, Connection expects blocking fds
+        os.set_blocking(parent_conn.fileno(), True)
+        os.set_blocking(child_conn.fileno(), True)
+        process = Process(
+            target=self.serve,
+            args=(child_conn, parent_conn, self.app_env),
+            name=f"{self.subscription_name}-shard-{i}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self.processes[i] = process
+        self.connections[i] = parent_conn
+
+    def ensure_alive(self):
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.warning(f"Validation shard {process.name} died with exit code {process.exitcode}, respawning...")
+                self.connections[i].close()
+                self.spawn(i)
+
+    @staticmethod
+    def serve(conn, parent_conn, app_env):
+        # Inherited from the fork, the shard would otherwise never see the consumer end of the pipe closed
+        parent_conn.close()
+        while True:
+            try:
+                payload, kwargs_policy, encode = conn.recv()
+            except (EOFError, OSError):
+                # Consumer process is gone
+                return
+            try:
+                rejected = []
+                if kwargs_policy is not None:
+                    # Only report the keys pruned by this shard, not the pending counts of the consumer copy
+                    kwargs_policy.take_pruned()
+                validated_payload = validate_payload(payload, app_env, rejected, kwargs_policy)
+                if encode:
+                    # Ready to post, the consumer only splices the partitions together
+                    docs = to_docs(validated_payload.values(), rejected)
+                    validated_payload = (json_dumps(docs), len(docs))
+                pruned = kwargs_policy.take_pruned() if kwargs_policy is not None else None
+                conn.send((True, (validated_payload, rejected, pruned, parse_cache.stats())))
+            except Exception as ex:
+                conn.send((False, f"{ex.__class__.__name__}: {ex}"))
+
+    def partition(self, payload: Iterable[Dict]) -> List[List[Dict]]:
+        partitions = [[] for _ in range(self.count)]
+        for event in payload:
+            partitions[zlib.crc32(shard_key(event).encode("utf-8")) % self.count].append(event)
+        return partitions
+
+    def scatter_gather(
+            self,
+            payload: Iterable[Dict],
+            rejected: Optional[List[Tuple[str, str, Dict]]],
+            kwargs_policy: Optional[KwargsPolicy],
+            encode: bool,
+    ) -> List[Any]:
+        """
+        Process the partitions of the batch in parallel
+        :return: results of the shards
+        """
+        with self.lock:
+            self.ensure_alive()
+            partitions = self.partition(payload)
+            sends = [
+                self.senders.spawn(conn.send, (partition, kwargs_policy, encode))
+                for conn, partition in zip(self.connections, partitions)
+                if len(partition)
+            ]
+            for send in sends:
+                # Yield to other greenlets while the partitions are written, raises if a shard is gone
+                send.get()
+            results, errors = [], []
+            for process, conn, partition in zip(self.processes, self.connections, partitions):
+                if not len(partition):
+                    continue
+                # Yield to other greenlets while the shard is working
+                wait_read(conn.fileno())
+                try:
+                    ok, result = conn.recv()
+                except EOFError:
+                    ok, result = False, "Validation shard died while processing the batch"
+                if ok:
+                    shard_result, partition_rejected, pruned, cache_stats = result
+                    if pruned:
+                        kwargs_policy.pruned.update(pruned)
+                    parse_cache.record_remote_stats(process.name, cache_stats)
+                    results.append(shard_result)
+                    if rejected is not None:
+                        rejected.extend(partition_rejected)
+                else:
+                    errors.append(result)
+            if len(errors):
+                raise ShardError(", ".join(errors))
+            return results
+
+    def validate(
+            self,
+            payload: Iterable[Dict],
+            rejected: Optional[List[Tuple[str, str, Dict]]] = None,
+            kwargs_policy: Optional[KwargsPolicy] = None,
+    ) -> Dict[str, Union[Task, Worker]]:
+        """
+        Validated events by id, for the consumers that still need the events (coalescing)
+        """
+        validated_payload = {}
+        for validated_partition in self.scatter_gather(payload, rejected, kwargs_policy, encode=False):
+            validated_payload.update(validated_partition)
+        return validated_payload
+
+    def encode(
+            self,
+            payload: Iterable[Dict],
+            rejected: List[Tuple[str, str, Dict]],
+            kwargs_policy: Optional[KwargsPolicy] = None,
+    ) -> Tuple[bytes, int]:
+        """
+        Validate, merge, serialize and JSON encode the batch in the shards, the consumer process is left with
+        posting it. Partitions share no task/worker, their documents are simply concatenated.
+        :return: JSON array of the docs, number of docs
+        """
+        parts, count = [], 0
+        for data, docs_count in self.scatter_gather(payload, rejected, kwargs_policy, encode=True):
+            if docs_count:
+                # Strip the brackets of the partition array
+                parts.append(data[1:-1])
+                count += docs_count
+        return b"[" + b",".join(parts) + b"]", count
+
+    def close(self):
+        self.senders.kill()
+        for conn in self.connections:
+            conn.close()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
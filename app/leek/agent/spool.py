@@ -0,0 +1,181 @@
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+from leek.agent.logger import get_logger
+
+logger = get_logger(__name__)
+
+FSYNC_ALWAYS = "always"  # fsync after every appended batch, safest and slowest
+FSYNC_SEGMENT = "segment"  # fsync when a segment is sealed, may lose the tail of the active segment on power loss
+FSYNC_NEVER = "never"  # rely on the OS page cache flush
+
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_SEGMENT, FSYNC_NEVER)
+
+
+@dataclass
+class SpoolRecord:
+    segment: str
+    index: int
+    data: bytes
+
+
+class Spool:
+    """
+    Durable local write-ahead log of encoded batches, used while the API is unavailable.
+
+    Batches are appended to segment files as length/checksum framed records, segments are replayed and
+    deleted in order (oldest first) once the API recovers. Replay is at-least-once: a segment partially
+    replayed before a restart is replayed again from its first record.
+    The spool is not safe for concurrent use, callers are expected to serialize access to it.
+    """
+    SEGMENT_SUFFIX = ".seg"
+    HEADER = struct.Struct(">II")  # record length, crc32
+
+    def __init__(
+            self,
+            directory: str,
+            max_size_in_mb: int = 1024,
+            segment_max_size_in_mb: int = 64,
+            fsync_policy: str = FSYNC_SEGMENT,
+    ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Spool fsync policy should be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.max_size_in_bytes = max_size_in_mb * 1024 * 1024
+        self.segment_max_size_in_bytes = segment_max_size_in_mb * 1024 * 1024
+        self.fsync_policy = fsync_policy
+
+        os.makedirs(directory, exist_ok=True)
+        # Recover segments left by a previous run
+        self.segments = sorted(f for f in os.listdir(directory) if f.endswith(self.SEGMENT_SUFFIX))
+        self.size_in_bytes = sum(os.path.getsize(self.path(f)) for f in self.segments)
+        self.next_segment_id = int(self.segments[-1][:-len(self.SEGMENT_SUFFIX)]) + 1 if self.segments else 1
+
+        # Active (writable) segment
+        self.writer = None
+        self.writer_segment = None
+        self.writer_size_in_bytes = 0
+
+        # Segment being replayed
+        self.reader_segment = None
+        self.reader_records: List[bytes] = []
+        self.reader_position = 0
+
+        if self.segments:
+            logger.warning(f"Spool {directory} recovered {len(self.segments)} segments ({self.size_in_bytes} bytes)")
+
+    def __len__(self):
+        return len(self.segments)
+
+    def path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    # ---------- Write ----------
+
+    def append(self, data: bytes) -> bool:
+        """
+        Append an encoded batch to the active segment
+        :param data: encoded batch
+        :return: False if the spool is full and the batch was not spooled
+        """
+        record_size = self.HEADER.size + len(data)
+        if self.size_in_bytes + record_size > self.max_size_in_bytes:
+            return False
+        if self.writer is None or self.writer_size_in_bytes + record_size > self.segment_max_size_in_bytes:
+            self.seal()
+            self.open_segment()
+        self.writer.write(self.HEADER.pack(len(data), zlib.crc32(data)))
+        self.writer.write(data)
+        self.writer.flush()
+        if self.fsync_policy == FSYNC_ALWAYS:
+            os.fsync(self.writer.fileno())
+        self.writer_size_in_bytes += record_size
+        self.size_in_bytes += record_size
+        return True
+
+    def open_segment(self):
+        self.writer_segment = f"{self.next_segment_id:016d}{self.SEGMENT_SUFFIX}"
+        self.next_segment_id += 1
+        self.writer = open(self.path(self.writer_segment), "ab")
+        self.writer_size_in_bytes = 0
+        self.segments.append(self.writer_segment)
+
+    def seal(self):
+        """
+        Close the active segment, following appends go to a new segment
+        """
+        if self.writer is None:
+            return
+        if self.fsync_policy in (FSYNC_ALWAYS, FSYNC_SEGMENT):
+            os.fsync(self.writer.fileno())
+        self.writer.close()
+        self.writer = None
+        self.writer_segment = None
+        self.writer_size_in_bytes = 0
+
+    def close(self):
+        self.seal()
+
+    # ---------- Replay ----------
+
+    def peek(self) -> Optional[SpoolRecord]:
+        """
+        Oldest batch not yet replayed, None if the spool is empty
+        """
+        while self.segments:
+            segment = self.segments[0]
+            if self.reader_segment != segment:
+                if segment == self.writer_segment:
+                    # Replay catches up with the writer, seal the segment so it is read complete
+                    self.seal()
+                self.reader_segment = segment
+                self.reader_records = self.read_segment(segment)
+                self.reader_position = 0
+            if self.reader_position < len(self.reader_records):
+                return SpoolRecord(segment, self.reader_position, self.reader_records[self.reader_position])
+            # Segment fully replayed
+            self.drop_segment(segment)
+        return None
+
+    def commit(self, record: SpoolRecord):
+        """
+        Acknowledge the replay of a record, the segment is deleted once all its records are replayed
+        """
+        if record.segment != self.reader_segment or record.index != self.reader_position:
+            return
+        self.reader_position += 1
+        if self.reader_position >= len(self.reader_records):
+            self.drop_segment(record.segment)
+
+    def drop_segment(self, segment):
+        path = self.path(segment)
+        try:
+            self.size_in_bytes -= os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self.segments.remove(segment)
+        self.size_in_bytes = max(0, self.size_in_bytes)
+        self.reader_segment = None
+        self.reader_records = []
+        self.reader_position = 0
+
+    def read_segment(self, segment) -> List[bytes]:
+        records = []
+        with open(self.path(segment), "rb") as f:
+            content = f.read()
+        offset = 0
+        while offset + self.HEADER.size <= len(content):
+            length, crc = self.HEADER.unpack_from(content, offset)
+            start = offset + self.HEADER.size
+            data = content[start:start + length]
+            if len(data) < length or zlib.crc32(data) != crc:
+                # Torn write, the process stopped while appending the tail record
+                logger.warning(f"Spool segment {segment} has a corrupted record at offset {offset}, skipping the rest")
+                break
+            records.append(data)
+            offset = start + length
+        return records
@@ -0,0 +1,177 @@
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from leek.api.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Payload policy modes, see apply_payload_policy
+KEEP, TRUNCATE, HASH, OFFLOAD = "keep", "truncate", "hash", "offload"
+
+# Fields derived by the agent from args/kwargs, they hold (part of) the full value
+DERIVED_FIELDS = {
+    "args": tuple(f"args_{i}" for i in range(10)),
+    "kwargs": ("kwargs_flattened",),
+}
+
+
+class LocalBlobStore:
+    """
+    Content addressed blobs on the local filesystem, one directory per application:
+        <root>/<index_alias>/<digest[:2]>/<digest>
+    The directory should be shared by the API workers (a volume when running several containers).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, index_alias: str, digest: str) -> str:
+        return os.path.join(self.root, index_alias, digest[:2], digest)
+
+    def put(self, index_alias: str, digest: str, data: bytes):
+        path = self.path(index_alias, digest)
+        if os.path.exists(path):
+            # Same content, already stored
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic, readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, index_alias: str, digest: str) -> Optional[bytes]:
+        try:
+            with open(self.path(index_alias, digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3BlobStore:
+    """
+    Content addressed blobs in an S3 compatible bucket, one prefix per application:
+        s3://<bucket>/<prefix>/<index_alias>/<digest>
+    Credentials and endpoint are resolved by boto3 (AWS_* environment variables, instance profile...).
+    """
+
+    def __init__(self, bucket: str, prefix: str):
+        import boto3
+        self.client = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def key(self, index_alias: str, digest: str) -> str:
+        return "/".join(part for part in (self.prefix, index_alias, digest) if part)
+
+    def put(self, index_alias: str, digest: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.key(index_alias, digest), Body=data)
+
+    def get(self, index_alias: str, digest: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(index_alias, digest))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+
+_blob_store = None
+_blob_store_initialized = False
+
+
+def create_blob_store(blob_store_url: str):
+    """
+    Blob store of a LEEK_API_BLOB_STORE_URL (file:///path or s3://bucket/prefix), None if not configured
+    """
+    if not blob_store_url:
+        return None
+    url = urlparse(blob_store_url)
+    if url.scheme == "s3":
+        if not url.netloc:
+            raise ValueError(f"Blob store {blob_store_url} has no bucket")
+        return S3BlobStore(url.netloc, url.path)
+    if url.scheme in ("", "file"):
+        if not url.path:
+            raise ValueError(f"Blob store {blob_store_url} has no path")
+        return LocalBlobStore(url.path)
+    raise ValueError(f"Unsupported blob store {blob_store_url}, expected file:///path or s3://bucket/prefix")
+
+
+def init_blob_store():
+    """
+    Resolve the blob store once, when the API starts, a misconfigured store fails the startup
+    """
+    global _blob_store, _blob_store_initialized
+    _blob_store = create_blob_store(settings.LEEK_API_BLOB_STORE_URL)
+    _blob_store_initialized = True
+    if _blob_store is not None:
+        logger.info(f"Large payloads are offloaded to {settings.LEEK_API_BLOB_STORE_URL}")
+
+
+def get_blob_store():
+    """
+    Blob store configured by LEEK_API_BLOB_STORE_URL, None if not configured
+    """
+    if not _blob_store_initialized:
+        init_blob_store()
+    return _blob_store
+
+
+def digest_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def apply_payload_policy(index_alias: str, policy: Optional[Dict], docs: List[Dict]):
+    """
+    Bound the size of the args, kwargs and result of the task documents, in place, before indexing.
+    Per field rules of the application payload policy apply to values longer than `max_length` characters:
+        {"result": {"mode": "offload", "max_length": 4096}, "kwargs": {"mode": "hash", "max_length": 1024}}
+    - keep: indexed as is
+    - truncate: only the first max_length characters are indexed
+    - hash: the value is not indexed
+    - offload: truncated, the full value is written to the blob store and served by /v1/search/blobs/<digest>
+    Unless kept, `<field>_ref` records the mode, the digest and the size (bytes) of the full value. Offloading
+    falls back to truncating if the blob store is not configured or not reachable. Hashed or offloaded args and
+    kwargs are not indexed through their derived fields either (args_0..args_9, kwargs_flattened).
+    """
+    if not policy:
+        return
+    try:
+        store = get_blob_store()
+    except Exception as e:
+        logger.warning(f"Blob store unavailable, large payloads are truncated: {e}")
+        store = None
+    for doc in docs:
+        if not isinstance(doc, dict) or doc.get("kind") != "task":
+            continue
+        for name, rule in policy.items():
+            value = doc.get(name)
+            mode, max_length = rule["mode"], rule["max_length"]
+            if mode == KEEP or not isinstance(value, str) or len(value) <= max_length:
+                continue
+            data = value.encode("utf-8", "surrogatepass")
+            digest = digest_of(data)
+            if mode in (HASH, OFFLOAD):
+                for derived in DERIVED_FIELDS.get(name, ()):
+                    doc.pop(derived, None)
+            if mode == OFFLOAD and store is None:
+                mode = TRUNCATE
+            elif mode == OFFLOAD:
+                try:
+                    store.put(index_alias, digest, data)
+                except Exception as e:
+                    logger.warning(f"Failed to offload {name} of task {doc.get('uuid')}, truncating it: {e}")
+                    mode = TRUNCATE
+            if mode == HASH:
+                del doc[name]
+            else:
+                doc[name] = value[:max_length]
+            doc[f"{name}_ref"] = {"mode": mode, "digest": digest, "size": len(data)}
@@ -1,5 +1,6 @@
 import os
 import uuid
+import tempfile
 
 
 def get_list(env_name):
@@ -30,6 +31,22 @@ LEEK_WEB_URL = os.environ["LEEK_WEB_URL"]
 LEEK_AGENT_API_SECRET = os.environ.get("LEEK_AGENT_API_SECRET", str(uuid.uuid4()))
 LEEK_ENABLE_AGENT = get_bool("LEEK_ENABLE_AGENT")
 
+# Ingest
+# Upper bound of agents request bodies once decompressed, protects workers from decompression bombs
+LEEK_API_MAX_PAYLOAD_SIZE_IN_MB = int(os.environ.get("LEEK_API_MAX_PAYLOAD_SIZE_IN_MB", 100))
+# Agents are asked to slow down (429) once the moving average of the bulk indexing latency exceeds the threshold,
+# 0 to disable. Retry-After tells agents how long to wait before sending again.
+LEEK_API_OVERLOAD_BULK_LATENCY_IN_SECONDS = float(os.environ.get("LEEK_API_OVERLOAD_BULK_LATENCY_IN_SECONDS", 10))
+LEEK_API_OVERLOAD_RETRY_AFTER_IN_SECONDS = int(os.environ.get("LEEK_API_OVERLOAD_RETRY_AFTER_IN_SECONDS", 5))
+# Where the large args/kwargs/result offloaded by the applications payload policy are stored,
+# file:///path (shared by the API workers) or s3://bucket/prefix, offloading truncates the values if not set
+LEEK_API_BLOB_STORE_URL = os.environ.get("LEEK_API_BLOB_STORE_URL", "")
+# Applications metadata (app key, triggers, policies) is cached by each API worker for up to this delay, 0 to disable.
+# Changes made through the API are seen right away by the workers sharing the invalidation directory (same host),
+# the TTL bounds the staleness across hosts.
+LEEK_API_APP_CACHE_TTL_IN_SECONDS = float(os.environ.get("LEEK_API_APP_CACHE_TTL_IN_SECONDS", 30))
+LEEK_API_APP_CACHE_DIR = os.environ.get("LEEK_API_APP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "leek-apps"))
+
 # Control
 LEEK_CONTROL_EXCHANGE_NAME = os.environ.get("LEEK_CONTROL_EXCHANGE_NAME", "celery")
 
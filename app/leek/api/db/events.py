@@ -1,6 +1,6 @@
 import logging
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from elasticsearch import exceptions as es_exceptions
 from elasticsearch.helpers import streaming_bulk, errors as bulk_errors
@@ -16,6 +16,44 @@ from leek.api.ext import es
 logger = logging.getLogger(__name__)
 
 
+class BulkLatencyMonitor:
+    """
+    Track a moving average of the bulk indexing latency (per API worker) and tell agents to slow down when the
+    search backend struggles. Once overloaded, requests are refused for the retry delay without hitting the
+    search backend, then let through again so that the average keeps tracking the backend recovery.
+    """
+    SMOOTHING = 0.2
+
+    def __init__(self):
+        self.average_latency = None
+        self.overloaded_until = 0
+
+    def observe(self, latency: float):
+        if self.average_latency is None:
+            self.average_latency = latency
+        else:
+            self.average_latency += (latency - self.average_latency) * self.SMOOTHING
+        threshold = settings.LEEK_API_OVERLOAD_BULK_LATENCY_IN_SECONDS
+        if threshold and self.average_latency > threshold:
+            logger.warning(f"Bulk latency {self.average_latency:.2f}s exceeds {threshold}s, throttling agents")
+            self.overload()
+
+    def overload(self):
+        self.overloaded_until = time.time() + settings.LEEK_API_OVERLOAD_RETRY_AFTER_IN_SECONDS
+
+    def retry_after(self) -> Optional[int]:
+        """
+        Seconds agents should wait before sending again, None if not overloaded
+        """
+        remaining = self.overloaded_until - time.time()
+        if remaining <= 0:
+            return None
+        return max(1, int(remaining + 0.5))
+
+
+bulk_latency = BulkLatencyMonitor()
+
+
 def build_actions(events: List[Dict]):
     actions = []
     for doc in events:
@@ -61,6 +99,7 @@ def merge_events(index_alias, events: List[Dict]):
                     updated.append(item["update"]["get"]["_source"])
                     success += 1
             index_spent = time.time() - index_start_time
+            bulk_latency.observe(index_spent)
             logger.debug(f"--- Indexed {payload_length} in {index_spent} seconds, "
                          f"Index latency: {(index_spent / payload_length) * 1000}ms ---")
         # Temporary fix for malformed events
@@ -81,6 +120,11 @@ def merge_events(index_alias, events: List[Dict]):
         logger.error(e.info)
         return f"Request error", 409
     except bulk_errors.BulkIndexError as e:
+        if len(e.errors) and all(error.get("update", {}).get("status") == 429 for error in e.errors):
+            # Documents rejected by the search backend (es_rejected_execution_exception)
+            logger.warning(f"Search backend rejected {len(e.errors)} documents")
+            bulk_latency.overload()
+            return responses.search_backend_overloaded
         ignorable_errors = ["max_bytes_length_exceeded_exception"]
         for error in e.errors:
             try:
@@ -92,3 +136,10 @@ def merge_events(index_alias, events: List[Dict]):
                 pass
         logger.error(e.errors)
         return f"Bulk update error", 409
+    except es_exceptions.TransportError as e:
+        if e.status_code != 429:
+            raise
+        # Bulk request rejected by the search backend (thread pool queue full, circuit breaker...)
+        logger.warning(f"Search backend rejected the bulk request: {e.error}")
+        bulk_latency.overload()
+        return responses.search_backend_overloaded
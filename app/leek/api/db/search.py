@@ -24,6 +24,68 @@ def search_index(index_alias, query, params, summary=False):
         return responses.application_not_found
 
 
+def get_top_errors(index_alias, app_env, size=10, after=None, before=None):
+    """
+    Most frequent task errors, grouped by the error fingerprint computed by the agent
+    :param after: only the errors since this timestamp (epoch ms)
+    :param before: only the errors until this timestamp (epoch ms)
+    """
+    connection = es.connection
+    filters = [{"match": {"kind": "task"}}, {"exists": {"field": "error.fingerprint"}}]
+    if app_env:
+        filters.append({"match": {"app_env": app_env}})
+    if after is not None or before is not None:
+        time_range = {}
+        if after is not None:
+            time_range["gte"] = after
+        if before is not None:
+            time_range["lte"] = before
+        filters.append({"range": {"timestamp": time_range}})
+    body = {
+        "query": {"bool": {"filter": filters}},
+        "aggs": {
+            "fingerprints": {
+                "terms": {"field": "error.fingerprint", "size": size},
+                "aggs": {
+                    "first_seen": {"min": {"field": "timestamp"}},
+                    "last_seen": {"max": {"field": "timestamp"}},
+                    "states": {"terms": {"field": "state"}},
+                    "tasks": {"terms": {"field": "name", "size": 5}},
+                    "latest": {
+                        "top_hits": {
+                            "size": 1,
+                            "sort": [{"timestamp": {"order": "desc"}}],
+                            "_source": ["uuid", "error.type", "error.message"],
+                        }
+                    },
+                },
+            }
+        },
+    }
+    try:
+        d = connection.search(index=index_alias, body=body, size=0)
+    except es_exceptions.ConnectionError as e:
+        logger.warning(e.info)
+        return responses.search_backend_unavailable
+    except es_exceptions.NotFoundError:
+        return responses.application_not_found
+    errors = []
+    for bucket in d["aggregations"]["fingerprints"]["buckets"]:
+        latest = bucket["latest"]["hits"]["hits"][0]["_source"]
+        errors.append({
+            "fingerprint": bucket["key"],
+            "count": bucket["doc_count"],
+            "type": latest.get("error", {}).get("type"),
+            "message": latest.get("error", {}).get("message"),
+            "latest_uuid": latest.get("uuid"),
+            "first_seen": bucket["first_seen"]["value"],
+            "last_seen": bucket["last_seen"]["value"],
+            "states": {state["key"]: state["doc_count"] for state in bucket["states"]["buckets"]},
+            "tasks": [{"name": task["key"], "count": task["doc_count"]} for task in bucket["tasks"]["buckets"]],
+        })
+    return {"errors": errors}, 200
+
+
 def get_task_by_uuid(index_alias, task_uuid):
     connection = es.connection
     return connection.get(index=index_alias, id=task_uuid)
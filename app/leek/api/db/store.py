@@ -1,4 +1,4 @@
-from typing import List, Union, Optional
+from typing import Dict, List, Union, Optional
 from dataclasses import dataclass, field
 
 QUEUED = "QUEUED"
@@ -45,7 +45,7 @@ class TaskStateFields:
     # -- Shared between states
     QUEUED_RECEIVED = ("name", "name_parts", "args", "kwargs", "root_id", "parent_id", "eta", "expires", "retries",
                        "args_0", "args_1", "args_2", "args_3", "args_4", "args_5", "args_6", "args_7", "args_8",
-                       "args_9", "kwargs_flattened")
+                       "args_9", "kwargs_flattened", "args_ref", "kwargs_ref")
     FAILED_RETRY = ("exception", "traceback", "lang", "error", "stack", "trace")
     # -- Safe
     NOT_QUEUED = ("worker",)
@@ -54,7 +54,7 @@ class TaskStateFields:
     STARTED = ("started_at",)
     RETRY = ("retried_at",)
     # TERMINAL STATES
-    SUCCEEDED = ("succeeded_at", "result", "runtime",)
+    SUCCEEDED = ("succeeded_at", "result", "result_ref", "runtime",)
     FAILED = ("failed_at",)
     REJECTED = ("rejected_at", "requeue",)
     REVOKED = ("revoked_at", "terminated", "expired", "signum")
@@ -128,6 +128,10 @@ class Task(EV):
     # OUTPUT
     result: Optional[str] = None
     runtime: Optional[float] = None
+    # PAYLOAD POLICY (truncated, hashed or offloaded values)
+    args_ref: Optional[dict] = None
+    kwargs_ref: Optional[dict] = None
+    result_ref: Optional[dict] = None
     # DEPENDENCIES
     root_id: Optional[str] = None
     parent_id: Optional[str] = None
@@ -196,3 +200,7 @@ class Application:
     owner: str
     admins: Optional[List[ApplicationAdmin]]
     fo_triggers: List[FanoutTrigger] = field(default_factory=lambda: [])
+    # Applied by the agents, see /v1/applications/kwargs-policy
+    kwargs_policy: Optional[Dict] = None
+    # Applied to the coming events, see leek.api.blobs
+    payload_policy: Optional[Dict] = None
@@ -1,6 +1,8 @@
+import os
 import logging
 from datetime import timedelta
 import time
+from typing import Callable, Dict, Tuple
 
 from elasticsearch import exceptions as es_exceptions
 from elasticsearch import client as es_client
@@ -12,6 +14,7 @@ from leek.api.db.version import validate_supported_backend
 from leek.api.ext import es
 from leek.api.errors import responses
 from leek.api.db.properties import get_properties
+from leek.api.db.store import Application, FanoutTrigger
 
 logger = logging.getLogger(__name__)
 
@@ -144,6 +147,75 @@ def get_app(index_alias):
     return get_template(index_alias)["template"]["mappings"]["_meta"]
 
 
+class ApplicationCache:
+    """
+    Per worker cache of the applications, agents requests (several per second and per agent) would otherwise each
+    fetch the index template from the search backend master.
+
+    Entries expire after `ttl` seconds. Changes made through the API invalidate the entry of every worker of the
+    host: each application has a version file in `directory`, grown by one byte on every change, and an entry is
+    only served while the file size is the one seen when the entry was loaded.
+    """
+
+    def __init__(self, ttl: float, directory: str):
+        self.ttl = ttl
+        self.directory = directory
+        self.entries: Dict[str, Tuple[float, int, object]] = {}
+
+    def version(self, index_alias) -> int:
+        try:
+            return os.stat(os.path.join(self.directory, index_alias)).st_size
+        except OSError:
+            return 0
+
+    def get(self, index_alias, load: Callable[[str], object]):
+        if self.ttl <= 0:
+            return load(index_alias)
+        # Read the version before loading, a change made while loading expires the entry
+        version = self.version(index_alias)
+        entry = self.entries.get(index_alias)
+        if entry is not None and entry[0] > time.monotonic() and entry[1] == version:
+            return entry[2]
+        value = load(index_alias)
+        self.entries[index_alias] = (time.monotonic() + self.ttl, version, value)
+        return value
+
+    def invalidate(self, index_alias):
+        self.entries.pop(index_alias, None)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, index_alias), "ab") as f:
+                f.write(b".")
+        except OSError as e:
+            logger.warning(f"Failed to invalidate application {index_alias} for other workers: {e}")
+
+
+app_cache = ApplicationCache(settings.LEEK_API_APP_CACHE_TTL_IN_SECONDS, settings.LEEK_API_APP_CACHE_DIR)
+
+
+def build_application(index_alias) -> Application:
+    app = get_app(index_alias)
+    fo_triggers = app.pop("fo_triggers")
+    admins = app.pop("admins") if app.get("admins") else []
+    return Application(
+        **app,
+        fo_triggers=[FanoutTrigger(**t) for t in fo_triggers],
+        admins=admins
+    )
+
+
+def get_application(index_alias) -> Application:
+    """
+    Cached application, shared by the requests of the worker: must not be mutated
+    """
+    return app_cache.get(index_alias, build_application)
+
+
+def put_app_template(index_alias, template):
+    es.connection.indices.put_index_template(name=index_alias, body=template)
+    app_cache.invalidate(index_alias)
+
+
 def add_or_update_app_fo_trigger(index_alias, trigger):
     """
     Update application metadata stored in index template
@@ -162,7 +234,7 @@ def add_or_update_app_fo_trigger(index_alias, trigger):
         else:
             triggers[trigger_index] = trigger
 
-        es.connection.indices.put_index_template(name=index_alias, body=template)
+        put_app_template(index_alias, template)
         return app, 200
     except es_exceptions.ConnectionError:
         return responses.search_backend_unavailable
@@ -186,7 +258,30 @@ def delete_app_fo_trigger(index_alias, trigger_id):
         if isinstance(trigger_index, int):
             del triggers[trigger_index]
 
-        es.connection.indices.put_index_template(name=index_alias, body=template)
+        put_app_template(index_alias, template)
+        return app, 200
+    except es_exceptions.ConnectionError:
+        return responses.search_backend_unavailable
+    except es_exceptions.NotFoundError:
+        return responses.application_not_found
+
+
+def set_app_setting(index_alias, name, value):
+    """
+    Set (or remove if None) an application setting stored with the application metadata, e.g. kwargs_policy
+    :param index_alias: index alias in the form of orgName-appName
+    :param name: setting name
+    :param value: setting value
+    """
+    try:
+        template = get_template(index_alias)
+        app = template["template"]["mappings"]["_meta"]
+        if value is None:
+            app.pop(name, None)
+        else:
+            app[name] = value
+
+        put_app_template(index_alias, template)
         return app, 200
     except es_exceptions.ConnectionError:
         return responses.search_backend_unavailable
@@ -203,6 +298,7 @@ def delete_application(index_alias):
     connection = es.connection
     try:
         connection.indices.delete_index_template(index_alias)
+        app_cache.invalidate(index_alias)
         connection.indices.delete(f"{index_alias}*")
         safe_delete_transform(
             transform_id=f"summary-{index_alias}-transform",
@@ -355,7 +451,7 @@ def grant_application_admin(index_alias, admin_email):
         admins = app.get("admins", [])
         admins.append({"email": admin_email, "since": int(time.time()) * 1000})
         template["template"]["mappings"]["_meta"]["admins"] = uniq_admins(admins)
-        es.connection.indices.put_index_template(name=index_alias, body=template)
+        put_app_template(index_alias, template)
         return app, 200
     except es_exceptions.ConnectionError:
         return responses.search_backend_unavailable
@@ -376,7 +472,7 @@ def revoke_application_admin(index_alias, admin_email):
         admins = app.get("admins", [])
         admins = filter(lambda admin: admin["email"] != admin_email, admins)
         template["template"]["mappings"]["_meta"]["admins"] = list(admins)
-        es.connection.indices.put_index_template(name=index_alias, body=template)
+        put_app_template(index_alias, template)
         return app, 200
     except es_exceptions.ConnectionError:
         return responses.search_backend_unavailable
@@ -5,9 +5,8 @@ from elasticsearch import exceptions as es_exceptions
 from flask import g, request
 from jose import JWTError
 
-from leek.api.db.store import Application, FanoutTrigger
 from leek.api.errors import responses
-from leek.api.db.template import get_app
+from leek.api.db.template import get_app, get_application
 from leek.api.conf import settings
 from leek.api.auth import decode_jwt_token
 
@@ -115,15 +114,7 @@ def get_app_context(_route=None):
             # Get app
             try:
                 # Get/Build application
-                app = get_app(f"{org_name}-{app_name}")
-                fo_triggers = app.pop("fo_triggers")
-                admins = app.pop("admins") if app.get("admins") else []
-                triggers = [FanoutTrigger(**t) for t in fo_triggers]
-                application = Application(
-                    **app,
-                    fo_triggers=triggers,
-                    admins=admins
-                )
+                application = get_application(f"{org_name}-{app_name}")
                 # Authenticate
                 if app_key not in [application.app_key, settings.LEEK_AGENT_API_SECRET]:
                     return responses.wrong_application_app_key
@@ -63,6 +63,14 @@ subscription_not_found = {
                              }
                          }, 404
 
+blob_not_found = {
+                     "error": {
+                         "code": "404004",
+                         "message": "Value not found",
+                         "reason": "The value was not offloaded, or the blob store is not configured"
+                     }
+                 }, 404
+
 wrong_application_app_key = {
                                 "error": {
                                     "code": "401001",
@@ -134,6 +142,14 @@ ineligible_admin = {
                         }
                     }, 400
 
+malformed_payload = {
+                        "error": {
+                            "code": "400009",
+                            "message": "Malformed payload",
+                            "reason": "Request body could not be decoded"
+                        }
+                    }, 400
+
 wrong_access_refused = {
                            "error": {
                                "code": "401004",
@@ -165,3 +181,27 @@ task_revoke_state_precondition_failed = {
                                                 "reason": "Only tasks not in terminal state can be revoke"
                                             }
                                         }, 412
+
+payload_too_large = {
+                        "error": {
+                            "code": "413001",
+                            "message": "Payload too large",
+                            "reason": "Decompressed request body exceeds LEEK_API_MAX_PAYLOAD_SIZE_IN_MB"
+                        }
+                    }, 413
+
+unsupported_content_encoding = {
+                                   "error": {
+                                       "code": "415001",
+                                       "message": "Unsupported content encoding",
+                                       "reason": "Request body encoding is not supported, check Accept-Encoding"
+                                   }
+                               }, 415
+
+search_backend_overloaded = {
+                                "error": {
+                                    "code": "429001",
+                                    "message": "Too many requests",
+                                    "reason": "Search backend overloaded, retry after the delay given by Retry-After"
+                                }
+                            }, 429
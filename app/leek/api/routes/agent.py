@@ -61,18 +61,17 @@ class AgentControl(Resource):
     )
     def post(self):
         """
-        Start/Restart agent
+        Start agent, a running agent reloads the subscriptions by itself
         """
         # Check if there are subscriptions
         with open(SUBSCRIPTIONS_FILE) as s:
             subscriptions = json.load(s)
         if not len(subscriptions):
             return responses.no_subscriptions_found
-        # -- Start or Restart
+        # -- Start if not running, subscriptions changes are hot reloaded by the running agent
         agent = self.server.supervisor.getProcessInfo("agent")
-        if agent["statename"] == "RUNNING":
-            self.server.supervisor.stopProcess("agent")
-        self.server.supervisor.startProcess("agent")
+        if agent["statename"] != "RUNNING":
+            self.server.supervisor.startProcess("agent")
         return self.get_agent_info()
 
     @auth(allowed_org_names=[settings.LEEK_API_OWNER_ORG])
@@ -115,6 +114,8 @@ class AgentSubscriptionsList(Resource):
         subscription = SubscriptionSchema.validate(data)
         if subscription["batch_max_number_of_messages"] > subscription["prefetch_count"]:
             raise SchemaError("Batch max number of messages should be <= prefetch count!")
+        if subscription["batch_max_size_in_mb"] > subscription["memory_budget_in_mb"]:
+            raise SchemaError("Batch max size in mb should be <= memory budget in mb!")
         subscription.update({
             "org_name": g.org_name,
             "app_name": g.app_name,
@@ -138,11 +139,10 @@ class AgentSubscriptionsList(Resource):
             return responses.broker_not_reachable
 
         # Add subscription
-        with open(SUBSCRIPTIONS_FILE, "r+") as subscriptions_file:
+        with open(SUBSCRIPTIONS_FILE) as subscriptions_file:
             subscriptions = json.load(subscriptions_file)
-            subscriptions.append(subscription)
-            subscriptions_file.seek(0)
-            json.dump(subscriptions, subscriptions_file)
+        subscriptions.append(subscription)
+        utils.write_subscriptions(subscriptions)
 
         return {"name": utils.infer_subscription_name(subscription), **subscription}, 200
 
@@ -164,8 +164,6 @@ class AgentSubscription(Resource):
         """
         app_name, app_env = utils.infer_subscription_tags(subscription_name)
         deleted, subscriptions = utils.delete_subscription(app_name, app_env)
-
-        with open(SUBSCRIPTIONS_FILE, 'w') as f:
-            json.dump(subscriptions, f, indent=4, sort_keys=False)
+        utils.write_subscriptions(subscriptions)
 
         return {"Deleted": deleted}, 200
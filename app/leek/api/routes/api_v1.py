@@ -1,7 +1,8 @@
-from flask import Blueprint
+from flask import Blueprint, make_response
 from flask_restx import Api
 
 from leek.api.errors.errors_handler import handle_errors
+from leek.api.utils import json_dumps
 
 api_v1_blueprint = Blueprint('api', __name__, url_prefix=f'/v1')
 
@@ -12,4 +13,15 @@ api_v1 = Api(api_v1_blueprint,
              doc='/docs')
 
 
+@api_v1.representation("application/json")
+def output_json(data, code, headers=None):
+    """
+    Encode responses with orjson instead of flask-restx stdlib encoder, search responses can be large
+    """
+    response = make_response(json_dumps(data), code)
+    response.headers.extend(headers or {})
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
 handle_errors(api_v1)
@@ -10,7 +10,8 @@ from schema import SchemaError
 from leek.api.decorators import auth
 from leek.api.errors import responses
 from leek.api.utils import generate_app_key, init_trigger
-from leek.api.schemas.application import ApplicationSchema, TriggerSchema
+from leek.api.schemas.application import ApplicationSchema, TriggerSchema, KwargsPolicySchema, \
+    PayloadPolicySchema
 from leek.api.db import template as apps
 from leek.api.conf import settings
 from leek.api.routes.api_v1 import api_v1
@@ -189,6 +190,62 @@ class UpdateFanoutTriggers(Resource):
         )
 
 
+@applications_ns.route('/kwargs-policy')
+class ApplicationKwargsPolicy(Resource):
+
+    @auth(only_app_owner=True)
+    def put(self):
+        """
+        Set the budget of the flattened kwargs, agents pick it up on (re)connection
+        """
+        data = request.get_json()
+        policy = KwargsPolicySchema.validate(data)
+        return apps.set_app_setting(
+            index_alias=g.index_alias,
+            name="kwargs_policy",
+            value=policy
+        )
+
+    @auth(only_app_owner=True)
+    def delete(self):
+        """
+        Remove the budget of the flattened kwargs
+        """
+        return apps.set_app_setting(
+            index_alias=g.index_alias,
+            name="kwargs_policy",
+            value=None
+        )
+
+
+@applications_ns.route('/payload-policy')
+class ApplicationPayloadPolicy(Resource):
+
+    @auth(only_app_owner=True)
+    def put(self):
+        """
+        Set the size policy of the args, kwargs and result of the tasks, applied to the coming events
+        """
+        data = request.get_json()
+        policy = PayloadPolicySchema.validate(data)
+        return apps.set_app_setting(
+            index_alias=g.index_alias,
+            name="payload_policy",
+            value=policy
+        )
+
+    @auth(only_app_owner=True)
+    def delete(self):
+        """
+        Remove the size policy of the args, kwargs and result of the tasks
+        """
+        return apps.set_app_setting(
+            index_alias=g.index_alias,
+            name="payload_policy",
+            value=None
+        )
+
+
 @applications_ns.route('/admins/<string:admin_email>')
 class UpdateApplicationAdmins(Resource):
 
@@ -5,13 +5,16 @@ from flask import Blueprint, request, g
 from flask_restx import Resource
 from elasticsearch import exceptions as es_exceptions
 
+from leek.api.blobs import apply_payload_policy
 from leek.api.conf import settings
 from leek.api.decorators import get_app_context
-from leek.api.db.events import merge_events
+from leek.api.db.events import bulk_latency, merge_events
 from leek.api.errors import responses
 from leek.api.routes.api_v1 import api_v1
 from leek.api.db.template import get_app
 from leek.api.db import template as apps
+from leek.api.utils import ACCEPTED_ENCODINGS, PayloadTooLarge, UnsupportedContentEncoding, decompress_body, \
+    json_loads
 
 events_bp = Blueprint('events', __name__, url_prefix='/v1/events')
 events_ns = api_v1.namespace('events', 'Agents events handler')
@@ -27,11 +30,30 @@ class ProcessEvents(Resource):
         """
         Process agent events
         """
-        payload = request.get_json()
+        retry_after = bulk_latency.retry_after()
+        if retry_after is not None:
+            return (*responses.search_backend_overloaded, {"Retry-After": str(retry_after)})
+        try:
+            body = decompress_body(
+                request.get_data(cache=False),
+                request.headers.get("Content-Encoding"),
+                settings.LEEK_API_MAX_PAYLOAD_SIZE_IN_MB * 1024 * 1024,
+            )
+            payload = json_loads(body)
+        except UnsupportedContentEncoding:
+            return (*responses.unsupported_content_encoding, self.get_encoding_headers())
+        except PayloadTooLarge:
+            return responses.payload_too_large
+        except ValueError as e:
+            logger.warning(f"Failed to decode payload: {e}")
+            return responses.malformed_payload
         if not len(payload):
             logger.warning("Empty payload, nothing to be processed!")
             return {"success": 0}, 201
+        apply_payload_policy(g.context["index_alias"], g.context["app"].payload_policy, payload)
         result, status = merge_events(g.context["index_alias"], payload)
+        if status == 429:
+            return result, status, {"Retry-After": str(bulk_latency.retry_after() or 1)}
         return result, status
 
     def get(self):
@@ -74,10 +96,19 @@ class ProcessEvents(Resource):
                 )
                 if status_code == 201:
                     logger.info("leek app auto-created successfully.")
-                    return "Ready!", 200
+                    return self.ready(app)
             else:
                 return responses.application_not_found
         except es_exceptions.ConnectionError:
             return responses.search_backend_unavailable
 
-        return "Ready!", 200
+        return self.ready(app)
+
+    def ready(self, app):
+        # Agent side settings of the application, applied by the agent before sending events
+        return {"ready": True, "kwargs_policy": app.get("kwargs_policy")}, 200, self.get_encoding_headers()
+
+    @staticmethod
+    def get_encoding_headers():
+        # Advertise accepted request body encodings, agents use it to negotiate compression (RFC 7694)
+        return {"Accept-Encoding": ", ".join(ACCEPTED_ENCODINGS)}
@@ -1,11 +1,14 @@
 import logging
+import re
 
 from flask import Blueprint, request, g
 from flask_restx import Resource
 
+from leek.api.blobs import get_blob_store
 from leek.api.decorators import auth
-from leek.api.schemas.search_params import SearchParamsSchema
-from leek.api.db.search import search_index
+from leek.api.errors import responses
+from leek.api.schemas.search_params import SearchParamsSchema, TopErrorsParamsSchema
+from leek.api.db.search import search_index, get_top_errors
 from leek.api.db.workflow import get_celery_workflow_tree
 from leek.api.routes.api_v1 import api_v1
 
@@ -14,6 +17,9 @@ search_ns = api_v1.namespace('search', 'Search index.')
 
 logger = logging.getLogger(__name__)
 
+# sha256 of the offloaded values, see leek.api.blobs
+DIGEST = re.compile("[0-9a-f]{64}")
+
 
 @search_ns.route('/')
 class Search(Resource):
@@ -41,6 +47,18 @@ class SearchSummary(Resource):
         return search_index(g.index_alias, query, params, summary=True)
 
 
+@search_ns.route('/errors')
+class TopErrors(Resource):
+
+    @auth
+    def get(self):
+        """
+        Most frequent task errors, grouped by fingerprint
+        """
+        params = TopErrorsParamsSchema.validate(request.args.to_dict())
+        return get_top_errors(g.index_alias, g.app_env, **params)
+
+
 @search_ns.route('/workflow')
 class CeleryWorkflow(Resource):
 
@@ -51,3 +69,18 @@ class CeleryWorkflow(Resource):
         """
         params = request.args.to_dict()
         return get_celery_workflow_tree(g.index_alias, g.app_env, params["root_id"])
+
+
+@search_ns.route('/blobs/<string:digest>')
+class Blob(Resource):
+
+    @auth
+    def get(self, digest):
+        """
+        Get the full value of an offloaded task args, kwargs or result
+        """
+        store = get_blob_store()
+        data = store.get(g.index_alias, digest) if store is not None and DIGEST.fullmatch(digest) else None
+        if data is None:
+            return responses.blob_not_found
+        return {"digest": digest, "value": data.decode("utf-8", "surrogatepass")}, 200
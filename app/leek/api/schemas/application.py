@@ -12,6 +12,25 @@ TriggerSchema = Schema({
     "slack_wh_url": And(str, len),
 })
 
+KwargsPolicySchema = Schema({
+    Optional("max_keys", default=None): Or(None, And(int, lambda n: 1 <= n <= 10000)),
+    Optional("allow", default=[]): [And(str, len)],
+    Optional("deny", default=[]): [And(str, len)],
+    Optional("collapse_lists_above", default=None): Or(None, And(int, lambda n: 0 <= n <= 10000)),
+    Optional("collapse_mode", default="json"): Or("json", "join"),
+})
+
+PayloadFieldPolicySchema = Schema({
+    "mode": Or("keep", "truncate", "hash", "offload"),
+    Optional("max_length", default=4096): And(int, lambda n: 0 <= n <= 1000000),
+})
+
+PayloadPolicySchema = Schema({
+    Optional("args"): PayloadFieldPolicySchema,
+    Optional("kwargs"): PayloadFieldPolicySchema,
+    Optional("result"): PayloadFieldPolicySchema,
+})
+
 ApplicationSchema = Schema(
     {
         "app_name": And(str, lambda e: e.isalpha() and e.islower()),
@@ -6,3 +6,12 @@ SearchParamsSchema = Schema(
         Optional("from_", default=0): And(Use(int), lambda n: 0 <= n <= 100000),
     }
 )
+
+TopErrorsParamsSchema = Schema(
+    {
+        Optional("size", default=10): And(Use(int), lambda n: 1 <= n <= 100),
+        # Time window, epoch milliseconds
+        Optional("after"): And(Use(int), lambda n: n >= 0),
+        Optional("before"): And(Use(int), lambda n: n >= 0),
+    }
+)
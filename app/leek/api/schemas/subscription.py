@@ -1,4 +1,23 @@
-from schema import Schema, And, Optional, Use
+from schema import Schema, And, Optional, Or, Use
+
+from leek.agent.rules import CompiledRule
+
+EVENT_STATES = ["QUEUED", "RECEIVED", "STARTED", "SUCCEEDED", "FAILED", "REJECTED", "REVOKED", "RETRY",
+                "ONLINE", "HEARTBEAT", "OFFLINE"]
+
+
+def compiles(rule):
+    # Same validation as the agent, that compiles the rules when building the consumers
+    CompiledRule.compile(rule)
+    return True
+
+
+EventRuleSchema = Schema(And({
+    Optional("names"): Or(And(str, len), [And(str, len)]),
+    Optional("states"): [And(str, lambda s: s in EVENT_STATES)],
+    Optional("types"): [And(str, len)],
+    "keep": And(Use(float), lambda n: 0 <= n <= 1),
+}, compiles))
 
 SubscriptionSchema = Schema({
     "broker": And(str, len),
@@ -11,8 +30,31 @@ SubscriptionSchema = Schema({
     Optional("routing_key", default="#"): And(str, len),
     Optional("prefetch_count", default=1000): And(Use(int), lambda n: 1000 <= n <= 10000),
     Optional("concurrency_pool_size", default=1): And(Use(int), lambda n: 1 <= n <= 20),
+    Optional("shards", default=1): And(Use(int), lambda n: 1 <= n <= 32),
+    # Low volume subscriptions can share an agent process with other subscriptions
+    Optional("dedicated_process", default=True): And(bool),
     # -- Batch
     Optional("batch_max_size_in_mb", default=1): And(Use(int), lambda n: 1 <= n <= 10),
     Optional("batch_max_number_of_messages", default=1000): And(Use(int), lambda n: 1000 <= n <= 10000),
     Optional("batch_max_window_in_seconds", default=5): And(Use(int), lambda n: 5 <= n <= 20),
+    Optional("coalescing_window_in_seconds", default=0): And(Use(float), lambda n: 0 <= n <= 10),
+    Optional("coalescing_max_held_tasks", default=10000): And(Use(int), lambda n: 100 <= n <= 100000),
+    # -- Filtering
+    Optional("event_rules", default=[]): [EventRuleSchema],
+    # -- Heartbeats
+    Optional("heartbeat_interval_in_seconds", default=0): And(Use(float), lambda n: 0 <= n <= 3600),
+    Optional("heartbeat_active_delta", default=5): And(Use(int), lambda n: n >= 1),
+    Optional("heartbeat_processed_delta", default=1000): And(Use(int), lambda n: n >= 1),
+    # -- Transport
+    Optional("compression", default="gzip"): And(str, lambda c: c in ["zstd", "gzip", "none"]),
+    # -- Spool
+    Optional("spool_enabled", default=False): And(bool),
+    Optional("spool_max_size_in_mb", default=1024): And(Use(int), lambda n: 16 <= n <= 102400),
+    Optional("spool_segment_max_size_in_mb", default=64): And(Use(int), lambda n: 1 <= n <= 1024),
+    Optional("spool_fsync_policy", default="segment"): And(str, lambda p: p in ["always", "segment", "never"]),
+    # -- Dead letters
+    Optional("dead_letter_enabled", default=True): And(bool),
+    Optional("dead_letter_max_size_in_mb", default=64): And(Use(int), lambda n: 1 <= n <= 1024),
+    # -- Memory
+    Optional("memory_budget_in_mb", default=256): And(Use(int), lambda n: 16 <= n <= 4096),
 })
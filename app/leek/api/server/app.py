@@ -4,6 +4,7 @@ import logging
 
 from flask import Flask
 
+from leek.api.blobs import init_blob_store
 from leek.api.extensions import init_extensions
 from leek.api.blueprints import register_blueprints
 from leek.api.conf import settings
@@ -12,6 +13,8 @@ logging.basicConfig(level=settings.LEEK_API_LOG_LEVEL)
 
 
 def create_app():
+    # Fail fast on a misconfigured blob store rather than on every ingested batch
+    init_blob_store()
     app = Flask(__name__)
     init_extensions(app)
     app.url_map.strict_slashes = False
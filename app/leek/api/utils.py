@@ -1,15 +1,48 @@
 import json
+import os
 import logging
 import random
 import string
+import zlib
 
 import requests
 
+try:
+    import orjson  # Faster JSON parser if available
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard  # Optional, agents fallback to gzip if not advertised
+except ImportError:
+    zstandard = None
+
+from leek.serialization import json_dumps  # noqa: F401, serializes the API responses
 from leek.api.db.store import FanoutTrigger
 
 logger = logging.getLogger(__name__)
 SUBSCRIPTIONS_FILE = "/opt/app/conf/subscriptions.json"
 
+# Request body encodings accepted from agents, ordered by preference
+ACCEPTED_ENCODINGS = ("zstd", "gzip", "identity") if zstandard else ("gzip", "identity")
+
+
+class UnsupportedContentEncoding(Exception):
+    pass
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+def json_loads(data: bytes):
+    """
+    Parse JSON bytes, using orjson when available
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 def generate_app_key(length=48):
     letters_and_digits = string.ascii_letters + string.digits
@@ -72,6 +105,16 @@ def lookup_subscription(app_name, app_env):
         return exist, None
 
 
+def write_subscriptions(subscriptions):
+    """
+    Replace the subscriptions file atomically, the agent watches it and must never read a partially written file
+    """
+    tmp_file = f"{SUBSCRIPTIONS_FILE}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(subscriptions, f, indent=4, sort_keys=False)
+    os.replace(tmp_file, SUBSCRIPTIONS_FILE)
+
+
 def delete_subscription(app_name, app_env):
     """
     Check if there is already a subscription with the same app name and app env and delete it
@@ -83,3 +126,56 @@ def delete_subscription(app_name, app_env):
         subscriptions = json.load(subscription_file)
     subs = list(filter(lambda s: f"{s['app_name']}-{s['app_env']}" != f"{app_name}-{app_env}", subscriptions))
     return len(subscriptions) > len(subs), subs
+
+
+def decompress_body(data: bytes, content_encoding: str, max_size: int) -> bytes:
+    """
+    Decompress an agent request body without ever inflating more than max_size bytes
+    :param data: raw request body
+    :param content_encoding: value of the Content-Encoding header
+    :param max_size: maximum size of the decompressed body in bytes
+    :return: decompressed body
+    :raises UnsupportedContentEncoding: if the encoding is not accepted
+    :raises PayloadTooLarge: if the decompressed body exceeds max_size
+    :raises ValueError: if the body is not a valid stream for the encoding
+    """
+    content_encoding = (content_encoding or "identity").strip().lower()
+    if content_encoding not in ACCEPTED_ENCODINGS:
+        raise UnsupportedContentEncoding(content_encoding)
+
+    if content_encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(data, max_size + 1)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip stream: {e}")
+        if len(body) > max_size or decompressor.unconsumed_tail:
+            raise PayloadTooLarge()
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip stream")
+    elif content_encoding == "zstd":
+        chunks, size = [], 0
+        try:
+            # Written by the agents, the frame header tells the decompressed size
+            content_size = zstandard.get_frame_parameters(data).content_size
+            if content_size != zstandard.CONTENTSIZE_UNKNOWN and content_size > max_size:
+                raise PayloadTooLarge()
+            with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                while True:
+                    chunk = reader.read(min(1024 * 1024, max_size + 1 - size))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > max_size:
+                        raise PayloadTooLarge()
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Invalid zstd stream: {e}")
+        if content_size != zstandard.CONTENTSIZE_UNKNOWN and size != content_size:
+            raise ValueError("Truncated zstd stream")
+        body = b"".join(chunks)
+    else:
+        body = data
+        if len(body) > max_size:
+            raise PayloadTooLarge()
+    return body
@@ -0,0 +1,88 @@
+"""
+JSON serialization shared by the agent and the API: orjson when available, and a stdlib json fallback producing the
+same bytes for values orjson rejects (e.g. integers above 64 bits) or when orjson is not installed.
+"""
+import json
+import json.encoder
+from enum import Enum
+from uuid import UUID
+from datetime import date, datetime, time
+from typing import Any
+
+try:
+    import orjson  # Faster JSON serializer if available
+except ImportError:
+    orjson = None
+
+
+def json_default(obj: Any) -> Any:
+    """
+    `default` of the stdlib json fallback, serializes the types orjson supports natively the way orjson does
+    """
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def json_keys(obj: Any) -> Any:
+    """
+    Copy of obj with the dict keys stdlib json rejects converted like orjson's OPT_NON_STR_KEYS does
+    """
+    if isinstance(obj, dict):
+        return {
+            key if key is None or isinstance(key, (str, int, float)) else str(json_default(key)): json_keys(value)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [json_keys(value) for value in obj]
+    return obj
+
+
+def float_str(value: float) -> str:
+    """
+    Shortest repr of a float as written by orjson: non finite values are null, exponents have no sign or leading
+    zeros, and 1e-5 magnitudes are written in full
+    """
+    if value != value or value in (float("inf"), float("-inf")):
+        return "null"
+    text = float.__repr__(value)
+    mantissa, e, exponent = text.partition("e")
+    if not e:
+        return text
+    if int(exponent) == -5:
+        return f"{'-' if value < 0 else ''}0.0000{mantissa.lstrip('-').replace('.', '')}"
+    return f"{mantissa}e{int(exponent)}"
+
+
+class FallbackEncoder(json.JSONEncoder):
+    """
+    Compact, UTF-8 (not ASCII escaped) stdlib encoder writing floats the way orjson does.
+    The C accelerated encoder does not support custom float formatting, this one is only used as a fallback.
+    """
+
+    def iterencode(self, o, _one_shot=False):
+        return json.encoder._make_iterencode(
+            {}, self.default, json.encoder.encode_basestring, None, float_str, ":", ",", False, False, False
+        )(o, 0)
+
+
+FALLBACK_ENCODER = FallbackEncoder(ensure_ascii=False, default=json_default)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """
+    Serialize to compact JSON bytes, using orjson when available.
+    Falls back to stdlib json for values orjson rejects (e.g. integers above 64 bits), with the same output.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return FALLBACK_ENCODER.encode(json_keys(obj)).encode("utf-8")
@@ -1,4 +1,7 @@
+import moment from "moment";
+
 import { getTimeFilterQuery, search, TimeFilters } from "./search";
+import { buildQueryString, request } from "./request";
 
 export interface Issue {
   filter(
@@ -6,6 +9,13 @@ export interface Issue {
     app_env: string | undefined,
     filters: TimeFilters
   ): any;
+
+  topErrors(
+    app_name: string,
+    app_env: string | undefined,
+    filters: TimeFilters,
+    size?: number
+  ): any;
 }
 
 export class IssueService implements Issue {
@@ -37,4 +47,28 @@ export class IssueService implements Issue {
       }
     );
   }
+
+  topErrors(
+    app_name: string,
+    app_env: string | undefined,
+    filters: TimeFilters,
+    size: number = 10
+  ) {
+    // Errors are grouped by fingerprint within the time window of the last task event
+    let params: any = { size: size };
+    if (filters.interval_type === "between") {
+      if (filters.from) params.after = filters.from;
+      if (filters.to) params.before = filters.to;
+    } else if (filters.interval_type === "past" && filters.offset) {
+      params.after = moment().valueOf() - filters.offset;
+    }
+    return request({
+      method: "GET",
+      path: `/v1/search/errors${buildQueryString(params)}`,
+      headers: {
+        "x-leek-app-name": app_name,
+        "x-leek-app-env": app_env,
+      },
+    });
+  }
 }
@@ -103,6 +103,7 @@ export function getFilterQuery(
     },
     filters["error.type"]?.length && { terms: { "error.type": filters["error.type"] } },
     filters["error.message"] && { term: { "error.message": filters["error.message"] } },
+    filters["error.fingerprint"] && { term: { "error.fingerprint": filters["error.fingerprint"] } },
     filters["trace.wc"] && {
       wildcard: {
         "trace.wc": { value: "*"+filters["trace.wc"]+"*", case_insensitive: true },
@@ -181,6 +182,7 @@ export interface TaskFilters {
   // Errors
   "error.type": string | null;
   "error.message": string | null;
+  "error.fingerprint": string | null;
   "trace.wc": string | null;
   // Input
   args: string | null;
@@ -211,6 +213,8 @@ export interface Task {
   )
 
   getById(app_name: string, uuid: string): any;
+
+  getBlob(app_name: string, digest: string): any;
 }
 
 export class TaskService implements Task {
@@ -256,6 +260,16 @@ export class TaskService implements Task {
       }
     );
   }
+  getBlob(app_name: string, digest: string) {
+    return request({
+      method: "GET",
+      path: `/v1/search/blobs/${digest}`,
+      headers: {
+        "x-leek-app-name": app_name,
+      },
+    });
+  }
+
 
   getCeleryTree(
       app_name: string,
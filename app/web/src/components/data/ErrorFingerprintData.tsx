@@ -0,0 +1,90 @@
+import React from "react";
+import TimeAgo from "react-timeago";
+import { Typography, Tag, Tooltip } from "antd";
+
+const Text = Typography.Text;
+
+function ErrorFingerprintData() {
+  return [
+    {
+      title: "Fingerprint",
+      dataIndex: "fingerprint",
+      key: "fingerprint",
+      render: (fingerprint) => {
+        return (
+          <Tag>
+            <Text copyable>{fingerprint}</Text>
+          </Tag>
+        );
+      },
+    },
+    {
+      title: "Error",
+      dataIndex: "type",
+      key: "type",
+      render: (type, obj) => {
+        return (
+          <Tooltip title={obj.message}>
+            <Text strong style={{ color: "rgb(156,17,45)" }}>
+              {type || "-"}
+            </Text>
+          </Tooltip>
+        );
+      },
+    },
+    {
+      title: "Tasks",
+      dataIndex: "tasks",
+      key: "tasks",
+      render: (tasks) => {
+        return tasks.map((task) => (
+          <Tag key={task.name}>
+            {task.name} ({task.count})
+          </Tag>
+        ));
+      },
+    },
+    {
+      title: "Occurrence",
+      dataIndex: "count",
+      key: "count",
+      render: (count) => {
+        return <Tag>{count}</Tag>;
+      },
+    },
+    {
+      title: "Failed",
+      dataIndex: "states",
+      key: "FAILED",
+      render: (states) => {
+        return <Tag color="red">{states.FAILED || 0}</Tag>;
+      },
+    },
+    {
+      title: "Retry",
+      dataIndex: "states",
+      key: "RETRY",
+      render: (states) => {
+        return <Tag color="orange">{states.RETRY || 0}</Tag>;
+      },
+    },
+    {
+      title: "Last seen",
+      dataIndex: "last_seen",
+      key: "last_seen",
+      render: (last_seen) => {
+        return <Text>{last_seen ? <TimeAgo date={last_seen} /> : "-"}</Text>;
+      },
+    },
+    {
+      title: "First seen",
+      dataIndex: "first_seen",
+      key: "first_seen",
+      render: (first_seen) => {
+        return <Text>{first_seen ? <TimeAgo date={first_seen} /> : "-"}</Text>;
+      },
+    },
+  ];
+}
+
+export default ErrorFingerprintData;
@@ -90,6 +90,7 @@ const fieldKinds: Record<string, FieldKind> = {
   // Errors
   "error.type": "array",
   "error.message": "string",
+  "error.fingerprint": "string",
   "trace.wc": "string",
 
   // Execution
@@ -129,6 +130,7 @@ const PANEL_FIELDS: Record<string, string[]> = {
   errors: [
     "error.type",
     "error.message",
+    "error.fingerprint",
     "trace.wc",
   ],
   execution: [
@@ -233,6 +235,7 @@ const TaskAttributesFilter: React.FC<TasksFilterContextData> = (
     // Errors
     "error.type": withDefault(ArrayParam, []),
     "error.message": StringParam,
+    "error.fingerprint": StringParam,
     "trace.wc": StringParam,
     // Execution
     "runtime_op": StringParam,
@@ -660,6 +663,11 @@ const TaskAttributesFilter: React.FC<TasksFilterContextData> = (
                 <Input placeholder="Error message" allowClear />
               </FormItem>
             </Row>
+            <Row>
+              <FormItem name="error.fingerprint" style={{ width: "100%" }}>
+                <Input placeholder="Error fingerprint" allowClear />
+              </FormItem>
+            </Row>
             <Row>
               <FormItem name="trace.wc" style={{ width: "100%" }}>
                 <Input placeholder="Stacktrace" allowClear />
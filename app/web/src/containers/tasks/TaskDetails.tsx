@@ -80,6 +80,8 @@ export default (props) => {
   const [buildingTree, setBuildingTree] = useState<boolean>();
   const [workflow, setWorkflow] = useState<any>(null);
   const [isRevokeModalVisible, setIsRevokeModalVisible] = useState(false);
+  const [blobs, setBlobs] = useState<object>({});
+  const [loadingBlob, setLoadingBlob] = useState<string>();
 
   function retry() {
     if (!currentApp) return;
@@ -189,6 +191,40 @@ export default (props) => {
   }
 
 
+  function loadBlob(field) {
+    // Full value of an offloaded args/kwargs/result, fetched on demand
+    if (!currentApp) return;
+    setLoadingBlob(field);
+    return task
+        .getBlob(currentApp, props.task[`${field}_ref`].digest)
+        .then(handleAPIResponse)
+        .then((result: any) => {
+          setBlobs((blobs) => ({...blobs, [result.digest]: result.value}));
+        }, handleAPIError)
+        .catch(handleAPIError)
+        .finally(() => setLoadingBlob(undefined));
+  }
+
+  function payloadField(field) {
+    const ref = props.task[`${field}_ref`];
+    if (!ref) return props.task[field] || "-";
+    if (blobs[ref.digest] !== undefined) return blobs[ref.digest];
+    return (
+        <>
+          {props.task[field] || "-"}
+          <br/>
+          <Text type="secondary">
+            {ref.mode === "hash" ? "Not stored" : "Truncated"}, {ref.size} bytes, sha256 {ref.digest}
+          </Text>
+          {ref.mode === "offload" && (
+              <Button type="link" size="small" loading={loadingBlob === field} onClick={() => loadBlob(field)}>
+                Load full value
+              </Button>
+          )}
+        </>
+    );
+  }
+
   function twoWeeksFromNow() {
     return Date.now() - 14 * 24 * 60 * 60 * 1000;
   }
@@ -364,18 +400,18 @@ export default (props) => {
               />
             </List.Item>
             <List.Item key="args">
-              <List.Item.Meta title="Args" description={props.task.args} />
+              <List.Item.Meta title="Args" description={payloadField("args")} />
             </List.Item>
             <List.Item key="kwargs">
               <List.Item.Meta
                 title="Keyword args"
-                description={props.task.kwargs || "-"}
+                description={payloadField("kwargs")}
               />
             </List.Item>
             <List.Item key="result">
               <List.Item.Meta
                 title="Result"
-                description={props.task.result || "-"}
+                description={payloadField("result")}
               />
             </List.Item>
           </List>
@@ -607,6 +643,12 @@ export default (props) => {
                   description={props.task.error?.message || "-"}
               />
             </List.Item>
+            <List.Item key="error_fingerprint">
+              <List.Item.Meta
+                  title="Error Fingerprint"
+                  description={props.task.error?.fingerprint || "-"}
+              />
+            </List.Item>
             <List.Item key="Stacktrace">
               <List.Item.Meta
                 style={{ width: "100%" }}
@@ -4,6 +4,7 @@ import { Card, Col, Row, Empty, Table, Button } from "antd";
 import { SyncOutlined } from "@ant-design/icons";
 
 import IssueDataColumns from "../components/data/IssueData";
+import ErrorFingerprintDataColumns from "../components/data/ErrorFingerprintData";
 import TimeFilter from "../components/filters/TaskTimeFilter";
 import { useApplication } from "../context/ApplicationProvider";
 import { IssueService } from "../api/issue";
@@ -11,9 +12,12 @@ import { handleAPIError, handleAPIResponse } from "../utils/errors";
 
 const IssuesPage = () => {
   const columns = IssueDataColumns();
+  const errorsColumns = ErrorFingerprintDataColumns();
   const service = new IssueService();
   const [loading, setLoading] = useState<boolean>();
   const [issues, setIssues] = useState<any>([]);
+  const [errorsLoading, setErrorsLoading] = useState<boolean>();
+  const [errors, setErrors] = useState<any>([]);
 
   const { currentApp, currentEnv } = useApplication();
   const [pagination, setPagination] = useState<any>({
@@ -74,6 +78,19 @@ const IssuesPage = () => {
       .finally(() => setLoading(false));
   }
 
+  function filterTopErrors() {
+    if (!currentApp) return;
+    setErrorsLoading(true);
+    service
+      .topErrors(currentApp, currentEnv, timeFilters)
+      .then(handleAPIResponse)
+      .then((result: any) => {
+        setErrors(result.errors);
+      }, handleAPIError)
+      .catch(handleAPIError)
+      .finally(() => setErrorsLoading(false));
+  }
+
   useEffect(() => {
     // Don't fire until we know time filters have hydrated from URL
     if (!timeFiltersReady) return;
@@ -83,6 +100,7 @@ const IssuesPage = () => {
   // UI Callbacks
   function refresh(pager = { current: 1, pageSize: 10 }) {
     filterIssues(pager);
+    filterTopErrors();
   }
 
   function handleShowTotal(total) {
@@ -152,6 +170,36 @@ const IssuesPage = () => {
           />
         </Card>
       </Row>
+
+      <Row justify="center" style={{ width: "100%", marginTop: 13 }}>
+        <Card
+          bodyStyle={{ paddingBottom: 0, paddingRight: 0, paddingLeft: 0 }}
+          size="small"
+          style={{ width: "100%" }}
+          title="Top errors by fingerprint"
+        >
+          <Table
+            dataSource={errors}
+            columns={errorsColumns}
+            loading={errorsLoading}
+            pagination={false}
+            size="small"
+            rowKey="fingerprint"
+            style={{ width: "100%" }}
+            scroll={{ x: "100%" }}
+            locale={{
+              emptyText: (
+                <div style={{ textAlign: "center" }}>
+                  <Empty
+                    image={Empty.PRESENTED_IMAGE_SIMPLE}
+                    description={<span>No fingerprinted errors found</span>}
+                  />
+                </div>
+              ),
+            }}
+          />
+        </Card>
+      </Row>
     </>
   );
 };
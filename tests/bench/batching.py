@@ -0,0 +1,70 @@
+"""
+CPU spent per batch between the agent and the API: JSON encoding (stdlib json against orjson), compression
+(identity, gzip, zstd) and, on the API side, decompression and JSON decoding.
+
+    python tests/bench/batching.py [--batches 100,1000,5000]
+
+Batches are validated and merged first, the body is the merged task/worker documents as posted by the agent.
+"""
+import json
+import time
+import zlib
+import argparse
+
+from events import events
+
+from leek.agent.adapters.serializer import validate_payload, to_docs
+from leek.agent.encoding import compress, GZIP, ZSTD, IDENTITY, SUPPORTED_ENCODINGS
+from leek.serialization import json_dumps
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == GZIP:
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    return data
+
+
+def measure(run, repeat=20):
+    """
+    :return: best milliseconds per run
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", default="100,1000,5000")
+    options = parser.parse_args()
+
+    for size in (int(s) for s in options.batches.split(",")):
+        rejected = []
+        docs = to_docs(validate_payload(events(size), "prod", rejected).values(), rejected)
+        body = json_dumps(docs)
+        print(f"{size} events, {len(docs)} docs, {len(body) / 1024:.0f} KB of JSON, in ms/batch")
+        print(f"    encode: json {measure(lambda: json.dumps(docs).encode()):.2f}" +
+              (f", orjson {measure(lambda: json_dumps(docs)):.2f}" if orjson else ""))
+        print(f"    decode: json {measure(lambda: json.loads(body)):.2f}" +
+              (f", orjson {measure(lambda: orjson.loads(body)):.2f}" if orjson else ""))
+        for encoding in (IDENTITY, *SUPPORTED_ENCODINGS):
+            compressed = compress(body, encoding)
+            print(f"    {encoding:<8}  {len(compressed) / 1024:>6.0f} KB ({len(compressed) / len(body):>4.0%}), "
+                  f"compress {measure(lambda: compress(body, encoding)):.2f}, "
+                  f"decompress {measure(lambda: decompress(compressed, encoding)):.2f}")
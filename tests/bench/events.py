@@ -0,0 +1,13 @@
+"""
+Deterministic celery events for the agent benchmarks, shared with the tests (see tests/conftest.py)
+"""
+import os
+import sys
+
+# Benchmarks run as scripts from anywhere: python tests/bench/<bench>.py
+TESTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if TESTS_DIR not in sys.path:
+    sys.path.insert(0, TESTS_DIR)
+
+# Also puts app/ on the path
+from conftest import TIMESTAMP, make_events as events, make_worker_heartbeat as worker_heartbeat  # noqa: E402,F401
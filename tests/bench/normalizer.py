@@ -0,0 +1,69 @@
+"""
+Event validation and normalization: the EventNormalizer fast path against the compiled JSON schema
+(fastjsonschema) it falls back to, and the whole validate_payload (normalize and merge per task/worker).
+
+    python tests/bench/normalizer.py [--events 20000]
+
+Task events, worker heartbeats, and task events carrying an integral float for an integer field: they are
+accepted, but always handed to the JSON schema by the fast path.
+"""
+import copy
+import time
+import argparse
+
+from events import events
+
+from leek.agent.adapters.normalizer import NORMALIZERS
+from leek.agent.adapters.serializer import validate_payload
+
+UPDATED_AT = 1700000000000
+
+
+def fastjsonschema_only(payload):
+    for event in payload:
+        NORMALIZERS[event["type"]].validate(event)
+
+
+def fast_path_only(payload):
+    for event in payload:
+        NORMALIZERS[event["type"]].check(event)
+
+
+def normalize(payload):
+    for event in payload:
+        NORMALIZERS[event["type"]].normalize(event, "prod", UPDATED_AT)
+
+
+def payload(batch):
+    validate_payload(batch, "prod")
+
+
+def measure(run, batch, repeat=5):
+    """
+    :return: best microseconds per event
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(batch)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(batch) * 10 ** 6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    options = parser.parse_args()
+
+    generated = events(options.events)
+    tasks = [event for event in generated if event["type"].startswith("task-")]
+    workers = [event for event in generated if event["type"].startswith("worker-")] * 50
+    fallback = [{**event, "clock": float(event["clock"])} for event in tasks]
+    print(f"{len(tasks)} task events, {len(workers)} worker events, in us/event")
+    print(f"{'':<12}{'fastjsonschema':>16}{'fast path':>12}{'normalize':>12}{'validate_payload':>18}")
+    for name, batch in (("tasks", tasks), ("workers", workers), ("fallback", fallback)):
+        # Validation might fill in defaults, keep the batches pristine
+        results = [measure(run, copy.deepcopy(batch)) for run in (fastjsonschema_only, fast_path_only, normalize)]
+        results.append(measure(payload, batch))
+        print(f"{name:<12}" + "".join(f"{r:>{w}.2f}" for r, w in zip(results, (16, 12, 12, 18))))
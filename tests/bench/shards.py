@@ -0,0 +1,79 @@
+"""
+Core scaling of the validation shards: events/s turned into a compressed, ready to post batch body, by the
+consumer process alone and by N shards (validate, merge, to_doc and JSON encoding in the shards, compression
+in the consumer process).
+
+    python tests/bench/shards.py [--events 20000] [--batch 1000] [--shards 1,2,4,8]
+
+Shard counts above the number of cores are skipped. Throughput should scale roughly linearly with the shards
+until the consumer process (partitioning, splicing and compressing) becomes the bottleneck: the ceiling is the
+throughput once the consumer process is the only one left on its core.
+"""
+import os
+import time
+import argparse
+
+from events import events
+
+from leek.agent.adapters.serializer import validate_payload, to_docs
+from leek.agent.encoding import compress, GZIP
+from leek.serialization import json_dumps
+from leek.agent.shards import ValidationShards
+
+
+def single_process(batches):
+    for batch in batches:
+        rejected = []
+        docs = to_docs(validate_payload(batch, "prod", rejected).values(), rejected)
+        compress(json_dumps(docs), GZIP)
+
+
+def sharded(shards):
+    def run(batches):
+        for batch in batches:
+            data, _ = shards.encode(batch, [])
+            compress(data, GZIP)
+
+    return run
+
+
+def measure(run, batches, count, repeat=3):
+    """
+    :return: events/s, and events/s per second of CPU of the consumer process alone (the ceiling of the scaling)
+    """
+    best, best_cpu = None, None
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        run(batches)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - start_cpu
+        best = elapsed if best is None else min(best, elapsed)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    return count / best, count / best_cpu
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--shards", default="1,2,4,8")
+    options = parser.parse_args()
+
+    payload = events(options.events)
+    batches = [payload[i:i + options.batch] for i in range(0, len(payload), options.batch)]
+    cores = os.cpu_count()
+    baseline, _ = measure(single_process, batches, len(payload))
+    print(f"{cores} cores, {len(payload)} events in batches of {options.batch}")
+    print(f"consumer process only: {baseline:>10.0f} events/s")
+    for count in (int(c) for c in options.shards.split(",")):
+        if count > cores:
+            print(f"{count:>2} shards: skipped, {cores} cores")
+            continue
+        shards = ValidationShards("bench", count, "prod")
+        try:
+            # Warm up the shards (imports, parse caches)
+            sharded(shards)(batches[:1])
+            throughput, ceiling = measure(sharded(shards), batches, len(payload))
+        finally:
+            shards.close()
+        print(f"{count:>2} shards: {throughput:>10.0f} events/s ({throughput / baseline:.2f}x), "
+              f"consumer process ceiling {ceiling:.0f} events/s ({ceiling / baseline:.2f}x)")
@@ -0,0 +1,131 @@
+import os
+import sys
+import uuid
+import random
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+import pytest
+
+# The leek package lives in app/, tests run from the repository root
+APP_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app"))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Required by the API settings
+os.environ.setdefault("LEEK_WEB_URL", "http://localhost:8000")
+
+
+# Deterministic celery events, also used by the benchmarks (tests/bench): tasks going through sent, received,
+# started and succeeded/failed (~10% fail with a traceback), interleaved with worker heartbeats
+TIMESTAMP = 1700000000.0
+TRACEBACK = """Traceback (most recent call last):
+  File "/usr/local/lib/python3.9/site-packages/celery/app/trace.py", line 451, in trace_task
+    R = retval = fun(*args, **kwargs)
+  File "/app/tasks/billing.py", line 120, in charge_customer
+    raise PaymentError(f"card declined for customer {customer} order {order}")
+billing.errors.PaymentError: card declined for customer %d order %d"""
+
+
+def task_events(uuid_, r: random.Random, timestamp: float):
+    failed = r.random() < 0.1
+    common = {"uuid": uuid_, "utcoffset": 0, "pid": 100, "hostname": f"celery@worker-{r.randint(0, 6)}"}
+    inputs = {
+        "name": "myproject.billing.tasks.charge_customer",
+        "args": repr((r.randint(1, 10 ** 6), f"customer-{r.randint(1, 999)}", {"amount": 12.5, "items": [1, 2, 3]})),
+        "kwargs": repr({"order_id": r.randint(1, 10 ** 6), "meta": {"source": "web", "tags": ["a", "b"]}}),
+        "root_id": uuid_, "parent_id": None, "retries": 0, "eta": None, "expires": "2026-10-18T12:00:00+00:00",
+    }
+    yield {"type": "task-sent", "timestamp": timestamp, "clock": 1, **common, **inputs,
+           "exchange": "", "routing_key": "billing", "queue": "billing"}
+    yield {"type": "task-received", "timestamp": timestamp + 0.001, "clock": 2, **common, **inputs}
+    yield {"type": "task-started", "timestamp": timestamp + 0.002, "clock": 3, **common}
+    if failed:
+        yield {"type": "task-failed", "timestamp": timestamp + 0.003, "clock": 4, **common,
+               "exception": "PaymentError('card declined')",
+               "traceback": TRACEBACK % (r.randint(1, 99), r.randint(1, 99))}
+    else:
+        yield {"type": "task-succeeded", "timestamp": timestamp + 0.003, "clock": 4, **common,
+               "result": repr({"status": "ok", "charged": r.random()}), "runtime": r.random()}
+
+
+def make_worker_heartbeat(hostname: str, timestamp: float, clock: int):
+    return {"type": "worker-heartbeat", "hostname": hostname, "timestamp": timestamp, "utcoffset": 0, "pid": 1,
+            "clock": clock, "freq": 2.0, "sw_ident": "py-celery", "sw_ver": "5.2.7", "sw_sys": "Linux",
+            "active": 1, "processed": clock, "loadavg": [0.1, 0.2, 0.3]}
+
+
+def make_events(n: int = 1000, seed: int = 1):
+    """
+    About n events, the 4-5 events of each task are contiguous, a heartbeat every 50 events
+    """
+    r = random.Random(seed)
+    out = []
+    while len(out) < n:
+        timestamp = TIMESTAMP + len(out) / 1000
+        out.extend(task_events(str(uuid.UUID(int=r.getrandbits(128))), r, timestamp))
+        if len(out) % 50 < 5:
+            out.append(make_worker_heartbeat(f"celery@worker-{r.randint(0, 6)}", timestamp, len(out)))
+    return out[:n]
+
+
+@pytest.fixture
+def events():
+    """
+    Factory of deterministic celery events: events(n, seed)
+    """
+    return make_events
+
+
+@pytest.fixture
+def worker_heartbeat():
+    return make_worker_heartbeat("celery@worker-1", TIMESTAMP, 1)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.acks = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_qos(self, **kwargs):
+        pass
+
+
+class NullMetrics:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+@pytest.fixture
+def consumer():
+    """
+    LeekConsumer with its batching and ack state only, no broker connection nor API
+    """
+    from gevent.lock import RLock
+    from leek.agent.consumer import LeekConsumer
+
+    consumer = LeekConsumer.__new__(LeekConsumer)
+    consumer.lock = RLock()
+    consumer.channel = FakeChannel()
+    consumer.connection = SimpleNamespace(transport=SimpleNamespace(driver_type="amqp"))
+    consumer.metrics = NullMetrics()
+    consumer.inflight = OrderedDict()
+    consumer.pending_acks = []
+    consumer.batch_seq = 0
+    consumer.init_batch()
+    consumer.prefetch_window = 100
+    consumer.coalescer = None
+    consumer.shutting_down = False
+    consumer.should_stop = False
+    consumer.subscription_name = "app-prod"
+    consumer.app_env = "prod"
+    consumer.event_rules = None
+    consumer.heartbeats = None
+    consumer.validation_shards = None
+    consumer.kwargs_policy = None
+    consumer.dead_letters = None
+    consumer.ready = deque()
+    consumer.dispatcher = None
+    return consumer
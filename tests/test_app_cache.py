@@ -0,0 +1,79 @@
+import pytest
+
+# Requires the elasticsearch client of the API image
+template = pytest.importorskip("leek.api.db.template", exc_type=ImportError)
+
+
+class Loader:
+
+    def __init__(self):
+        self.loads = 0
+
+    def __call__(self, index_alias):
+        self.loads += 1
+        return {"app": index_alias, "load": self.loads}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(template.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return template.ApplicationCache(ttl=30, directory=str(tmp_path / "apps"))
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    load = Loader()
+    first = cache.get("org-app", load)
+    clock[0] += 29
+    assert cache.get("org-app", load) is first
+    clock[0] += 1
+    assert cache.get("org-app", load) == {"app": "org-app", "load": 2}
+    assert cache.get("org-other", load)["load"] == 3
+
+
+def test_invalidation_reaches_the_other_workers(tmp_path, clock):
+    directory = str(tmp_path / "apps")
+    worker_1, worker_2 = template.ApplicationCache(30, directory), template.ApplicationCache(30, directory)
+    load_1, load_2 = Loader(), Loader()
+    worker_1.get("org-app", load_1)
+    worker_2.get("org-app", load_2)
+    worker_1.invalidate("org-app")
+    assert worker_1.version("org-app") == 1
+    assert worker_1.get("org-app", load_1)["load"] == 2
+    assert worker_2.get("org-app", load_2)["load"] == 2
+    # Other applications are still cached
+    worker_2.get("org-other", load_2)
+    worker_1.invalidate("org-app")
+    assert worker_2.get("org-other", load_2)["load"] == 3
+
+
+def test_change_while_loading_expires_the_entry(cache, clock):
+    def load(index_alias):
+        cache.invalidate(index_alias)
+        return Loader()(index_alias)
+
+    cache.get("org-app", load)
+    reloaded = Loader()
+    assert cache.get("org-app", reloaded)["load"] == 1
+    assert cache.get("org-app", reloaded)["load"] == 1
+
+
+def test_disabled_cache_always_loads(tmp_path):
+    cache, load = template.ApplicationCache(0, str(tmp_path)), Loader()
+    cache.get("org-app", load)
+    assert cache.get("org-app", load)["load"] == 2
+    assert cache.entries == {}
+
+
+def test_unwritable_directory_still_invalidates_the_worker(tmp_path, clock):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    cache, load = template.ApplicationCache(30, str(blocker / "apps")), Loader()
+    cache.get("org-app", load)
+    cache.invalidate("org-app")
+    assert cache.get("org-app", load)["load"] == 2
@@ -0,0 +1,161 @@
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from leek.agent.backpressure import AIMDController
+
+
+def test_success_grows_by_step_up_to_max():
+    throttle = AIMDController(max_limit=210, min_limit=10)
+    assert throttle.step == 10
+    throttle.limit = 10
+    for expected in (20, 30, 40):
+        throttle.on_success()
+        assert throttle.limit == expected
+    throttle.limit = 205
+    throttle.on_success()
+    assert throttle.limit == 210
+    throttle.on_success()
+    assert throttle.limit == 210
+
+
+def test_step_is_at_least_one():
+    throttle = AIMDController(max_limit=15, min_limit=10)
+    assert throttle.step == 1
+
+
+def test_overload_halves_down_to_min():
+    throttle = AIMDController(max_limit=1000, min_limit=100)
+    for expected in (500, 250, 125, 100, 100):
+        throttle.on_overload(0)
+        assert throttle.limit == expected
+
+
+def test_limits_are_clamped():
+    throttle = AIMDController(max_limit=0, min_limit=10)
+    assert throttle.max_limit == 1 and throttle.min_limit == 1
+    throttle = AIMDController(max_limit=5, min_limit=10)
+    assert throttle.min_limit == 5 and throttle.limit == 5
+
+
+@pytest.mark.parametrize("retry_after, expected", [
+    (None, AIMDController.DEFAULT_RETRY_AFTER_S),
+    (3, 3),
+    (-10, 0),
+    (3600, AIMDController.MAX_RETRY_AFTER_S),
+])
+def test_overload_delay_is_clamped(retry_after, expected):
+    throttle = AIMDController(max_limit=100)
+    before = time.time()
+    throttle.on_overload(retry_after)
+    assert before + expected <= throttle.resume_at <= time.time() + expected
+
+
+def test_shorter_retry_after_does_not_resume_earlier():
+    throttle = AIMDController(max_limit=100)
+    throttle.on_overload(30)
+    resume_at = throttle.resume_at
+    throttle.on_overload(1)
+    assert throttle.resume_at == resume_at
+
+
+def test_wait_until_resume():
+    throttle = AIMDController(max_limit=100)
+    assert throttle.wait() == 0
+    throttle.on_overload(0.05)
+    start = time.time()
+    assert throttle.wait() > 0
+    assert time.time() - start >= 0.04
+    assert throttle.wait() == 0
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("120", 120),
+    ("0", 0),
+    ("1.5", 1.5),
+    (None, None),
+    ("", None),
+    ("soon", None),
+    # HTTP-date without a zone (asctime), ambiguous
+    ("Sun Nov  6 08:49:37 1994", None),
+])
+def test_parse_retry_after(value, expected):
+    assert AIMDController.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    now = 1700000000
+    assert AIMDController.parse_retry_after(formatdate(now + 30, usegmt=True), now=now) == 30
+    assert AIMDController.parse_retry_after("Tue, 14 Nov 2023 22:13:50 GMT", now=now) == 30
+    # Obsolete RFC 850 form
+    assert AIMDController.parse_retry_after("Tuesday, 14-Nov-23 22:13:50 GMT", now=now) == 30
+    # Already elapsed
+    assert AIMDController.parse_retry_after(formatdate(now - 30, usegmt=True), now=now) == 0
+    assert AIMDController.parse_retry_after(formatdate(time.time() + 10, usegmt=True)) == pytest.approx(10, abs=2)
+
+
+def response(status_code, headers=None):
+    r = requests.Response()
+    r.status_code = status_code
+    r.headers.update(headers or {})
+    r._content = b""
+    return r
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posted = []
+
+    def post(self, url, data, headers):
+        self.posted.append(data)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def sender(consumer):
+    from leek.agent.consumer import InflightBatch
+    from leek.agent.encoding import IDENTITY
+
+    consumer.api_url = "http://localhost:5000"
+    consumer.content_encoding = IDENTITY
+    consumer.throttle = AIMDController(max_limit=1000, min_limit=100)
+    consumer.spool = None
+    consumer.spooling = False
+    consumer.backoffs = 0
+
+    def backoff():
+        consumer.backoffs += 1
+
+    consumer.backoff = backoff
+    consumer.inflight[1] = InflightBatch(seq=1, latest_delivery_tag=10)
+    return consumer
+
+
+def test_overload_lowers_the_limit_and_retries_in_place(sender):
+    sender.session = FakeSession(response(429, {"Retry-After": "0"}), response(201))
+    sender.deliver(1, b"[]", 1)
+    assert len(sender.session.posted) == 2
+    assert sender.throttle.limit == 500 + sender.throttle.step
+    assert sender.backoffs == 0
+    assert sender.pending_acks == [(10, [])]
+
+
+def test_overload_without_retry_after_waits_the_default(sender):
+    from leek.agent.consumer import OVERLOADED
+
+    sender.session = FakeSession(response(429))
+    before = time.time()
+    assert sender.post_batch(b"[]") == OVERLOADED
+    assert sender.throttle.resume_at >= before + AIMDController.DEFAULT_RETRY_AFTER_S
+
+
+def test_overload_longer_than_the_max_wait_backs_off(sender):
+    sender.session = FakeSession(response(429, {"Retry-After": str(sender.OVERLOAD_MAX_WAIT_S + 30)}))
+    sender.deliver(1, b"[]", 1)
+    assert len(sender.session.posted) == 1
+    assert sender.throttle.limit == 500
+    assert sender.backoffs == 1
+    assert sender.pending_acks == []
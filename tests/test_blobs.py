@@ -0,0 +1,73 @@
+import pytest
+
+from leek.api import blobs
+
+POLICY = {
+    "args": {"mode": "hash", "max_length": 10},
+    "kwargs": {"mode": "offload", "max_length": 10},
+    "result": {"mode": "truncate", "max_length": 10},
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = blobs.LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(blobs, "_blob_store", store)
+    monkeypatch.setattr(blobs, "_blob_store_initialized", True)
+    return store
+
+
+class BrokenStore:
+    def put(self, index_alias, digest, data):
+        raise OSError("read-only file system")
+
+
+def task(**fields):
+    return {"kind": "task", "uuid": "uuid", **fields}
+
+
+def test_hashed_and_offloaded_values_drop_their_derived_fields(store):
+    doc = task(args=repr(("a" * 20, 2)), args_0="a" * 20, args_1="2",
+               kwargs=repr({"secret": "s" * 20}), kwargs_flattened={"secret": "s" * 20},
+               result="r" * 20)
+    kwargs = doc["kwargs"]
+    blobs.apply_payload_policy("app-env", POLICY, [doc])
+    assert "args" not in doc and "args_0" not in doc and "args_1" not in doc
+    assert doc["args_ref"]["mode"] == blobs.HASH
+    assert doc["kwargs"] == kwargs[:10] and "kwargs_flattened" not in doc
+    assert store.get("app-env", doc["kwargs_ref"]["digest"]) == kwargs.encode()
+    assert doc["result"] == "r" * 10 and doc["result_ref"]["mode"] == blobs.TRUNCATE
+
+
+def test_short_values_keep_their_derived_fields(store):
+    doc = task(args="(1,)", args_0="1", kwargs="{}", kwargs_flattened={})
+    blobs.apply_payload_policy("app-env", POLICY, [doc])
+    assert doc == task(args="(1,)", args_0="1", kwargs="{}", kwargs_flattened={})
+
+
+@pytest.mark.parametrize("url", ["ftp://host/path", "s3://", "file://"])
+def test_misconfigured_blob_store_is_rejected(url):
+    with pytest.raises(ValueError):
+        blobs.create_blob_store(url)
+
+
+def test_blob_store_not_configured():
+    assert blobs.create_blob_store("") is None
+    assert isinstance(blobs.create_blob_store("file:///var/leek/blobs"), blobs.LocalBlobStore)
+
+
+def test_unresolvable_blob_store_falls_back_to_truncate(monkeypatch):
+    monkeypatch.setattr(blobs, "_blob_store_initialized", False)
+    monkeypatch.setattr(blobs.settings, "LEEK_API_BLOB_STORE_URL", "ftp://host/path")
+    doc = task(kwargs="k" * 20, kwargs_flattened={"k": 1})
+    blobs.apply_payload_policy("app-env", POLICY, [doc])
+    assert doc["kwargs"] == "k" * 10 and doc["kwargs_ref"]["mode"] == blobs.TRUNCATE
+
+
+def test_failing_blob_store_falls_back_to_truncate(monkeypatch):
+    monkeypatch.setattr(blobs, "_blob_store", BrokenStore())
+    monkeypatch.setattr(blobs, "_blob_store_initialized", True)
+    docs = [task(kwargs="k" * 20), "not a doc", {"kind": "worker", "kwargs": "k" * 20}]
+    blobs.apply_payload_policy("app-env", POLICY, docs)
+    assert docs[0]["kwargs"] == "k" * 10 and docs[0]["kwargs_ref"]["mode"] == blobs.TRUNCATE
+    assert docs[2]["kwargs"] == "k" * 20
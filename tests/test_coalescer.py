@@ -0,0 +1,71 @@
+from leek.agent.adapters.normalizer import NORMALIZERS
+from leek.agent.coalescer import Coalescer
+
+TIMESTAMP = 1700000000.0
+
+
+def task(uuid, ev_type, clock=1):
+    event = {"type": ev_type, "uuid": uuid, "timestamp": TIMESTAMP + clock, "utcoffset": 0, "pid": 1,
+             "clock": clock, "hostname": "celery@worker"}
+    return NORMALIZERS[ev_type].normalize(event, "prod", 0)[1]
+
+
+def test_terminal_task_releases_its_batches():
+    coalescer = Coalescer(3600, 100)
+    ship, holding, released = coalescer.coalesce(1, {"a": task("a", "task-started")})
+    assert (ship, holding, released) == ([], [1], [])
+    ship, holding, released = coalescer.coalesce(2, {"a": task("a", "task-succeeded", 2)})
+    assert [t.state for t in ship] == ["SUCCEEDED"] and ship[0].events_count == 2
+    assert (holding, released) == ([], [1])
+    assert len(coalescer) == 0
+
+
+def test_max_held_releases_the_oldest():
+    coalescer = Coalescer(3600, 1)
+    coalescer.coalesce(1, {"a": task("a", "task-started")})
+    ship, holding, released = coalescer.coalesce(2, {"b": task("b", "task-started")})
+    assert [t.uuid for t in ship] == ["a"] and holding == [2] and released == [1]
+
+
+def test_release_before():
+    coalescer = Coalescer(3600, 100)
+    coalescer.coalesce(1, {"a": task("a", "task-started")})
+    coalescer.coalesce(2, {"b": task("b", "task-started")})
+    ship, holding, released = coalescer.coalesce(3, {"c": task("c", "task-started")}, release_before=2)
+    assert [t.uuid for t in ship] == ["a"] and holding == [3] and released == [1]
+    assert len(coalescer) == 2
+
+
+def send_batch(consumer, first_tag, size, events):
+    for tag in range(first_tag, first_tag + size):
+        consumer.batch[tag] = {}
+        consumer.batch_latest_delivery_tag = tag
+    seq, _ = consumer.checkout_batch()
+    consumer.coalesce(seq, events)
+    consumer.mark_delivered(seq)
+    consumer.flush_acks()
+
+
+def test_long_running_task_does_not_stall_the_acks(consumer):
+    consumer.coalescer = Coalescer(3600, 10000)
+    # A task started in the first batch and never finishing within the test
+    send_batch(consumer, 1, 10, {"slow": task("slow", "task-started")})
+    unacked = []
+    for i in range(1, 30):
+        send_batch(consumer, 1 + i * 10, 10, {f"t{i}": task(f"t{i}", "task-succeeded")})
+        unacked.append(consumer.count_unacked_messages())
+        assert consumer.count_unacked_messages() < consumer.prefetch_window
+    # The held task was released under pressure, every message got acked since
+    assert max(unacked) >= consumer.prefetch_window * consumer.COALESCING_MAX_UNACKED_RATIO - 10
+    assert consumer.channel.acks[-1] == (300, True)
+    assert consumer.count_unacked_messages() == 0
+    assert len(consumer.coalescer) == 0
+
+
+def test_held_tasks_wait_for_their_window_without_pressure(consumer):
+    consumer.coalescer = Coalescer(3600, 10000)
+    send_batch(consumer, 1, 10, {"slow": task("slow", "task-started")})
+    send_batch(consumer, 11, 10, {"t": task("t", "task-succeeded")})
+    assert consumer.channel.acks == []
+    assert consumer.count_unacked_messages() == 20
+    assert not consumer.should_release_held_tasks()
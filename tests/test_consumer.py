@@ -0,0 +1,220 @@
+from types import SimpleNamespace
+
+import gevent
+import pytest
+from gevent.event import Event
+from gevent.pool import Pool
+
+from leek.agent.backpressure import AIMDController
+
+
+def buffer(consumer, first_tag, size):
+    for tag in range(first_tag, first_tag + size):
+        consumer.batch[tag] = {"type": "worker-heartbeat", "hostname": "celery@worker", "timestamp": 1700000000.0,
+                               "utcoffset": 0, "pid": 1, "clock": tag, "freq": 2.0, "sw_ident": "py-celery",
+                               "sw_ver": "5.2.7", "sw_sys": "Linux"}
+        consumer.batch_latest_delivery_tag = tag
+
+
+def test_send_does_not_wait_for_a_sender(consumer):
+    consumer.senders = Pool(1)
+    released, delivered = Event(), []
+
+    def deliver(seq, data, count):
+        released.wait()
+        delivered.append(seq)
+        consumer.mark_delivered(seq)
+
+    consumer.deliver = deliver
+    with gevent.Timeout(1):
+        for first_tag in (1, 11, 21):
+            buffer(consumer, first_tag, 10)
+            consumer.send()
+            gevent.sleep(0)
+    # One batch with the only sender, the others wait for it without blocking the caller
+    assert len(consumer.senders) == 1 and len(consumer.ready) == 2
+    released.set()
+    consumer.dispatcher.join(timeout=1)
+    consumer.senders.join(timeout=1)
+    assert delivered == [1, 2, 3]
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(30, True)]
+
+
+def test_backoff_drops_the_ready_batches(consumer):
+    consumer.senders = Pool(1)
+    released, delivered = Event(), []
+
+    def deliver(seq, data, count):
+        released.wait()
+        delivered.append(seq)
+
+    consumer.deliver = deliver
+    for first_tag in (1, 11):
+        buffer(consumer, first_tag, 10)
+        consumer.send()
+        gevent.sleep(0)
+    consumer.backoff()
+    released.set()
+    consumer.dispatcher.join(timeout=1)
+    consumer.senders.join(timeout=1)
+    assert delivered == [1]
+
+
+@pytest.fixture
+def budget(consumer):
+    consumer.batch_max_size_in_bytes = 10 * 1024
+    consumer.batch_max_window_in_seconds = 3600
+    consumer.throttle = AIMDController(1000)
+    consumer.prefetch_count = 100
+    consumer.memory_budget_in_bytes = 100 * 1024
+    consumer.message_average_size_in_bytes = None
+    consumer.qos = []
+    consumer.set_qos = consumer.qos.append
+    return consumer
+
+
+def message(tag, size):
+    return SimpleNamespace(delivery_tag=tag, body=b"x" * size)
+
+
+def test_batch_size_is_the_encoded_size(budget):
+    # Nested bodies are accounted with their size on the wire, not the size of the decoded dict
+    for tag in range(1, 10):
+        assert budget.handle_message({"type": "task-sent"}, message(tag, 1024)) is False
+    assert budget.batch_size_in_bytes == 9 * 1024
+    assert budget.handle_message({"type": "task-sent"}, message(10, 1024)) is True
+
+
+def test_prefetch_window_fits_the_memory_budget(budget):
+    # 100 messages of 1KB fit the 100KB budget
+    budget.track_message_size(1024)
+    assert budget.prefetch_window == 100 and budget.qos == []
+    # 10 messages of 10KB
+    for _ in range(100):
+        budget.track_message_size(10 * 1024)
+    assert budget.prefetch_window == 10
+    assert budget.qos[-1] == 10
+    # Never below one message, even when a message alone exceeds the budget
+    for _ in range(100):
+        budget.track_message_size(1024 * 1024)
+    assert budget.prefetch_window == 1
+
+
+def test_prefetch_window_is_not_renegotiated_on_small_changes(budget):
+    budget.track_message_size(2048)
+    assert budget.prefetch_window == 50 and budget.qos == [50]
+    budget.track_message_size(2100)
+    assert budget.prefetch_window == 50 and budget.qos == [50]
+
+
+def test_batch_is_sent_once_it_holds_the_prefetch_window(budget):
+    # 5 messages of 10 bytes
+    budget.memory_budget_in_bytes = 50
+    for tag in range(1, 5):
+        assert budget.handle_message({"type": "task-sent"}, message(tag, 10)) is False
+    assert budget.handle_message({"type": "task-sent"}, message(5, 10)) is True
+
+
+def test_flush_acks_is_contiguous(consumer):
+    for first_tag in (1, 11, 21):
+        buffer(consumer, first_tag, 10)
+        consumer.checkout_batch()
+    consumer.mark_delivered(2)
+    consumer.mark_delivered(3)
+    consumer.flush_acks()
+    # Batch 1 is not delivered, nothing can be acked yet
+    assert consumer.channel.acks == []
+    assert consumer.count_unacked_messages() == 30
+    consumer.mark_delivered(1)
+    assert consumer.channel.acks == []
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(30, True)]
+    assert consumer.count_unacked_messages() == 0
+
+
+def test_delivery_of_an_unknown_batch_is_ignored(consumer):
+    buffer(consumer, 1, 5)
+    seq, _ = consumer.checkout_batch()
+    consumer.inflight.clear()
+    consumer.mark_delivered(seq)
+    consumer.flush_acks()
+    assert consumer.channel.acks == []
+
+
+def test_flush_acks_up_to_the_first_undelivered_batch(consumer):
+    for first_tag in (1, 11, 21):
+        buffer(consumer, first_tag, 10)
+        consumer.checkout_batch()
+    consumer.mark_delivered(1)
+    consumer.mark_delivered(3)
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(10, True)]
+    consumer.mark_delivered(2)
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(10, True), (30, True)]
+    # Nothing left to ack
+    consumer.flush_acks()
+    assert len(consumer.channel.acks) == 2
+
+
+def test_flush_acks_one_by_one_on_redis(consumer):
+    consumer.connection.transport.driver_type = "redis"
+    for first_tag in (1, 4):
+        buffer(consumer, first_tag, 3)
+        consumer.checkout_batch()
+    consumer.mark_delivered(1)
+    consumer.mark_delivered(2)
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(tag, False) for tag in range(1, 7)]
+
+
+@pytest.fixture
+def running(consumer):
+    consumer.consuming = True
+    consumer.flusher = consumer.replayer = None
+    consumer.senders = Pool(2)
+    consumer.ACK_INTERVAL_S = 0.01
+
+    def consume_loop():
+        while not consumer.should_stop:
+            consumer.flush_acks()
+            gevent.sleep(consumer.ACK_INTERVAL_S)
+
+    loop = gevent.spawn(consume_loop)
+    yield consumer
+    loop.kill()
+
+
+def test_shutdown_flushes_and_acks_the_buffered_batch(running):
+    def deliver(seq, data, count):
+        gevent.sleep(0.05)
+        running.mark_delivered(seq)
+
+    running.deliver = deliver
+    buffer(running, 1, 10)
+    with gevent.Timeout(1):
+        running.shutdown(1)
+    assert running.should_stop
+    assert running.channel.acks == [(10, True)]
+    # No more messages buffered once shutting down
+    assert running.handle_message({"type": "task-sent"}, SimpleNamespace(delivery_tag=11, body=b"{}")) is False
+    assert len(running.batch) == 0
+
+
+def test_shutdown_gives_up_on_batches_not_delivered_in_time(running):
+    running.deliver = lambda seq, data, count: gevent.sleep(10)
+    buffer(running, 1, 10)
+    with gevent.Timeout(1):
+        running.shutdown(0.1)
+    assert running.should_stop
+    # Left unacked, redelivered by the broker
+    assert running.channel.acks == [] and len(running.inflight) == 1
+
+
+def test_shutdown_after_a_backoff_does_not_send(running):
+    running.deliver = lambda seq, data, count: pytest.fail("sent after backoff")
+    buffer(running, 1, 10)
+    running.should_stop = True
+    running.shutdown(1)
+    assert running.shutting_down and running.channel.acks == []
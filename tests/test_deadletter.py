@@ -0,0 +1,87 @@
+import json
+import os
+
+from leek.agent.deadletter import DeadLetters
+
+EVENT = {"type": "task-received", "uuid": "b5bd7aa5-a3b8-4ec4-8a4e-b4f1d4e0b1a5", "timestamp": "yesterday"}
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rejected_events_are_appended_as_json_lines(tmp_path):
+    path = str(tmp_path / "deadletters" / "app-prod.jsonl")
+    dead_letters = DeadLetters(path)
+    dead_letters.write([("schema", "data.timestamp must be number", EVENT)])
+    dead_letters.write([("type_error", "TypeError: boom", "not an event"), ("schema", "", EVENT)])
+    records = read(path)
+    assert [(r["reason"], r["error"], r["event"]) for r in records] == [
+        ("schema", "data.timestamp must be number", EVENT),
+        ("type_error", "TypeError: boom", "not an event"),
+        ("schema", "", EVENT),
+    ]
+    assert all(isinstance(r["at"], float) for r in records)
+
+
+def test_nothing_rejected_nothing_written(tmp_path):
+    path = str(tmp_path / "app-prod.jsonl")
+    DeadLetters(path).write([])
+    assert not os.path.exists(path)
+
+
+def test_unserializable_event_is_written_as_its_repr(tmp_path):
+    path = str(tmp_path / "app-prod.jsonl")
+    event = {"uuid": "u", "args": object()}
+    DeadLetters(path).write([("serialization_error", "TypeError", event)])
+    assert read(path)[0]["event"] == repr(event)
+
+
+def test_file_is_rotated_past_its_maximum_size(tmp_path):
+    path = str(tmp_path / "app-prod.jsonl")
+    dead_letters = DeadLetters(path, max_size_in_mb=1)
+    big = {**EVENT, "args": "x" * 300 * 1024}
+    for _ in range(4):
+        dead_letters.write([("schema", "", big)])
+    # Rotated on the 4th write, a single previous generation is kept
+    assert not os.path.exists(path)
+    assert len(read(f"{path}.1")) == 4
+    dead_letters.write([("schema", "", EVENT)])
+    assert len(read(path)) == 1
+    for _ in range(4):
+        dead_letters.write([("schema", "", big)])
+    assert len(read(f"{path}.1")) == 5
+
+
+def test_write_errors_do_not_raise(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    DeadLetters(str(blocker / "app-prod.jsonl")).write([("schema", "", EVENT)])
+
+
+def test_bad_events_are_dead_lettered_and_acked_with_their_batch(consumer, worker_heartbeat, tmp_path):
+    from gevent.pool import Pool
+
+    path = str(tmp_path / "app-prod.jsonl")
+    consumer.dead_letters = DeadLetters(path)
+    consumer.senders = Pool(1)
+    delivered = []
+
+    def deliver(seq, data, count):
+        delivered.append(json.loads(data))
+        consumer.mark_delivered(seq)
+
+    consumer.deliver = deliver
+    for tag, body in enumerate([worker_heartbeat, EVENT, "not an event"], start=1):
+        consumer.batch[tag] = body
+        consumer.batch_latest_delivery_tag = tag
+    consumer.send()
+    consumer.dispatcher.join(timeout=1)
+    consumer.senders.join(timeout=1)
+    assert [doc["hostname"] for doc in delivered[0]] == [worker_heartbeat["hostname"]]
+    assert [(record["reason"], record["event"]) for record in read(path)] == [
+        ("schema_required", EVENT), ("processing_error", "not an event")
+    ]
+    consumer.flush_acks()
+    assert consumer.channel.acks == [(3, True)]
@@ -0,0 +1,75 @@
+import pytest
+import zstandard
+
+from leek.agent.encoding import GZIP, ZSTD, IDENTITY, compress, negotiate_encoding
+from leek.api.utils import PayloadTooLarge, UnsupportedContentEncoding, decompress_body
+
+BODY = b'[{"uuid": "b5bd7aa5-a3b8-4ec4-8a4e-b4f1d4e0b1a5", "state": "SUCCEEDED"}]' * 100
+MAX_SIZE = 64 * 1024
+
+
+@pytest.mark.parametrize("preferred, accepted, expected", [
+    (ZSTD, "zstd, gzip", ZSTD),
+    (GZIP, "zstd, gzip", GZIP),
+    # Preferred not accepted, the other supported one is
+    (ZSTD, "gzip", GZIP),
+    (GZIP, "zstd", ZSTD),
+    # Parameters and case are ignored
+    (ZSTD, "GZIP;q=0.5, Zstd;q=1", ZSTD),
+    # Older API, uncompressed bodies only
+    (GZIP, None, IDENTITY),
+    (GZIP, "", IDENTITY),
+    (GZIP, "br", IDENTITY),
+    ("none", "zstd, gzip", IDENTITY),
+    (None, "zstd, gzip", IDENTITY),
+])
+def test_negotiate_encoding(preferred, accepted, expected):
+    assert negotiate_encoding(preferred, accepted) == expected
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD, IDENTITY])
+def test_round_trip(encoding):
+    data = compress(BODY, encoding)
+    if encoding != IDENTITY:
+        assert len(data) < len(BODY)
+    assert decompress_body(data, encoding, MAX_SIZE) == BODY
+
+
+def test_missing_or_padded_content_encoding_is_identity():
+    assert decompress_body(BODY, None, MAX_SIZE) == BODY
+    assert decompress_body(compress(BODY, GZIP), " GZIP ", MAX_SIZE) == BODY
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD, IDENTITY])
+def test_body_is_decompressed_up_to_the_limit(encoding):
+    data = b"0" * MAX_SIZE
+    assert decompress_body(compress(data, encoding), encoding, MAX_SIZE) == data
+    # A few KB inflating far past the limit
+    with pytest.raises(PayloadTooLarge):
+        decompress_body(compress(data + b"0", encoding), encoding, MAX_SIZE)
+    with pytest.raises(PayloadTooLarge):
+        decompress_body(compress(b"0" * 100 * MAX_SIZE, encoding), encoding, MAX_SIZE)
+
+
+def test_unsupported_encoding():
+    with pytest.raises(UnsupportedContentEncoding):
+        decompress_body(BODY, "br", MAX_SIZE)
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD])
+def test_invalid_or_truncated_stream(encoding):
+    with pytest.raises(ValueError):
+        decompress_body(BODY, encoding, MAX_SIZE)
+    with pytest.raises(ValueError):
+        decompress_body(compress(BODY, encoding)[:-8], encoding, MAX_SIZE)
+
+
+def test_zstd_frame_without_content_size():
+    def streamed(data):
+        compressor = zstandard.ZstdCompressor().compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    assert zstandard.get_frame_parameters(streamed(BODY)).content_size == zstandard.CONTENTSIZE_UNKNOWN
+    assert decompress_body(streamed(BODY), ZSTD, MAX_SIZE) == BODY
+    with pytest.raises(PayloadTooLarge):
+        decompress_body(streamed(b"0" * 100 * MAX_SIZE), ZSTD, MAX_SIZE)
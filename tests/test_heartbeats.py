@@ -0,0 +1,97 @@
+import pytest
+
+from leek.agent.heartbeats import HeartbeatFilter
+
+T0 = 1700000000.0
+
+
+def heartbeat(timestamp, active=1, processed=0, hostname="celery@worker-1"):
+    return {"type": "worker-heartbeat", "hostname": hostname, "timestamp": timestamp, "active": active,
+            "processed": processed}
+
+
+@pytest.fixture
+def heartbeats():
+    return HeartbeatFilter(interval_in_seconds=60, active_delta=5, processed_delta=1000)
+
+
+def forwarded(heartbeats, event):
+    return heartbeats.filter([event]) == [event]
+
+
+def test_first_heartbeat_then_only_news(heartbeats):
+    assert forwarded(heartbeats, heartbeat(T0))
+    assert not forwarded(heartbeats, heartbeat(T0 + 2))
+    assert not forwarded(heartbeats, heartbeat(T0 + 4, active=4, processed=999))
+    # Compared with the latest forwarded heartbeat, not the latest received one
+    assert forwarded(heartbeats, heartbeat(T0 + 6, active=6))
+    assert not forwarded(heartbeats, heartbeat(T0 + 8, active=2))
+
+
+def test_heartbeat_is_forwarded_once_per_interval(heartbeats):
+    assert forwarded(heartbeats, heartbeat(T0))
+    assert not forwarded(heartbeats, heartbeat(T0 + 59.9))
+    assert forwarded(heartbeats, heartbeat(T0 + 60))
+    assert not forwarded(heartbeats, heartbeat(T0 + 119))
+
+
+@pytest.mark.parametrize("change", [
+    {"active": 0},  # went idle
+    {"active": 6},
+    {"active": None},
+    {"processed": 1000},
+    {"processed": None},
+])
+def test_material_changes_are_forwarded(heartbeats, change):
+    assert forwarded(heartbeats, heartbeat(T0, active=1, processed=0))
+    assert forwarded(heartbeats, {**heartbeat(T0 + 2), **change})
+
+
+def test_busy_again_and_counter_reset_are_forwarded(heartbeats):
+    assert forwarded(heartbeats, heartbeat(T0, active=0, processed=5000))
+    assert forwarded(heartbeats, heartbeat(T0 + 2, active=1, processed=5000))
+    # Worker restarted with the same hostname
+    assert forwarded(heartbeats, heartbeat(T0 + 4, active=1, processed=3))
+
+
+def test_workers_are_tracked_separately(heartbeats):
+    assert forwarded(heartbeats, heartbeat(T0, hostname="celery@a"))
+    assert forwarded(heartbeats, heartbeat(T0, hostname="celery@b"))
+    assert not forwarded(heartbeats, heartbeat(T0 + 2, hostname="celery@a"))
+
+
+def test_state_transitions_are_forwarded_and_reset_the_worker(heartbeats):
+    online = {"type": "worker-online", "hostname": "celery@worker-1", "timestamp": T0}
+    offline = {"type": "worker-offline", "hostname": "celery@worker-1", "timestamp": T0 + 4}
+    assert forwarded(heartbeats, heartbeat(T0))
+    assert forwarded(heartbeats, online)
+    assert forwarded(heartbeats, heartbeat(T0 + 2))
+    assert forwarded(heartbeats, offline)
+    assert forwarded(heartbeats, offline)
+    assert forwarded(heartbeats, heartbeat(T0 + 6))
+
+
+def test_other_events_and_order_are_kept(heartbeats):
+    task = {"type": "task-started", "uuid": "u", "hostname": "celery@worker-1", "timestamp": T0 + 1}
+    payload = [heartbeat(T0), task, heartbeat(T0 + 2), "not an event", heartbeat(T0 + 60)]
+    assert heartbeats.filter(payload) == [payload[0], task, "not an event", payload[4]]
+
+
+@pytest.mark.parametrize("event", [
+    heartbeat("yesterday"),
+    heartbeat(T0 + 2, active="1"),
+    heartbeat(T0 + 2, processed=1.5),
+])
+def test_malformed_heartbeats_are_left_to_the_validation(heartbeats, event):
+    assert forwarded(heartbeats, heartbeat(T0))
+    assert forwarded(heartbeats, event)
+    # Not remembered
+    assert not forwarded(heartbeats, heartbeat(T0 + 2))
+
+
+def test_least_recently_forwarded_workers_are_evicted(heartbeats, monkeypatch):
+    monkeypatch.setattr(HeartbeatFilter, "MAX_WORKERS", 2)
+    for hostname in ("celery@a", "celery@b", "celery@c"):
+        assert forwarded(heartbeats, heartbeat(T0, hostname=hostname))
+    assert list(heartbeats.workers) == ["celery@b", "celery@c"]
+    assert forwarded(heartbeats, heartbeat(T0 + 2, hostname="celery@a"))
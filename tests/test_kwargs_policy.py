@@ -0,0 +1,93 @@
+from collections import Counter
+
+import pytest
+
+from leek.agent.adapters import parse_cache
+from leek.agent.adapters.args_extract import kwargs_string_to_flat_fast
+from leek.agent.adapters.kwargs_policy import KwargsPolicy, compile_globs
+
+KWARGS = repr({
+    "order": {"id": 7, "items": [{"sku": "a"}, {"sku": "b"}, {"sku": "c"}]},
+    "payload": {"blob": "x" * 10, "nested": {"deep": 1}},
+    "auth": {"token": "secret", "user": "bob"},
+})
+
+
+def flat(pruned=None, **options):
+    return kwargs_string_to_flat_fast(KWARGS, allow_python_repr_fallback=True, pruned=pruned, **options)
+
+
+def test_no_policy_flattens_every_key():
+    pruned = Counter()
+    assert list(flat(pruned)) == ["order.id", "order.items.0.sku", "order.items.1.sku", "order.items.2.sku",
+                                  "payload.blob", "payload.nested.deep", "auth.token", "auth.user"]
+    assert not pruned
+
+
+def test_denied_subtrees_are_pruned_before_flattening():
+    pruned = Counter()
+    result = flat(pruned, deny_pattern=compile_globs(["payload", "*.token"]))
+    assert list(result) == ["order.id", "order.items.0.sku", "order.items.1.sku", "order.items.2.sku", "auth.user"]
+    # A pruned subtree counts once
+    assert pruned == Counter(denied=2)
+
+
+def test_only_allowed_keys_are_kept():
+    pruned = Counter()
+    result = flat(pruned, allow_pattern=compile_globs(["order.*", "auth.user"]))
+    assert list(result) == ["order.id", "order.items.0.sku", "order.items.1.sku", "order.items.2.sku", "auth.user"]
+    assert pruned == Counter(not_allowed=3)
+
+
+def test_keys_beyond_the_budget_are_dropped_in_document_order():
+    pruned = Counter()
+    assert list(flat(pruned, max_keys=2)) == ["order.id", "order.items.0.sku"]
+    assert pruned == Counter(budget=6)
+
+
+@pytest.mark.parametrize("policy, value", [
+    ("json", '[{"sku": "a"}, {"sku": "b"}, {"sku": "c"}]'),
+    ("join", "{'sku': 'a'},{'sku': 'b'},{'sku': 'c'}"),
+])
+def test_long_lists_are_collapsed_to_a_single_key(policy, value):
+    pruned = Counter()
+    result = flat(pruned, collapse_lists_above=2, collapse_policy=policy)
+    assert result["order.items"] == value
+    assert not any(key.startswith("order.items.") for key in result)
+    assert pruned == Counter(collapsed=1)
+    # Cut like any string
+    assert len(flat(collapse_lists_above=2, collapse_policy=policy, max_string_len=10)["order.items"]) == 10
+
+
+def test_collapsed_lists_count_in_the_budget():
+    pruned = Counter()
+    result = flat(pruned, collapse_lists_above=2, max_keys=3, deny_pattern=compile_globs(["payload"]))
+    assert list(result) == ["order.id", "order.items", "auth.token"]
+    assert pruned == Counter(collapsed=1, denied=1, budget=1)
+
+
+@pytest.mark.parametrize("policy", [
+    {"max_keys": 0},
+    {"max_keys": "200"},
+    {"collapse_lists_above": -1},
+    {"collapse_mode": "csv"},
+    {"deny": [1]},
+])
+def test_invalid_policies(policy):
+    with pytest.raises(ValueError):
+        KwargsPolicy.compile(policy)
+
+
+def test_policy_counts_are_replayed_on_cache_hits(monkeypatch):
+    monkeypatch.setattr(parse_cache.KWARGS_CACHE, "entries", type(parse_cache.KWARGS_CACHE.entries)())
+    policy = KwargsPolicy.compile({"max_keys": 2, "deny": ["payload.*"]})
+    first = parse_cache.parse_kwargs(KWARGS, policy)
+    assert parse_cache.parse_kwargs(KWARGS, policy) is first
+    assert list(first) == ["order.id", "order.items.0.sku"]
+    assert policy.take_pruned() == Counter(budget=8, denied=4)
+    assert policy.take_pruned() == Counter()
+    # Other policies and the default flattening are cached separately
+    other = KwargsPolicy.compile({"max_keys": 3})
+    assert len(parse_cache.parse_kwargs(KWARGS, other)) == 3
+    assert len(parse_cache.parse_kwargs(KWARGS)) == 8
+    assert KwargsPolicy.compile({"max_keys": 3}).digest == other.digest
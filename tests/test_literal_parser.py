@@ -0,0 +1,80 @@
+import ast
+
+import pytest
+
+from leek.agent.adapters.args_extract import kwargs_string_to_flat_fast, promote_args
+from leek.agent.adapters.literal_parser import LiteralParser, UnsupportedLiteral, literal_eval, literal_eval_items
+
+REPRS = [
+    "1", "-12", "0", "1.5", "-.5", "1e3", "2.5E-3", "True", "False", "None", "...",
+    "'a'", '"b"', "'it\\'s'", "'line\\nbreak'", "'é'", "b'bytes'", "r'raw\\d'", "u'text'",
+    "()", "(1,)", "(1)", "(1, 2)", "[]", "[1, 'a', None]", "{}", "{'a': 1}", "{1, 2, 3}", "{(1, 2): [3]}",
+    "{'order': {'id': 12, 'items': [{'sku': 'x', 'qty': 2}], 'tags': ('a', 'b')}, 'meta': None}",
+    "  [ 1 ,\t2 , ]  ", "[[[[[[]]]]]]", "{'a': {'b': {'c': {'d': (1, [2, {3}])}}}}",
+]
+
+
+@pytest.mark.parametrize("text", REPRS)
+def test_same_as_literal_eval(text):
+    assert literal_eval(text) == ast.literal_eval(text)
+    # Bounds larger than the input change nothing
+    assert literal_eval(text, max_items=100, max_depth=12) == ast.literal_eval(text)
+
+
+@pytest.mark.parametrize("text", REPRS)
+def test_items_same_as_literal_eval(text):
+    value = ast.literal_eval(text)
+    expected = list(value) if isinstance(value, (list, tuple)) else [value]
+    assert literal_eval_items(text, 2) == expected[:2]
+
+
+@pytest.mark.parametrize("text", ["", "1 2", "[1, 2", "{'a' 1}", "f(1)", "{'a': 1,, }", "01"])
+def test_unsupported(text):
+    with pytest.raises(UnsupportedLiteral):
+        LiteralParser(text).parse()
+
+
+def test_max_items():
+    assert literal_eval("[1, 2, [3, 4, 5], 6]", max_items=3) == [1, 2, [3, 4, 5]]
+    assert literal_eval("(1, 2, (3, 4, 5), 6)", max_items=2) == (1, 2)
+    assert literal_eval("{'a': 1, 'b': [1, 2, 3], 'c': 3}", max_items=2) == {"a": 1, "b": [1, 2]}
+    assert literal_eval("{3, 1, 2, 5}", max_items=2) == {3, 1}
+    # Skipped items are not parsed, whatever they hold
+    assert literal_eval("[1, 2, f(x), {'a': ')'}]", max_items=2) == [1, 2]
+    assert literal_eval("{'a': 1, 'b': f(x)}", max_items=1) == {"a": 1}
+
+
+def test_max_depth():
+    assert literal_eval("[1, [2, [3, [4]]]]", max_depth=2) == [1, [2, "[3, [4]]"]]
+    assert literal_eval("{'a': {'b': {'c': 1}}, 'd': 2}", max_depth=2) == {"a": {"b": "{'c': 1}"}, "d": 2}
+    # The skipped subtree is neither parsed nor materialized
+    assert literal_eval("[1, [f(x), ')']]", max_depth=1) == [1, "[f(x), ')']"]
+    assert literal_eval_items("([1, [2]], 3)", 2, max_depth=2) == [[1, "[2]"], 3]
+
+
+def test_deep_nesting_does_not_overflow():
+    text = "[" * 5000 + "]" * 5000
+    with pytest.raises((RecursionError, SyntaxError)):
+        ast.literal_eval(text)
+    with pytest.raises(RecursionError):
+        LiteralParser(text).parse()
+    value = literal_eval(text, max_depth=13)
+    for _ in range(12):
+        assert len(value) == 1
+        value = value[0]
+    assert value == ["[" * 4987 + "]" * 4987]
+
+
+def test_flattener_bounds_deep_and_wide_kwargs():
+    deep = "{'a': " * 2000 + "1" + "}" * 2000
+    flat = kwargs_string_to_flat_fast(deep, max_depth=12, allow_python_repr_fallback=True)
+    assert list(flat) == [".".join("a" * 13)]
+    wide = repr({f"k{i}": i for i in range(500)})
+    flat = kwargs_string_to_flat_fast(wide, max_list_items=100, allow_python_repr_fallback=True)
+    assert len(flat) == 100 and flat["k99"] == 99
+
+
+def test_promoted_args_are_bounded():
+    args = "(" + "[" * 3000 + "]" * 3000 + ", 'b')"
+    promoted = promote_args(args, 2)
+    assert promoted["args_0"] == ("[" * 3000)[:256] and promoted["args_1"] == "b"
@@ -0,0 +1,100 @@
+import importlib
+import time
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from leek.agent import metrics as metrics_module
+
+
+@pytest.fixture(scope="module")
+def metrics():
+    """
+    Metrics module with the series registered, as in a subscription process with LEEK_AGENT_METRICS_PORT set
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("LEEK_AGENT_METRICS_PORT", "9100")
+        if not metrics_module.ENABLED:
+            importlib.reload(metrics_module)
+    return metrics_module
+
+
+def bound(metrics, subscription):
+    consumer = SimpleNamespace(
+        count_unacked_messages=lambda: 42, prefetch_window=500, throttle=SimpleNamespace(limit=250)
+    )
+    consumer_metrics = metrics.ConsumerMetrics(subscription)
+    consumer_metrics.bind(consumer)
+    return consumer_metrics
+
+
+def sample(name, subscription, **labels):
+    return REGISTRY.get_sample_value(name, {"subscription": subscription, **labels})
+
+
+def test_counters(metrics):
+    consumer_metrics = bound(metrics, "counters-prod")
+    consumer_metrics.consumed(10)
+    consumer_metrics.consumed(5)
+    consumer_metrics.filtered(3)
+    consumer_metrics.heartbeats_dropped(2)
+    consumer_metrics.sent(7)
+    consumer_metrics.spooled(4)
+    consumer_metrics.acked(15)
+    consumer_metrics.backoff()
+    consumer_metrics.kwargs_pruned({"max_keys": 6, "deny": 1})
+    consumer_metrics.validated(8, [("schema", "", {}), ("schema", "", {}), ("type_error", "", {})])
+    assert sample("leek_agent_events_consumed_total", "counters-prod") == 15
+    assert sample("leek_agent_events_filtered_total", "counters-prod") == 3
+    assert sample("leek_agent_heartbeats_dropped_total", "counters-prod") == 2
+    assert sample("leek_agent_events_sent_total", "counters-prod") == 7
+    assert sample("leek_agent_events_spooled_total", "counters-prod") == 4
+    assert sample("leek_agent_messages_acked_total", "counters-prod") == 15
+    assert sample("leek_agent_backoffs_total", "counters-prod") == 1
+    assert sample("leek_agent_kwargs_pruned_total", "counters-prod", reason="max_keys") == 6
+    assert sample("leek_agent_validation_failures_total", "counters-prod", reason="schema") == 2
+    assert sample("leek_agent_validation_failures_total", "counters-prod", reason="type_error") == 1
+    assert sample("leek_agent_batch_size_events_count", "counters-prod") == 1
+
+
+def test_histograms(metrics):
+    consumer_metrics = bound(metrics, "histograms-prod")
+    consumer_metrics.encoded(2048)
+    consumer_metrics.posted("delivered", 0.2)
+    consumer_metrics.posted("overloaded", 0.01)
+    assert sample("leek_agent_batch_size_bytes_sum", "histograms-prod") == 2048
+    assert sample("leek_agent_api_latency_seconds_count", "histograms-prod", outcome="delivered") == 1
+    assert sample("leek_agent_api_latency_seconds_count", "histograms-prod", outcome="overloaded") == 1
+
+
+def test_gauges_read_the_consumer(metrics):
+    consumer_metrics = bound(metrics, "gauges-prod")
+    assert sample("leek_agent_unacked_messages", "gauges-prod") == 42
+    assert sample("leek_agent_prefetch_window", "gauges-prod") == 500
+    assert sample("leek_agent_batch_limit", "gauges-prod") == 250
+    consumer_metrics.last_ack_at = time.time() - 60
+    assert sample("leek_agent_seconds_since_last_ack", "gauges-prod") >= 60
+
+
+def test_parse_cache_hits_include_the_shards(metrics):
+    from leek.agent.adapters import parse_cache
+
+    local = parse_cache.stats()
+    name = next(iter(local))
+    hits = REGISTRY.get_sample_value("leek_agent_parse_cache_hits_total", {"cache": name}) or 0
+    parse_cache.record_remote_stats("metrics-shard-0", {name: (100, 10)})
+    try:
+        assert REGISTRY.get_sample_value("leek_agent_parse_cache_hits_total", {"cache": name}) == hits + 100
+    finally:
+        parse_cache.remote_stats.pop("metrics-shard-0")
+
+
+def test_unbound_metrics_are_no_op():
+    consumer_metrics = metrics_module.ConsumerMetrics("unbound-prod")
+    consumer_metrics.consumed(10)
+    consumer_metrics.acked(10)
+    assert not consumer_metrics.enabled
+    assert sample("leek_agent_events_consumed_total", "unbound-prod") is None
+    # Tracked even without the series
+    assert time.time() - consumer_metrics.last_ack_at < 1
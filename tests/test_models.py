@@ -0,0 +1,78 @@
+import pickle
+from dataclasses import fields
+
+import pytest
+
+from leek.agent.models.task import Task, TASK_MERGE_PLAN, QUEUED, RECEIVED, STARTED, SUCCEEDED, RETRY
+from leek.agent.models.worker import Worker, WORKER_STATE_FIELDS
+
+
+def task(state, exact_timestamp, **kwargs):
+    return Task(id="u", app_env="prod", kind="task", state=state, clock=1, updated_at=1, timestamp=1,
+                exact_timestamp=exact_timestamp, utcoffset=0, pid=100, uuid="u", **kwargs)
+
+
+def worker(state, exact_timestamp, **kwargs):
+    return Worker(id="celery@worker-1", app_env="prod", kind="worker", state=state, clock=1, updated_at=1,
+                  timestamp=1, exact_timestamp=exact_timestamp, utcoffset=0, pid=1, hostname="celery@worker-1",
+                  **kwargs)
+
+
+@pytest.mark.parametrize("model", [Task, Worker])
+def test_models_have_no_instance_dict(model):
+    instance = task(QUEUED, 1.0) if model is Task else worker("HEARTBEAT", 1.0)
+    assert not hasattr(instance, "__dict__")
+    with pytest.raises(AttributeError):
+        instance.unknown = 1
+    assert model.FIELDS == tuple(f.name for f in fields(model))
+    assert model.FIELDS[:2] == ("id", "app_env")
+
+
+def test_to_doc_skips_unset_fields():
+    doc = task(QUEUED, 1.0, name="myapp.charge", retries=0).to_doc()
+    assert doc == {"id": "u", "app_env": "prod", "kind": "task", "state": QUEUED, "clock": 1, "updated_at": 1,
+                   "timestamp": 1, "exact_timestamp": 1.0, "utcoffset": 0, "pid": 100, "uuid": "u",
+                   "name": "myapp.charge", "retries": 0, "events": [], "events_count": 1}
+
+
+def test_pickle_round_trip():
+    original = task(RECEIVED, 1.0, name="myapp.charge", kwargs_flattened={"a": 1}, events=[RECEIVED])
+    restored = pickle.loads(pickle.dumps(original))
+    assert restored == original
+    assert restored.to_doc() == original.to_doc()
+
+
+def test_update_and_upsert_only_set_values():
+    stored = task(QUEUED, 1.0, name="myapp.charge", queue="billing")
+    stored.update(task(STARTED, 2.0, worker="celery@worker-1"))
+    assert (stored.state, stored.name, stored.queue, stored.worker) == (STARTED, "myapp.charge", "billing",
+                                                                        "celery@worker-1")
+    stored.upsert(task(RECEIVED, 3.0, name="other", received_at=3), ("received_at", "queue"))
+    assert (stored.state, stored.name, stored.received_at, stored.queue) == (STARTED, "myapp.charge", 3, "billing")
+
+
+def test_merge_plan_fields_are_model_fields():
+    plan = TASK_MERGE_PLAN[(SUCCEEDED, RETRY, True)]
+    assert "retried_at" in plan.fields and "traceback" in plan.fields
+    # Not a Task field
+    assert "_id" not in TASK_MERGE_PLAN[(SUCCEEDED, QUEUED, False)].fields
+    assert all(set(plan.fields) <= set(Task.FIELDS) for plan in TASK_MERGE_PLAN.values())
+    assert WORKER_STATE_FIELDS["HEARTBEAT"] == ("last_heartbeat_at", "processed", "active", "freq", "loadavg")
+
+
+def test_late_received_event_only_fills_its_fields():
+    stored = task(SUCCEEDED, 3.0, succeeded_at=3, runtime=0.5, events=[SUCCEEDED])
+    stored.merge(task(RECEIVED, 1.0, name="myapp.charge", received_at=1, worker="celery@worker-1"))
+    assert (stored.state, stored.succeeded_at, stored.received_at, stored.name) == (SUCCEEDED, 3, 1,
+                                                                                    "myapp.charge")
+    assert stored.worker is None
+    assert stored.events == [RECEIVED, SUCCEEDED] and stored.events_count == 2
+
+
+def test_late_worker_event():
+    stored = worker("OFFLINE", 3.0, offline_at=3)
+    assert not stored.merge(worker("OFFLINE", 1.0, offline_at=1))
+    assert stored.merge(worker("HEARTBEAT", 2.0, last_heartbeat_at=2, active=1, sw_ver="5.2.7"))
+    assert (stored.state, stored.offline_at, stored.last_heartbeat_at, stored.active, stored.sw_ver) == (
+        "OFFLINE", 3, 2, 1, None)
+    assert stored.events_count == 3
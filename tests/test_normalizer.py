@@ -0,0 +1,104 @@
+import copy
+
+import pytest
+from fastjsonschema import JsonSchemaException
+
+from leek.agent.adapters import task as task_adapter
+from leek.agent.adapters import worker as worker_adapter
+from leek.agent.adapters.normalizer import NORMALIZERS, EventNormalizer
+
+UPDATED_AT = 1700000000000
+
+
+def fresh(normalizer: EventNormalizer) -> EventNormalizer:
+    """
+    Normalizer of the same event type with empty caches, recording the events handed to the JSON schema
+    """
+    fallbacks = []
+
+    def validate(event):
+        fallbacks.append(event)
+        return normalizer.validate(event)
+
+    json_schema = task_adapter.json_schema if normalizer.kind == "task" else worker_adapter.json_schema
+    clone = EventNormalizer(normalizer.ev_type, normalizer.kind, normalizer.state, json_schema, validate)
+    clone.fallbacks = fallbacks
+    return clone
+
+
+def reference(normalizer: EventNormalizer, event):
+    """
+    Document of the event validated by the compiled JSON schema only (fastjsonschema fills in the defaults)
+    """
+    validated = normalizer.validate(copy.deepcopy(event))
+    unchecked = copy.copy(normalizer)
+    unchecked.check = lambda _: None
+    normalize = unchecked.normalize_task if normalizer.kind == "task" else unchecked.normalize_worker
+    return normalize(validated, "prod", UPDATED_AT)[1].to_doc()
+
+
+@pytest.fixture
+def sample(events):
+    def first(ev_type):
+        return next(event for event in events(200) if event["type"] == ev_type)
+
+    return first
+
+
+@pytest.mark.parametrize("ev_type", ["task-sent", "task-received", "task-started", "task-succeeded", "task-failed",
+                                     "worker-heartbeat"])
+def test_fast_path_matches_json_schema(ev_type, sample):
+    normalizer = fresh(NORMALIZERS[ev_type])
+    event = sample(ev_type)
+    original = copy.deepcopy(event)
+    _, obj = normalizer.normalize(event, "prod", UPDATED_AT)
+    assert normalizer.fallbacks == []
+    assert event == original
+    assert obj.to_doc() == reference(normalizer, event)
+
+
+def test_worker_event_without_optional_fields(worker_heartbeat):
+    normalizer = fresh(NORMALIZERS["worker-heartbeat"])
+    event = worker_heartbeat
+    del event["active"], event["processed"], event["loadavg"]
+    _, obj = normalizer.normalize(event, "prod", UPDATED_AT)
+    assert normalizer.fallbacks == []
+    assert obj.to_doc() == reference(normalizer, event)
+
+
+def test_unusual_event_falls_back_to_json_schema(sample):
+    normalizer = fresh(NORMALIZERS["task-received"])
+    # Integral float for an integer, not a type the fast path knows about
+    event = {**sample("task-received"), "retries": 1.0}
+    _, obj = normalizer.normalize(event, "prod", UPDATED_AT)
+    assert normalizer.fallbacks == [event]
+    assert obj.to_doc() == reference(normalizer, event)
+    # Not remembered as a valid shape
+    assert normalizer.shapes == set()
+
+
+@pytest.mark.parametrize("change", [
+    {"timestamp": "1700000000"},
+    {"uuid": 42},
+    {"unknown": "field"},
+    {"eta": 1700000000},
+])
+def test_malformed_event_raises_json_schema_error(change, sample):
+    normalizer = fresh(NORMALIZERS["task-started"])
+    event = {**sample("task-started"), **change}
+    with pytest.raises(JsonSchemaException) as expected:
+        normalizer.validate(copy.deepcopy(event))
+    with pytest.raises(JsonSchemaException) as raised:
+        normalizer.normalize(event, "prod", UPDATED_AT)
+    assert normalizer.fallbacks
+    assert str(raised.value) == str(expected.value)
+    assert raised.value.rule == expected.value.rule
+
+
+def test_malformed_event_missing_required_field(worker_heartbeat):
+    normalizer = fresh(NORMALIZERS["worker-heartbeat"])
+    event = worker_heartbeat
+    del event["clock"]
+    with pytest.raises(JsonSchemaException, match="clock"):
+        normalizer.normalize(event, "prod", UPDATED_AT)
+    assert normalizer.fallbacks == [event]
@@ -0,0 +1,82 @@
+import pytest
+
+from leek.agent.adapters import parse_cache
+from leek.agent.adapters.parse_cache import ParseCache
+
+
+class CountingParse:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, raw):
+        self.calls.append(raw)
+        return {"parsed": raw}
+
+
+@pytest.fixture
+def remote_stats(monkeypatch):
+    monkeypatch.setattr(parse_cache, "remote_stats", {})
+    return parse_cache.remote_stats
+
+
+def test_hits_return_the_cached_result():
+    cache, parse = ParseCache("test", 10), CountingParse()
+    first = cache.get("{'a': 1}", parse)
+    assert cache.get("{'a': 1}", parse) is first
+    assert cache.get("{'a': 2}", parse) == {"parsed": "{'a': 2}"}
+    assert parse.calls == ["{'a': 1}", "{'a': 2}"]
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.hit_rate == pytest.approx(1 / 3)
+    assert ParseCache("empty", 10).hit_rate == 0.0
+
+
+def test_keys_are_fixed_size_digests():
+    raw = "x" * 30000
+    assert ParseCache.key(raw) == ParseCache.key("x" * 30000)
+    assert len(ParseCache.key(raw)) == 16
+    # Lone surrogates from the python repr of the events
+    assert ParseCache.key("\ud800") != ParseCache.key("")
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache, parse = ParseCache("test", 2), CountingParse()
+    cache.get("a", parse)
+    cache.get("b", parse)
+    cache.get("a", parse)
+    cache.get("c", parse)
+    assert len(cache.entries) == 2
+    cache.get("a", parse)
+    cache.get("b", parse)
+    assert parse.calls == ["a", "b", "c", "b"]
+
+
+def test_namespaces_do_not_share_results():
+    cache = ParseCache("test", 10)
+    assert cache.get("raw", lambda raw: 1, namespace=b"policy-1") == 1
+    assert cache.get("raw", lambda raw: 2, namespace=b"policy-2") == 2
+    assert cache.get("raw", lambda raw: 3) == 3
+    assert cache.get("raw", lambda raw: 4, namespace=b"policy-1") == 1
+
+
+def test_module_caches_parse_each_field_once(monkeypatch):
+    for cache in parse_cache.CACHES:
+        monkeypatch.setattr(cache, "entries", type(cache.entries)())
+    args = repr((1, "customer-1"))
+    assert parse_cache.parse_args(args) is parse_cache.parse_args(args)
+    assert parse_cache.parse_kwargs("{'order_id': 1}") == {"order_id": 1}
+    assert parse_cache.parse_traceback("") is parse_cache.parse_traceback("")
+    assert [len(cache.entries) for cache in parse_cache.CACHES] == [1, 1, 1]
+
+
+def test_total_stats_include_the_shards(remote_stats):
+    local = parse_cache.stats()
+    assert set(local) == {"args", "kwargs", "traceback"}
+    parse_cache.record_remote_stats("shard-0", {"args": (10, 1), "kwargs": (5, 5)})
+    parse_cache.record_remote_stats("shard-1", {"args": (1, 1)})
+    # Cumulative stats, replaced by the latest ones of the shard
+    parse_cache.record_remote_stats("shard-1", {"args": (2, 2)})
+    totals = parse_cache.total_stats()
+    assert totals["args"] == (local["args"][0] + 12, local["args"][1] + 3)
+    assert totals["kwargs"] == (local["kwargs"][0] + 5, local["kwargs"][1] + 5)
+    assert totals["traceback"] == local["traceback"]
@@ -0,0 +1,130 @@
+import uuid
+import zlib
+
+import pytest
+
+from leek.agent.rules import CompiledRule, EventRules, InvalidRule, SAMPLING_BUCKETS
+
+
+def task_events(uuid_, name):
+    return [
+        {"type": "task-received", "uuid": uuid_, "name": name},
+        {"type": "task-started", "uuid": uuid_},
+        {"type": "task-succeeded", "uuid": uuid_},
+    ]
+
+
+@pytest.mark.parametrize("rule", [
+    "keep",
+    {"keep": 0, "unknown": 1},
+    {"names": ["*"]},
+    {"keep": 1.5},
+    {"keep": True},
+    {"keep": "0.5"},
+    {"keep": 0, "names": [""]},
+    {"keep": 0, "names": [1]},
+    {"keep": 0, "types": "task-sent"},
+    {"keep": 0, "types": ["task-exploded"]},
+    {"keep": 0, "states": ["DONE"]},
+])
+def test_invalid_rules(rule):
+    with pytest.raises(InvalidRule):
+        CompiledRule.compile(rule)
+
+
+@pytest.mark.parametrize("names, name, matches", [
+    (["*.healthcheck"], "myapp.tasks.healthcheck", True),
+    (["*.healthcheck"], "myapp.tasks.healthcheck_v2", False),
+    (["myapp.chatty.*"], "myapp.chatty.ping", True),
+    (["myapp.chatty.*"], "other.myapp.chatty.ping", False),
+    (["myapp.task_?"], "myapp.task_1", True),
+    (["myapp.task_[ab]"], "myapp.task_c", False),
+    # Several globs compiled into a single pattern
+    (["a.*", "b.*"], "b.x", True),
+    (["a.*", "b.*"], "c.x", False),
+    # A single glob is accepted as a string
+    ("a.*", "a.x", True),
+    (["a.*"], None, False),
+])
+def test_name_globs(names, name, matches):
+    rule = CompiledRule.compile({"names": names, "keep": 0})
+    assert rule.matches("task-received", name) is matches
+
+
+def test_states_select_their_event_types():
+    rule = CompiledRule.compile({"states": ["SUCCEEDED"], "types": ["task-sent"], "keep": 0})
+    assert rule.types == frozenset(["task-succeeded", "task-sent"])
+    assert rule.matches("task-succeeded", None)
+    assert not rule.matches("task-failed", None)
+    assert CompiledRule.compile({"keep": 0}).matches("worker-heartbeat", None)
+
+
+def test_first_matching_rule_decides():
+    rules = EventRules([
+        {"names": ["myapp.important.*"], "keep": 1},
+        {"names": ["myapp.*"], "keep": 0},
+    ])
+    assert rules.decide("task-received", "myapp.important.charge") == 1
+    assert rules.decide("task-received", "myapp.chatty") == 0
+    assert rules.decide("task-received", "other.task") == 1
+
+
+def test_decisions_are_cached_per_type_and_name(monkeypatch):
+    rules = EventRules([{"names": ["myapp.*"], "keep": 0}])
+    assert rules.decide("task-received", "myapp.chatty") == 0
+    # Not evaluated again
+    rules.rules = []
+    assert rules.decide("task-received", "myapp.chatty") == 0
+    assert rules.decide("task-started", "myapp.chatty") == 1
+    monkeypatch.setattr(EventRules, "DECISIONS_CACHE_SIZE", 2)
+    rules.decide("task-sent", "myapp.chatty")
+    assert len(rules.decisions) == 1
+
+
+def test_dropped_task_events_are_recalled_by_uuid():
+    rules = EventRules([{"names": ["*.healthcheck"], "keep": 0}])
+    payload = task_events("u1", "myapp.healthcheck") + task_events("u2", "myapp.charge")
+    assert rules.filter(payload) == task_events("u2", "myapp.charge")
+    # Name seen in an earlier batch
+    assert rules.filter([{"type": "task-failed", "uuid": "u1"}]) == []
+
+
+def test_names_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(EventRules, "NAMES_CACHE_SIZE", 2)
+    rules = EventRules([{"names": ["*.healthcheck"], "keep": 0}])
+    rules.filter(task_events("u1", "myapp.healthcheck") + task_events("u2", "a") + task_events("u3", "b"))
+    assert list(rules.names) == ["u2", "u3"]
+    # Forgotten, kept
+    assert rules.filter([{"type": "task-failed", "uuid": "u1"}]) == [{"type": "task-failed", "uuid": "u1"}]
+
+
+def test_sampling_is_deterministic_per_task():
+    def sample(rules, uuids):
+        kept = rules.filter([event for uuid_ in uuids for event in task_events(uuid_, "myapp.chatty")])
+        return {event["uuid"] for event in kept}, kept
+
+    uuids = [str(uuid.UUID(int=i)) for i in range(2000)]
+    rule = [{"names": ["myapp.*"], "keep": 0.25}]
+    sampled, kept = sample(EventRules(rule), uuids)
+    # A sampled task keeps all of its events
+    assert len(kept) == 3 * len(sampled)
+    # Same tasks whatever the process or the batch
+    assert sample(EventRules(rule), uuids)[0] == sampled
+    assert sample(EventRules(rule), uuids[:100])[0] == {u for u in sampled if u in uuids[:100]}
+    assert sampled == {u for u in uuids if zlib.crc32(u.encode("utf-8")) % SAMPLING_BUCKETS < 0.25 * SAMPLING_BUCKETS}
+    assert 0.2 < len(sampled) / len(uuids) < 0.3
+
+
+def test_workers_are_sampled_by_hostname():
+    rules = EventRules([{"types": ["worker-heartbeat"], "keep": 0.5}])
+    heartbeats = [{"type": "worker-heartbeat", "hostname": f"celery@worker-{i}"} for i in range(100)]
+    kept = rules.filter(heartbeats * 2)
+    hostnames = [event["hostname"] for event in kept]
+    assert 0 < len(set(hostnames)) < 100
+    assert all(hostnames.count(hostname) == 2 for hostname in hostnames)
+
+
+def test_malformed_events_are_kept_for_the_validation():
+    rules = EventRules([{"keep": 0}])
+    payload = ["not an event", {"uuid": "u"}, {"type": 1}]
+    assert rules.filter(payload + [{"type": "task-sent", "uuid": "u"}]) == payload
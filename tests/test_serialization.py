@@ -0,0 +1,58 @@
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+
+from leek import serialization
+
+AT = datetime(2026, 10, 18, 12, 30, 15, 250000, tzinfo=timezone.utc)
+DOC = {
+    "at": AT,
+    "naive": datetime(2026, 10, 18, 12, 30, 15, 5),
+    "on": AT.date(),
+    "id": uuid.UUID(int=1),
+    "text": "é \x00\x1f\"\\\n😀",
+    "floats": [0.1, -0.0, 2.5, 1e16, -1.5e-7, 1e-5, -1.5000000000000002e-05, 1e-4, 1234567890123456.8, 1e300],
+    "non_finite": [float("nan"), float("inf"), float("-inf")],
+    "ints": [0, -1, 2 ** 63 - 1, True, False, None],
+    "tuple": (1, "a"),
+    AT: "datetime key",
+    1: "int key",
+    2.5: "float key",
+    1e16: "float exponent key",
+    True: "bool key",
+    None: "none key",
+    "nested": [{3: AT, "empty": {}, "list": []}],
+}
+
+
+@pytest.fixture
+def without_orjson(monkeypatch):
+    monkeypatch.setattr(serialization, "orjson", None)
+
+
+def test_orjson():
+    assert serialization.json_dumps(DOC) == orjson.dumps(DOC, option=orjson.OPT_NON_STR_KEYS)
+
+
+def test_fallback_is_byte_identical_to_orjson(without_orjson):
+    assert serialization.json_dumps(DOC) == orjson.dumps(DOC, option=orjson.OPT_NON_STR_KEYS)
+    assert serialization.json_dumps("é") == orjson.dumps("é")
+
+
+def test_fallback_for_values_orjson_rejects():
+    # Integers above 64 bits
+    expected = orjson.dumps({**DOC, "big": 1}, option=orjson.OPT_NON_STR_KEYS)
+    assert serialization.json_dumps({**DOC, "big": 2 ** 70}) == expected.replace(b'"big":1', f'"big":{2 ** 70}'.encode())
+
+
+def test_fallback_rejects_unknown_types(without_orjson):
+    with pytest.raises(TypeError):
+        serialization.json_dumps({"value": object()})
+
+
+def test_agent_and_api_share_the_serializer():
+    from leek.agent import deadletter
+    from leek.api import utils
+    assert deadletter.json_dumps is utils.json_dumps is serialization.json_dumps
@@ -0,0 +1,112 @@
+import json
+from types import SimpleNamespace
+
+import gevent
+import pytest
+
+from leek.serialization import json_dumps
+from leek.agent.adapters import serializer
+from leek.agent.adapters.serializer import validate_payload, to_docs
+from leek.agent.shards import ValidationShards, shard_key
+
+MALFORMED = [
+    {"type": "task-received", "uuid": "b5bd7aa5-a3b8-4ec4-8a4e-b4f1d4e0b1a5", "timestamp": "yesterday"},
+    {"type": "worker-heartbeat"},
+    "not an event",
+]
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    # Same updated_at in the consumer and the shards, forked after the patch
+    monkeypatch.setattr(serializer, "time", SimpleNamespace(time=lambda: 1700000000.0))
+    shards = ValidationShards("app-prod", 3, "prod")
+    yield shards
+    shards.close()
+
+
+@pytest.fixture
+def batch(events):
+    return events(2000) + MALFORMED
+
+
+def by_id(docs):
+    return {doc.get("uuid") or doc.get("hostname"): doc for doc in docs}
+
+
+def test_validate_is_the_single_process_merge(shards, batch):
+    rejected, sharded_rejected = [], []
+    expected = validate_payload(batch, "prod", rejected)
+    validated = shards.validate(batch, sharded_rejected)
+    assert validated.keys() == expected.keys()
+    assert [event.to_doc() for event in validated.values()] == [expected[key].to_doc() for key in validated]
+    assert sorted(map(repr, sharded_rejected)) == sorted(map(repr, rejected))
+
+
+def test_encode_is_the_single_process_encoding(shards, batch):
+    rejected, sharded_rejected = [], []
+    docs = to_docs(validate_payload(batch, "prod", rejected).values(), rejected)
+    data, count = shards.encode(batch, sharded_rejected)
+    assert count == len(docs)
+    # Partitions are concatenated, the documents are the same but not in the same order
+    assert by_id(json.loads(data)) == by_id(json.loads(json_dumps(docs)))
+    assert sorted(map(repr, sharded_rejected)) == sorted(map(repr, rejected))
+
+
+def test_consumer_loop_runs_while_partitions_are_sent(shards, events, monkeypatch):
+    from leek.agent import shards as shards_module
+
+    ticks, ticks_when_sent = [], []
+    shard_wait_read = shards_module.wait_read
+
+    def tick():
+        while True:
+            ticks.append(1)
+            gevent.sleep(0)
+
+    def wait_read(fileno):
+        # First wait for a result, every partition has been written
+        ticks_when_sent.append(len(ticks))
+        return shard_wait_read(fileno)
+
+    monkeypatch.setattr(shards_module, "wait_read", wait_read)
+    ticker = gevent.spawn(tick)
+    gevent.sleep(0)
+    shards.encode(events(10000), [])
+    ticker.kill()
+    # A blocking write would have left the ticker stuck at its first run
+    assert ticks_when_sent[0] > 1
+
+
+def test_events_of_a_task_or_worker_land_on_the_same_shard(shards, events):
+    batch = events(2000)
+    partitions = shards.partition(batch)
+    assert sum(map(len, partitions)) == len(batch)
+    assert all(len(partition) for partition in partitions)
+    owners = {}
+    for i, partition in enumerate(partitions):
+        for event in partition:
+            assert owners.setdefault(shard_key(event), i) == i
+    # Order of the events of a task is preserved
+    for partition in partitions:
+        clocks = {}
+        for event in partition:
+            if "uuid" in event:
+                assert event["clock"] > clocks.get(event["uuid"], 0)
+                clocks[event["uuid"]] = event["clock"]
+
+
+def test_shard_key():
+    assert shard_key({"uuid": "u", "hostname": "h"}) == "u"
+    assert shard_key({"hostname": "h"}) == "h"
+    assert shard_key({}) == ""
+    assert shard_key("not an event") == ""
+
+
+def test_dead_shard_is_respawned(shards, batch):
+    expected = validate_payload(batch, "prod")
+    shards.processes[1].kill()
+    shards.processes[1].join()
+    validated = shards.validate(batch)
+    assert shards.processes[1].is_alive()
+    assert validated.keys() == expected.keys()
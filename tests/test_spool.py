@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from leek.agent.spool import Spool, FSYNC_ALWAYS, FSYNC_NEVER
+
+
+def replay(spool):
+    batches = []
+    record = spool.peek()
+    while record is not None:
+        batches.append(record.data)
+        spool.commit(record)
+        record = spool.peek()
+    return batches
+
+
+def batch(i, size=100):
+    return f"{i:04d}".encode() * (size // 4)
+
+
+def test_records_are_replayed_in_order_across_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_max_size_in_mb=1, fsync_policy=FSYNC_ALWAYS)
+    batches = [batch(i, 300 * 1024) for i in range(10)]
+    for data in batches:
+        assert spool.append(data)
+    # 3 records of 300KB per 1MB segment
+    assert len(spool) == 4
+    assert spool.size_in_bytes == sum(Spool.HEADER.size + len(data) for data in batches)
+    assert replay(spool) == batches
+    assert len(spool) == 0 and spool.size_in_bytes == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_full_spool_rejects_batches(tmp_path):
+    spool = Spool(str(tmp_path), max_size_in_mb=1)
+    data = batch(0, 400 * 1024)
+    assert spool.append(data)
+    assert spool.append(data)
+    assert not spool.append(data)
+    assert replay(spool) == [data, data]
+    assert spool.append(data)
+
+
+def test_uncommitted_record_is_replayed_again(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(3):
+        spool.append(batch(i))
+    first = spool.peek()
+    assert spool.peek() == first
+    spool.commit(first)
+    second = spool.peek()
+    assert second.data == batch(1)
+    # Stale or out of order commits are ignored
+    spool.commit(first)
+    assert spool.peek() == second
+
+
+def test_writes_after_replay_caught_up_go_to_a_new_segment(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(batch(0))
+    record = spool.peek()
+    spool.append(batch(1))
+    spool.commit(record)
+    assert replay(spool) == [batch(1)]
+
+
+def test_segments_are_recovered_on_restart(tmp_path):
+    spool = Spool(str(tmp_path), segment_max_size_in_mb=1, fsync_policy=FSYNC_NEVER)
+    batches = [batch(i, 400 * 1024) for i in range(5)]
+    for data in batches:
+        spool.append(data)
+    spool.commit(spool.peek())
+    spool.close()
+    recovered = Spool(str(tmp_path), segment_max_size_in_mb=1)
+    # At-least-once, the partially replayed segment is replayed from its first record
+    assert len(recovered) == 3
+    recovered.append(batch(5))
+    assert replay(recovered) == batches + [batch(5)]
+
+
+@pytest.mark.parametrize("truncate", [1, Spool.HEADER.size, Spool.HEADER.size + 50])
+def test_torn_tail_record_is_skipped(tmp_path, truncate):
+    spool = Spool(str(tmp_path))
+    for i in range(3):
+        spool.append(batch(i))
+    spool.close()
+    segment = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - truncate)
+    assert replay(Spool(str(tmp_path))) == [batch(0), batch(1)]
+
+
+def test_corrupted_record_stops_the_segment_replay(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(3):
+        spool.append(batch(i))
+    spool.close()
+    segment = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(segment, "r+b") as f:
+        # Flip a byte of the second record
+        f.seek(2 * Spool.HEADER.size + len(batch(0)) + 10)
+        f.write(b"X")
+    assert replay(Spool(str(tmp_path))) == [batch(0)]
+
+
+def test_invalid_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        Spool(str(tmp_path), fsync_policy="sometimes")
@@ -0,0 +1,10 @@
+from leek.agent.models.painless import TASK_MERGE_SCRIPT, check_task_merge, generate_task_merge_script
+
+
+def test_task_merge_plan_is_consistent():
+    assert check_task_merge() == []
+
+
+def test_task_merge_script_is_up_to_date():
+    # Regenerate with: cd app && python -m leek.agent.models.painless
+    assert generate_task_merge_script() == TASK_MERGE_SCRIPT.read_text()